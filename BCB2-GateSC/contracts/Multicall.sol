@@ -0,0 +1,30 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.0;
+
+contract Multicall{
+    // STRUCTS
+    struct Call{
+        address target;
+        bytes call_data;
+    }
+
+    // FUNCTIONS
+    // A function to run several view calls in a single eth_call
+    // Reverts if any of the calls fails
+    function aggregate(
+        /**ARGUMENTS**/
+        Call[] memory calls
+    )
+        public
+        view
+        returns (uint256 block_number, bytes[] memory return_data)
+    {
+        block_number = block.number;
+        return_data = new bytes[](calls.length);
+        for (uint i = 0; i < calls.length; i++){
+            (bool success, bytes memory result) = calls[i].target.staticcall(calls[i].call_data);
+            require(success, "Multicall: call failed");
+            return_data[i] = result;
+        }
+    }
+}
\ No newline at end of file
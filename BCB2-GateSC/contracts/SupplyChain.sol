@@ -21,6 +21,7 @@ contract GateSupplyChain{
     event added_products(GateType indexed gate, NumPins indexed pins, uint256 num_added);
     event items_bought(uint256[8] num_buy);
     event items_defective(uint256[8] num_defective);
+    event price_changed(GateType indexed gate, NumPins indexed pins, uint256 price, uint256 voltage);
 
     // MODIFIERS
     modifier admin_only(){
@@ -92,6 +93,8 @@ contract GateSupplyChain{
         if (price != 0) chips[gate][pins].price = price;
         if (voltage != 0) chips[gate][pins].input_voltage = voltage;
 
+        emit price_changed(gate, pins, chips[gate][pins].price, chips[gate][pins].input_voltage);
+
         return true;
     }
 
@@ -0,0 +1,196 @@
+"""
+Asyncio version of the event listener. Handlers that talk to the blockchains are
+coroutines using AsyncBitcoinBridgeGanache, so many baskets can be in flight at once on a
+single event loop without a thread per event.
+"""
+import asyncio
+import time
+from functions.async_bcb_functions import AsyncBitcoinBridgeGanache
+from functions.async_event_poller import AsyncEventPoller
+from functions.checkpoint import BlockCheckpoint
+import random
+
+# ---------------------CONNECT TO SUPPLY CHAIN CONTRACT ON GANACHE---------------------
+# New instance of Bitcoin Bridge Class
+bcb = AsyncBitcoinBridgeGanache()
+
+pins_dict = {
+    1: 'Six',
+    2: 'Eight',
+    3: 'Twelve',
+    4: 'Fourteen'
+}
+gate_dict = {
+    1: 'NAND',
+    2: 'NOR'
+}
+receipts = set()
+chips_tuple = (
+    (1,1),
+    (2,1),
+    (1,2),
+    (2,2),
+    (1,3),
+    (2,3),
+    (1,4),
+    (2,4),
+)
+
+# -----------------------------MAIN PROGRAM-----------------------------
+# EVENT HANDLING FUNCTIONS
+def products_added(gate, pins, num_added):
+    """A function to handle the event of new products being added"""
+    print(f"""\nNew Product was added:
+          \r\tItem:{gate_dict[gate]}-{pins_dict[pins]}\tNumber: {num_added}""")
+    
+
+async def bought_items(num_buy):
+    """A function to handle the event of particular items being bought."""
+    # Getting random receipt number
+    receipt_number = random.randint(1,999999)
+    while receipt_number in receipts:
+        receipt_number = random.randint(1,999999)
+    receipts.add(receipt_number)
+    
+    item_id = [random.randint(1,100) for _ in range(8)]
+
+    # The first lookup on a cold catalog reads every product, the others are cache hits
+    prices = [num_buy[index] * await bcb.get_product_price(gate, pins) for index, (gate, pins) in enumerate(chips_tuple)]
+    
+    
+    for index, (gate, pins) in enumerate(chips_tuple):
+        if len(f"{gate_dict[gate]}-{pins_dict[pins]}") > 10:
+            print(f"Item:{gate_dict[gate]}-{pins_dict[pins]}\tNumber: {num_buy[index]}\tPrice: ${prices[index]/100}")
+        else:
+            print(f"Item:{gate_dict[gate]}-{pins_dict[pins]}\t\tNumber: {num_buy[index]}\tPrice: ${prices[index]/100}")
+    
+    await bcb.create_basket_with_items(receipt_number, item_id, prices)
+
+def product_changed(gate, pins, price, voltage):
+    """A function to handle the event of the price or voltage of a product being changed"""
+    print(f"""\nProduct Information Changed:
+          \r\tItem:{gate_dict[gate]}-{pins_dict[pins]}\tPrice: ${price/100}\tVoltage: {voltage/1000} V""")
+
+def defective_items(num_defective):
+    """A function to handle the event of removing defective items from the supply chain."""
+    print(f"""Removing the following items from the supply chain.""")
+    for index, (gate, pins) in enumerate(chips_tuple):
+        print(f"Item:{gate_dict[gate]}-{pins_dict[pins]}\tNumber: {num_defective[index]}")
+
+def transaction_created(receipt_number):
+    """
+    A target function to handle the event of a transaction being 
+    created on transaction bridge.
+    """
+    print(
+        f"""\nShopping Cart Created:
+            \r\tReceipt Number: {receipt_number}"""
+    )
+
+def transaction_updated(receipt_number, total):
+    """
+    A target function to handle the event of a transaction being 
+    updated on transaction bridge.
+    """
+    print(
+        f"""\nShopping Cart Updated:
+            \r\tReceipt Number: {receipt_number}
+            \r\tNew Total Amount Due: ${total / 100}"""
+    )
+
+async def transaction_refunded(receipt_number, total):
+    """
+    A target function to handle the event of a transaction being 
+    refunded on transaction bridge.
+    """
+    print(
+        f"""\Transaction Refunded:
+            \r\tReceipt Number: {receipt_number}
+            \r\tRefund Amount: ${total/100}"""
+    )
+    
+    # Send refund amount on BTC Network
+    print("Sending Bitcoin Transaction as refund...")
+    if not await bcb.queue_btc(receipt_number, total, reverse = True):
+        print(f"Refund of receipt {receipt_number} was already queued")
+
+async def payment_initiated(receipt_number, total):
+    """
+    A target function to handle the event of a payment being 
+    initiated on transaction bridge.
+    """
+    print(
+        f"""\nPayment Process Initiated:
+            \r\tReceipt Number: {receipt_number}
+            \r\tTotal Amount Due: ${total / 100}"""
+    )
+    # Send BTC Transaction
+    print("Sending Bitcoin Transaction as payment...")
+    # Recorded in the payout queue and sent in the background, a replayed event is ignored
+    if not await bcb.queue_btc(receipt_number, total):
+        print(f"Payment of receipt {receipt_number} was already queued")
+
+def seller_ok(receipt_number, total):
+    """
+    A target function to handle the event of a seller confirming transaction
+    """
+    print(f"""\nSeller has confirmed the transaction.
+          \rReceipt Number: {receipt_number}
+          \rTotal: ${total/100}""")
+
+def buyer_ok(receipt_number, total):
+    """
+    A target function to handle the event of a buyer confirming transaction
+    """
+    print(f"""\nBuyer has confirmed the transaction.
+          \rReceipt Number: {receipt_number}
+          \rTotal: ${total/100}""")
+
+# Number of coroutine handlers allowed to run at the same time on each chain
+MAX_IN_FLIGHT = 1000
+# File keeping the last block processed on every chain
+CHECKPOINT_FILE = "contracts/listener.checkpoint"
+# Without a checkpoint the listener starts at the newest block. Set to True to run the
+# handlers for every event since the deployment instead: this creates baskets and queues
+# bitcoin payouts for all past events again, so only use it with a fresh deployment
+REPLAY_FROM_DEPLOYMENT = False
+# SQLite file keeping every bitcoin payout until it is sent
+PAYOUT_DB = "contracts/payouts.db"
+
+# Main Function
+async def main():
+    await bcb.connect()
+    print("\nListnening for new events...\n")
+    checkpoint = BlockCheckpoint(CHECKPOINT_FILE)
+    bcb.start_payout_queue(PAYOUT_DB)
+    # One poller per chain, every event is routed by its topic
+    supply_poller = AsyncEventPoller(bcb.supply_chain_w3, "Supply Chain", MAX_IN_FLIGHT, checkpoint)
+    supply_poller.register(bcb.supply_chain_contract.events.added_products, products_added, ('gate', 'pins', 'num_added'))
+    supply_poller.register(bcb.supply_chain_contract.events.items_bought, bought_items, ('num_buy',))
+    supply_poller.register(bcb.supply_chain_contract.events.items_defective, defective_items, ('num_defective',))
+    supply_poller.register(bcb.supply_chain_contract.events.price_changed, product_changed, ('gate', 'pins', 'price', 'voltage'))
+    # Keep the cached catalog used to price baskets up to date
+    bcb.catalog.track(supply_poller, bcb.supply_chain_contract.events)
+    bridge_poller = AsyncEventPoller(bcb.bridge_w3, "Transaction Bridge", MAX_IN_FLIGHT, checkpoint)
+    bridge_poller.register(bcb.bridge_contract.events.TransactionCreated, transaction_created, ('receipt_number',))
+    bridge_poller.register(bcb.bridge_contract.events.TransactionUpdated, transaction_updated, ('receipt_number', 'total'))
+    bridge_poller.register(bcb.bridge_contract.events.TransactionRefunded, transaction_refunded, ('receipt_number', 'total'))
+    bridge_poller.register(bcb.bridge_contract.events.PaymentInitiated, payment_initiated, ('receipt_number', 'total'))
+    bridge_poller.register(bcb.bridge_contract.events.SellerOk, seller_ok, ('receipt_number', 'total'))
+    bridge_poller.register(bcb.bridge_contract.events.BuyerOk, buyer_ok, ('receipt_number', 'total'))
+    await asyncio.gather(
+        # Without a checkpoint only new blocks are read unless REPLAY_FROM_DEPLOYMENT is set
+        supply_poller.run(2, bcb.manifest.deploy_block('SupplyChain') if REPLAY_FROM_DEPLOYMENT else None),
+        bridge_poller.run(2, bcb.manifest.deploy_block('TransactionBridge') if REPLAY_FROM_DEPLOYMENT else None)
+    )
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt as err:
+        print('\nClosing event listener...')
+        print(err)
+    finally:
+        if bcb.payout_queue != None:
+            bcb.payout_queue.stop()
+            bcb.payout_queue.print_stats()
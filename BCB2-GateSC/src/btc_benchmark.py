@@ -0,0 +1,90 @@
+"""
+Offline throughput benchmark of the bitcoin leg of the payment_initiated handler.
+
+Payments run through the same path as the event listener (worker pool -> queue_btc -> payout
+queue -> wallet state -> bitcoin backend) against an in-memory bitcoin network, so neither
+Ganache nor the internet is needed. The payout queue is kept in a temporary SQLite file.
+Every REFUND_EVERY-th receipt is also refunded, so the settlement engine has refunds to net.
+
+usage: python3 src/btc_benchmark.py [payments] [latency in seconds] [regtest rpc url user password]
+    with a regtest url the payments go to that bitcoind node instead of the simulator,
+    the buyer and seller keys are funded by mining blocks to them
+"""
+import os
+import sys
+import time
+import tempfile
+from functions.bcb_functions import BitcoinBridgeGanache
+from functions.btc_backend import RegtestBackend, SimulatedBackend
+from functions.exchange_rate import fixed_feed
+from functions.worker_pool import BoundedExecutor
+
+# Price of one bitcoin in US cents used instead of the rate APIs
+BTC_PRICE = 3000000
+# Amount of every payment in US cents
+PAYMENT = 1000
+# Same worker pool settings as the event listener
+MAX_WORKERS = 8
+MAX_QUEUE = 100
+# Every REFUND_EVERY-th receipt is refunded right after its payment
+REFUND_EVERY = 5
+# Settlement window used instead of BTC_SETTLEMENT_WINDOW, so the benchmark does not wait for it
+SETTLEMENT_WINDOW = 2
+
+def make_backend(args):
+    "Simulator with the given latency, or a regtest node when its url is given"
+    if len(args) > 2:
+        return RegtestBackend(*args[2:5])
+    return SimulatedBackend(latency = float(args[1]) if len(args) > 1 else 0.0)
+
+def main():
+    num_payments = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    backend = make_backend(sys.argv[1:])
+    bcb = BitcoinBridgeGanache(fixed_feed(BTC_PRICE), backend)
+    buyer = backend.new_key()
+    seller = backend.new_key()
+    if isinstance(backend, RegtestBackend):
+        # Coinbase outputs can be spent after 100 blocks
+        backend.mine(101, buyer.address)
+    bcb._start_wallet(buyer, seller)
+    bcb.BTC_SETTLEMENT_WINDOW = SETTLEMENT_WINDOW
+    directory = tempfile.mkdtemp()
+    bcb.start_payout_queue(os.path.join(directory, "payouts.db"))
+
+    executor = BoundedExecutor(MAX_WORKERS, MAX_QUEUE)
+
+    def payment_initiated(receipt_number, total):
+        "Bitcoin part of the event listener handler"
+        bcb.queue_btc(receipt_number, total)
+        if receipt_number % REFUND_EVERY == 0:
+            # Bitcoin part of the transaction_refunded handler
+            bcb.queue_btc(receipt_number, total, reverse = True)
+
+    print(f"\n[CONNECTING] Sending {num_payments} payments through the Bitcoin {backend.NAME}...")
+    start = time.perf_counter()
+    for receipt_number in range(1, num_payments + 1):
+        # Wait for a free slot like the pollers do when the pool is full
+        while executor.try_submit(payment_initiated, receipt_number, PAYMENT) is None:
+            time.sleep(0.01)
+    executor.shutdown()
+    accepted = time.perf_counter() - start
+    # Payouts are done once none is left waiting for a signature or a broadcast
+    while True:
+        counts = bcb.payout_queue.counts()
+        if counts['queued'] + counts['signed'] == 0:
+            break
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    bcb.payout_queue.stop()
+    bcb.wallet.stop()
+
+    executor.print_stats()
+    bcb.payout_queue.print_stats()
+    bcb.wallet.print_stats()
+    print(f"""\nBenchmark:
+          \r\tPayments: {num_payments}\tFailed: {counts['failed']}""")
+    print(f"[TIMING] Events handled: {accepted:.2f}s ({num_payments / accepted:.1f} events/s)")
+    print(f"[TIMING] Payments sent: {elapsed:.2f}s ({num_payments / elapsed:.1f} payments/s)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,415 @@
+"""
+This file contains an asyncio variant of the BitcoinBridgeGanache class. It talks to both
+Ganache chains through AsyncHTTPProvider so that many baskets can be processed at the same
+time on a single event loop instead of one thread per basket.
+"""
+import time
+import asyncio
+from web3 import Web3
+from web3.eth import AsyncEth
+from web3.providers import AsyncHTTPProvider
+from typing import Callable, List, Tuple
+from functions.bcb_functions import BitcoinBridgeGanache
+from functions.multicall import aggregate_call, decode_result
+from functions.exchange_rate import bit_usd_feed
+from functions.btc_backend import BitcoinBackend
+from functions.tx_pipeline import is_nonce_error
+
+class AsyncBitcoinBridgeGanache(BitcoinBridgeGanache):
+    """Asyncio version of BitcoinBridgeGanache.\n
+    Every contract and bitcoin method of this class is a coroutine and has to be awaited.
+    Transactions are encoded locally and sent with AsyncEth, so waiting for a receipt
+    never blocks the event loop."""
+    # Times a transaction is sent again with a nonce read from the node
+    NONCE_RETRIES = 5
+
+    def __init__(self, rate_feed: Callable[[], int] = bit_usd_feed, btc_backend: BitcoinBackend = None):
+        super().__init__(rate_feed, btc_backend)
+        # Provider-less web3 instance used to encode calls and decode results
+        self.encoder = Web3()
+        # (chain url, account) -> next nonce, so concurrent tasks never reuse a nonce
+        self.nonces = {}
+        self.nonce_lock = asyncio.Lock()
+        # Event loop of connect, the heartbeat thread hands its work to it
+        self.loop = None
+
+    @staticmethod
+    def async_web3(url: str) -> Web3:
+        "Creates a web3 instance backed by AsyncHTTPProvider"
+        return Web3(AsyncHTTPProvider(url), modules = {'eth': (AsyncEth,)}, middlewares = [])
+
+    async def connect(self) -> None:
+        "A coroutine to connect to already deployed System"
+        # Connect to the web3 instances
+        if self.supply_chain_w3 == None:
+            self.supply_chain_w3 = self.async_web3(self.SUPPLY_CHAIN_URL)
+        if self.bridge_w3 == None:
+            self.bridge_w3 = self.async_web3(self.BRIDGE_URL)
+
+        # Check both networks at the same time
+        start_time = time.perf_counter()
+        connected = await asyncio.gather(self.supply_chain_w3.isConnected(), self.bridge_w3.isConnected())
+        print(f"[TIMING] Connect: {time.perf_counter() - start_time:.2f}s")
+        if all(connected):
+            print("[SUCCESS] Connected to Supply Chain and Transaction Bridge Networks!")
+        else:
+            print("[ERROR] Cannot connect to one of the Networks...")
+            exit()
+
+        # Get contract info
+        self._load_manifest()
+        self.loop = asyncio.get_running_loop()
+
+        # The heartbeat runs on its own thread so it uses blocking web3 instances
+        self._start_health(
+            Web3(Web3.HTTPProvider(self.SUPPLY_CHAIN_URL)),
+            Web3(Web3.HTTPProvider(self.BRIDGE_URL))
+        )
+
+        # Read the accounts and chain ids once, they are only read again on reconnect
+        await asyncio.gather(
+            asyncio.to_thread(self._load_metadata, 'supply_chain', self.health.endpoints['Supply Chain']),
+            asyncio.to_thread(self._load_metadata, 'bridge', self.health.endpoints['Transaction Bridge'])
+        )
+
+        # Contracts are only used to encode calls, requests go through the async web3 instances
+        self._load_contracts(self.encoder, self.encoder)
+        # BITCOIN (testnet unless another backend was given)
+        await asyncio.to_thread(self._load_wallet)
+
+    async def is_connected(self) -> bool:
+        """Coroutine used to check if we are connected to the Ganache Apps.
+        Returns True when connected.
+        Returns False if contract not deployed or connected"""
+        if self.supply_chain_w3 == None or self.bridge_w3 == None:
+            print("[ERROR] Please deploy the system or connect to already deployed contract.")
+            return False
+        # Cached by the heartbeat so checking costs no round trip
+        if self.health == None or not self.health.is_up():
+            print("[ERROR] Cannot connect to Blockchain Network!")
+            return False
+        if self.supply_chain_contract == None or self.bridge_contract == None:
+            print("[ERROR] Please Connect to Smart Contract.")
+            return False
+        return True
+
+    async def _call(self, w3: Web3, function, block_identifier = 'latest'):
+        "Runs a view function with eth_call at 'block_identifier' and decodes its result"
+        result = await w3.eth.call({
+            'to': function.address,
+            'data': function._encode_transaction_data()
+        }, block_identifier)
+        return decode_result(w3, function, result)
+
+    def _on_reconnect(self, name: str) -> None:
+        """Reads the metadata of a network again once the heartbeat reaches it after it was down.\n
+        Runs on the heartbeat thread, so the nonces are reset on the event loop"""
+        chain = 'supply_chain' if name == 'Supply Chain' else 'bridge'
+        self._load_metadata(chain, self.health.endpoints[name])
+        # Nonces are counted per chain url by this class
+        url = self.SUPPLY_CHAIN_URL if chain == 'supply_chain' else self.BRIDGE_URL
+        self.loop.call_soon_threadsafe(lambda: self.loop.create_task(self._reset_nonces(url)))
+
+    async def _reset_nonces(self, url: str) -> None:
+        "Forgets the local nonces of the chain at 'url' once no transaction is being sent"
+        async with self.nonce_lock:
+            self.nonces = {key: nonce for key, nonce in self.nonces.items() if key[0] != url}
+
+    async def _multicall(self, w3: Web3, multicall, functions: List, block_identifier = 'latest') -> List:
+        """Runs several view functions of one chain as a single eth_call through its
+        Multicall contract, or concurrently one by one when it has none"""
+        if multicall is None:
+            return list(await asyncio.gather(*[self._call(w3, function, block_identifier) for function in functions]))
+        if not functions:
+            return []
+        _, return_data = await self._call(w3, aggregate_call(multicall, functions), block_identifier)
+        return [decode_result(w3, function, data) for function, data in zip(functions, return_data)]
+
+    async def _transact(self, w3: Web3, function, sender: str):
+        "Sends a transaction calling 'function' from 'sender' and waits for its receipt"
+        transaction = {
+            'from': sender,
+            'to': function.address,
+            'data': function._encode_transaction_data()
+        }
+        transaction['gas'] = await w3.eth.estimate_gas(transaction)
+        key = (w3.provider.endpoint_uri, sender)
+        async with self.nonce_lock:
+            attempt = 0
+            while True:
+                if key not in self.nonces:
+                    self.nonces[key] = await w3.eth.get_transaction_count(sender, 'pending')
+                transaction['nonce'] = self.nonces[key]
+                try:
+                    tx_hash = await w3.eth.send_transaction(transaction)
+                except Exception as err:
+                    # The node disagrees with the local count (i.e. another process sent from
+                    # the same account), read it again
+                    del self.nonces[key]
+                    if is_nonce_error(err) and attempt < self.NONCE_RETRIES:
+                        attempt += 1
+                        continue
+                    raise
+                self.nonces[key] += 1
+                break
+        tx_receipt = await w3.eth.wait_for_transaction_receipt(tx_hash)
+        if tx_receipt['status'] != 1:
+            raise ValueError(f"Transaction {tx_hash.hex()} reverted")
+        return tx_receipt
+
+    async def _transact_write(self, call: Tuple) -> bool:
+        """Sends the write call of a write method and waits for its receipt, its error message is printed if it fails.\n
+        returns 'True' if transaction was successful otherwise returns 'False'"""
+        if call is None:
+            return False
+        chain, function, sender, error = call
+        if chain == 'supply_chain':
+            w3, accounts = self.supply_chain_w3, self.supply_chain_accounts
+        else:
+            w3, accounts = self.bridge_w3, self.bridge_accounts
+        try:
+            await self._transact(w3, function, accounts[0] if sender is None else sender)
+        except Exception:
+            print(f"[ERROR] {error}")
+            return False
+        return True
+
+    # SUPPLY CHAIN CONTRACT METHODS--------------------------------------------------
+    async def buy_items(self, buy_list: List[int]) -> bool:
+        """Buy items based on a list of 8 integers indicating how many of each item you want to get.\n
+        Argument: List of integers indicating the number of each item you want to buy\n
+        [NAND-6, NOR-6, NAND-8, NOR-8, NAND-12, NOR-12, NAND-14, NOR-14]\n
+        returns 'True' if transaction was successful otherwise returns 'False'"""
+        # Error Checking
+        if not await self.is_connected():
+            return False
+        # Send Transaction
+        return await self._transact_write(self._buy_items_call(buy_list))
+
+    async def get_product_info(self, gate: int, pins: int) -> Tuple:
+        """Gets information about each product in the Supply Chain.\n
+        returns: name, manufacturer, department, price in US cents, input voltage, number left in stock,
+        number of gates in chip\n
+        returns: None if an error occurs."""
+        if not await self.is_connected():
+            return None
+        if type(gate) != int or type(pins) != int:
+            print("[ERROR] Arguments are not integers!")
+            return None
+        return await self._call(
+            self.supply_chain_w3,
+            self.supply_chain_contract.functions.inquire_product(gate, pins)
+        )
+
+    async def _load_products(self) -> Tuple:
+        "Reads the product information of every product in one call along with the block it was read at"
+        block = await self.supply_chain_w3.eth.block_number
+        infos = await self._multicall(
+            self.supply_chain_w3,
+            self.supply_chain_multicall,
+            [self.supply_chain_contract.functions.inquire_product(gate, pins) for gate, pins in self.PRODUCTS],
+            block
+        )
+        return dict(zip(self.PRODUCTS, infos)), block
+
+    async def _catalog_get(self, key: Tuple[int, int]) -> List:
+        "Returns the product info of 'key' from the catalog cache, reading every product at once on a miss"
+        info = self.catalog.cached(key)
+        if info is None:
+            info = self.catalog.store(*await self._load_products())[key]
+        return info
+
+    async def get_product_price(self, gate: int, pins: int) -> int:
+        """Gets the price of a product in US cents from the catalog cache.\n
+        Only reads the contract when the product is not cached or the catalog is not tracking events.\n
+        returns: None if an error occurs."""
+        # Cached reads do not need a round trip to check the connection
+        if self.supply_chain_contract == None:
+            print("[ERROR] Please Connect to Smart Contract.")
+            return None
+        if type(gate) != int or type(pins) != int:
+            print("[ERROR] Arguments are not integers!")
+            return None
+        return (await self._catalog_get((gate, pins)))[3]
+
+    async def get_product_stock(self, gate: int, pins: int) -> int:
+        """Gets the number of items left in stock of a product from the catalog cache.\n
+        returns: None if an error occurs."""
+        # Cached reads do not need a round trip to check the connection
+        if self.supply_chain_contract == None:
+            print("[ERROR] Please Connect to Smart Contract.")
+            return None
+        if type(gate) != int or type(pins) != int:
+            print("[ERROR] Arguments are not integers!")
+            return None
+        return (await self._catalog_get((gate, pins)))[5]
+
+    async def change_item_info(self, gate: int, pins: int, price: int, voltage: int) -> bool:
+        """This coroutine can only be used by the admin.\n
+        Changes the price and voltage of a particular item in Supply Chain.\n
+        Price: US Cents, Voltage: millivolts\n
+        returns 'True' if transaction was successful otherwise returns 'False'"""
+        # Error Checking
+        if not await self.is_connected():
+            return False
+        # Send Transaction
+        return await self._transact_write(self._change_item_info_call(gate, pins, price, voltage))
+
+    async def add_product(self, gate: int, pins: int, num_items: int) -> bool:
+        """To be used by the Admin of the supply chain.\n
+        Adds 'num_items' number of items to the chip type\n
+        returns 'True' if transaction was successful otherwise returns 'False'"""
+        # Error Checking
+        if not await self.is_connected():
+            return False
+        # Send Transaction
+        return await self._transact_write(self._add_product_call(gate, pins, num_items))
+
+    async def defective_products(self, defective_list: List[int]) -> bool:
+        """A coroutine to be used by the admin of supply chain contract.\n
+        A coroutine used to remove defective products from the supply chain.\n
+        argument: defective_list is a list of 8 integers that are the number of each corresponding item below.\n
+        [NAND-6, NOR-6, NAND-8, NOR-8, NAND-12, NOR-12, NAND-14, NOR-14]\n
+        returns 'True' if transaction was successful otherwise returns 'False'"""
+        # Error Checking
+        if not await self.is_connected():
+            return False
+        # Send Transaction
+        return await self._transact_write(self._defective_products_call(defective_list))
+    # ---------------------------------------------------------------------------------
+
+    # BRIDGE CONTRACT METHODS----------------------------------------------------------
+    async def create_basket(self, receipt_number: int) -> bool:
+        """Create a new transaction to get total of all items in the basket.\n
+        arguments: receipt_number is the receipt number of basket to be paid with bitcoin.\n
+        returns 'True' if transaction was successful otherwise returns 'False'"""
+        # Error Checking
+        if not await self.is_connected():
+            return False
+        # Send Transaction
+        return await self._transact_write(self._create_basket_call(receipt_number))
+
+    async def add_items_to_basket(self, receipt_number: int, items: List[int], prices: List[int]) -> bool:
+        """Add particular items to the basket to be ready for payment.\n
+        Arguments:\n
+        \treceipt_num -> integer representing the receipt number of basket\n
+        \titems -> A list of item numbers to be added to basket\n
+        \tprices -> A list of prices in cents used to calculate new total for whole basket.\n
+        returns 'True' if transaction was successful otherwise returns 'False'"""
+        # Error Checking
+        if not await self.is_connected():
+            return False
+        # Send Transaction
+        return await self._transact_write(self._add_items_to_basket_call(receipt_number, items, prices))
+
+    async def create_basket_with_items(self, receipt_number: int, items: List[int], prices: List[int]) -> bool:
+        """Creates a new basket and adds its items in a single transaction.\n
+        Arguments:\n
+        \treceipt_num -> integer representing the receipt number of the new basket\n
+        \titems -> A list of item numbers to be added to basket\n
+        \tprices -> A list of prices in cents used to calculate the total of the basket.\n
+        returns 'True' if transaction was successful otherwise returns 'False'"""
+        # Error Checking
+        if not await self.is_connected():
+            return False
+        # Send Transaction
+        return await self._transact_write(self._create_basket_with_items_call(receipt_number, items, prices))
+
+    async def seller_confirmation(self, receipt_number: int, seller_address: str) -> bool:
+        """Coroutine to get confirmation from the seller to proceed with payment\n
+        returns 'True' if transaction was successful otherwise returns 'False'"""
+        # Error Checking
+        if not await self.is_connected():
+            return False
+        # Send Transaction
+        return await self._transact_write(self._seller_confirmation_call(receipt_number, seller_address))
+
+    async def buyer_confirmation(self, receipt_number: int, buyer_address: str) -> bool:
+        """Coroutine to get confirmation from the buyer to proceed with payment\n
+        returns 'True' if transaction was successful otherwise returns 'False'"""
+        # Error Checking
+        if not await self.is_connected():
+            return False
+        # Send Transaction
+        return await self._transact_write(self._buyer_confirmation_call(receipt_number, buyer_address))
+
+    async def pay_basket(self, receipt_number: int) -> bool:
+        """A coroutine to initiate the payment process for a receipt number.\n
+        This method only succeeds after both the seller and the buyer have sent their
+        confirmations for payment.\n
+        returns 'True' if transaction was successful otherwise returns 'False'"""
+        # Error Checking
+        if not await self.is_connected():
+            return False
+        # Send Transaction
+        return await self._transact_write(self._pay_basket_call(receipt_number))
+
+    async def refund_basket(self, receipt_number: int) -> bool:
+        """A coroutine to initiate the refund process for a receipt number.\n
+        This method only succeeds after a payment has been successfully been processed.\n
+        returns 'True' if transaction was successful otherwise returns 'False'"""
+        # Error Checking
+        if not await self.is_connected():
+            return False
+        # Send Transaction
+        return await self._transact_write(self._refund_basket_call(receipt_number))
+
+    async def get_basket_state(self, receipt_number: int) -> int:
+        """Gets state of the basket with associated receipt number\n
+        return value: 0 -> Not Created, 1 -> Created, 2 -> Completed, 3 -> Failed, 4 -> Refunded"""
+        # Error Checking
+        if not await self.is_connected():
+            return None
+        if type(receipt_number) != int:
+            print("[ERROR] Receipt Number must be an integer!")
+            return None
+        return await self._call(self.bridge_w3, self.bridge_contract.functions.get_state(receipt_number))
+
+    async def get_basket_states(self, receipt_numbers: List[int]) -> List[int]:
+        """Gets the states of several baskets in a single call.\n
+        return value: list of states in the order of 'receipt_numbers', see get_basket_state"""
+        # Error Checking
+        if not await self.is_connected():
+            return None
+        if any(type(receipt_number) != int for receipt_number in receipt_numbers):
+            print("[ERROR] Receipt Number must be an integer!")
+            return None
+        return await self._multicall(
+            self.bridge_w3,
+            self.bridge_multicall,
+            [self.bridge_contract.functions.get_state(receipt_number) for receipt_number in receipt_numbers]
+        )
+
+    async def get_num_baskets(self) -> int:
+        """Gets the number of baskets made by the TransactionBridge Contract."""
+        # Error Checking
+        if not await self.is_connected():
+            return None
+        return await self._call(self.bridge_w3, self.bridge_contract.functions.get_num_trans())
+
+    # ---------------------------------------------------------------------------------
+
+    # BITCOIN METHODS------------------------------------------------------------------
+    # bit only has a blocking client so these run in the default thread pool
+    async def get_balance_btc(self, currency: str) -> None:
+        """Gets the buyer and seller balances in either usd or btc\n
+        currency: 'usd' or 'btc'"""
+        await asyncio.to_thread(super().get_balance_btc, currency)
+
+    async def send_btc(self, amount: int, reverse: bool = False) -> bool:
+        """Sends 'amount', in US cents, worth of bitcoin from one account to another\n
+        by default sends from buyer to seller\n
+        if reverse = True then sends from seller to buyer.\n
+        amount: amount to send in cents (USD)"""
+        return await asyncio.to_thread(super().send_btc, amount, reverse)
+
+    async def queue_btc(self, receipt_number: int, amount: int, reverse: bool = False) -> bool:
+        """Records a payout of 'amount', in US cents, worth of bitcoin for 'receipt_number' in the
+        payout queue, it is sent in the background\n
+        by default sends from buyer to seller\n
+        if reverse = True then sends from seller to buyer (a refund).\n
+        returns: False if this payout of the receipt was already recorded"""
+        # Writing the payout waits for the disk
+        return await asyncio.to_thread(super().queue_btc, receipt_number, amount, reverse)
+
+    # ---------------------------------------------------------------------------------
@@ -0,0 +1,40 @@
+"""
+This file contains the block checkpoint used by the event listener to remember the last
+block it fully processed on every chain, so that events emitted while it was down can be
+replayed on the next start.
+"""
+import os
+import json
+import threading
+from typing import List, Optional
+
+class BlockCheckpoint:
+    """Stores the last fully processed block of every chain in a json file.\n
+    Every entry is tied to the contract addresses it was recorded for, so a checkpoint
+    of an older deployment is ignored after redeploying the contracts."""
+    def __init__(self, path: str):
+        # Instance Variables
+        self.path = path
+        self.lock = threading.Lock()
+        self.chains = {}
+        if os.path.exists(path):
+            with open(path, 'r') as file_obj:
+                self.chains = json.load(file_obj)
+
+    def get(self, name: str, addresses: List[str]) -> Optional[int]:
+        """Gets the last processed block of chain 'name'.\n
+        returns None if there is no checkpoint for these contract addresses."""
+        with self.lock:
+            entry = self.chains.get(name)
+        if entry is None or sorted(entry['addresses']) != sorted(addresses):
+            return None
+        return entry['block']
+
+    def save(self, name: str, addresses: List[str], block: int) -> None:
+        "Records 'block' as the last processed block of chain 'name'"
+        with self.lock:
+            self.chains[name] = {'addresses': list(addresses), 'block': block}
+            # Write to a temporary file first so a crash never leaves a broken checkpoint
+            with open(self.path + '.tmp', 'w') as file_obj:
+                json.dump(self.chains, file_obj)
+            os.replace(self.path + '.tmp', self.path)
@@ -0,0 +1,71 @@
+"""
+This file contains the connection health monitor of the Bitcoin Bridge system. A background
+heartbeat checks the blockchain endpoints every few seconds so the contract methods can
+look up a cached state instead of making a round trip before every call.
+"""
+import threading
+from typing import Callable, Dict
+
+class ConnectionHealth:
+    """Keeps the last known state of every web3 endpoint.\n
+    'start' checks every endpoint once and then keeps checking them on a daemon thread every
+    'interval' seconds. 'is_up' only reads the cached state, so methods fail fast while an
+    endpoint is known to be down and pay nothing while it is up."""
+    def __init__(self, endpoints: Dict[str, object], interval: float = 5, on_reconnect: Callable = None):
+        """endpoints: name -> web3 instance of every endpoint to watch\n
+        on_reconnect: function called with the name of an endpoint reached again after it was down"""
+        # Instance Variables
+        self.endpoints = endpoints
+        self.interval = interval
+        self.on_reconnect = on_reconnect
+        self.lock = threading.Lock()
+        # name -> True when the last check reached the endpoint, None before the first check
+        self.state: Dict[str, bool] = {name: None for name in endpoints}
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self) -> None:
+        "Checks every endpoint now and starts the heartbeat thread"
+        self.check()
+        if self.thread is None:
+            self.thread = threading.Thread(target = self._heartbeat, name = "heartbeat", daemon = True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        "Stops the heartbeat thread"
+        self.stopped.set()
+
+    def _heartbeat(self) -> None:
+        "Checks every endpoint once per interval until stopped"
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def check(self) -> bool:
+        """Checks every endpoint with a round trip and updates the cached state.\n
+        returns: True if every endpoint is up"""
+        for name, w3 in self.endpoints.items():
+            try:
+                up = w3.isConnected()
+            except Exception:
+                up = False
+            with self.lock:
+                previous = self.state[name]
+                self.state[name] = up
+            if previous == False and up:
+                print(f"[SUCCESS] {name} network is reachable again.")
+                if self.on_reconnect is not None:
+                    # A failing callback must not stop the heartbeat
+                    try:
+                        self.on_reconnect(name)
+                    except Exception as err:
+                        print(f"[ERROR] Reconnect handler of {name} network failed: {err}")
+            elif previous != False and not up:
+                print(f"[ERROR] {name} network is down!")
+        return self.is_up()
+
+    def is_up(self, name: str = None) -> bool:
+        "Returns the cached state of one endpoint or whether every endpoint is up"
+        with self.lock:
+            if name is not None:
+                return self.state[name]
+            return all(up == True for up in self.state.values())
@@ -0,0 +1,100 @@
+"""
+This file contains the deployment manifest of the Bitcoin Bridge system. Every deployed
+contract is recorded in a single versioned json file along with its chain, the block it was
+deployed at, the hash of its source and the precomputed selectors of its functions and
+topics of its events. Deployments saved in the older two-line .info files can still be read.
+"""
+import os
+import json
+import hashlib
+from eth_utils import event_abi_to_log_topic, function_abi_to_4byte_selector
+from typing import Dict, List, Optional, Tuple
+
+# Version of the manifest layout, manifests of another version are ignored
+MANIFEST_VERSION = 1
+MANIFEST_FILE = "deployment.json"
+
+def source_hash(path: str) -> str:
+    "Returns the sha256 hash of the contract source file at 'path'"
+    with open(path, 'rb') as file_obj:
+        return hashlib.sha256(file_obj.read()).hexdigest()
+
+class DeploymentManifest:
+    """Reads and writes the deployment manifest kept in the contracts folder 'directory'.\n
+    Contracts missing from the manifest are read from '<directory>/<name>.info' when it exists,
+    those entries have no deploy block, selectors or topics."""
+    def __init__(self, directory: str):
+        # Instance Variables
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_FILE)
+        # contract name -> entry
+        self.contracts: Dict[str, dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as file_obj:
+                manifest = json.load(file_obj)
+            if manifest.get('version') == MANIFEST_VERSION:
+                self.contracts = manifest['contracts']
+
+    def add(self, name: str, chain: str, address: str, abi: List, deploy_block: int, source_hash: str) -> None:
+        "Records a deployed contract, call 'save' once every contract is added"
+        self.contracts[name] = {
+            'chain': chain,
+            'address': address,
+            'deploy_block': deploy_block,
+            'source_hash': source_hash,
+            'selectors': {
+                item['name']: '0x' + function_abi_to_4byte_selector(item).hex()
+                for item in abi if item['type'] == 'function'
+            },
+            'topics': {
+                item['name']: '0x' + event_abi_to_log_topic(item).hex()
+                for item in abi if item['type'] == 'event'
+            },
+            'abi': abi
+        }
+
+    def save(self) -> None:
+        "Writes the manifest with every recorded contract"
+        # Write to a temporary file first so a failed deploy never leaves a broken manifest
+        with open(self.path + '.tmp', 'w') as file_obj:
+            json.dump({'version': MANIFEST_VERSION, 'contracts': self.contracts}, file_obj)
+        os.replace(self.path + '.tmp', self.path)
+
+    def get(self, name: str) -> Optional[dict]:
+        """Gets the entry of contract 'name', falling back to its legacy .info file.\n
+        returns None if the contract was never deployed"""
+        entry = self.contracts.get(name)
+        if entry is not None:
+            return entry
+        info_file = os.path.join(self.directory, f"{name}.info")
+        if not os.path.exists(info_file):
+            return None
+        with open(info_file, 'r') as file_obj:
+            contract_info = file_obj.readlines()
+        return {
+            'address': contract_info[0][:-1],
+            'abi': json.loads(contract_info[1]),
+            'deploy_block': None,
+            'selectors': {},
+            'topics': {}
+        }
+
+    def deploy_block(self, name: str) -> Optional[int]:
+        "Gets the block contract 'name' was deployed at, None if unknown"
+        entry = self.get(name)
+        return None if entry is None else entry['deploy_block']
+
+    def topics(self, name: str) -> Dict[str, bytes]:
+        "Gets the topic of every event of contract 'name' by event name"
+        entry = self.get(name)
+        if entry is None:
+            return {}
+        return {event: bytes.fromhex(topic[2:]) for event, topic in entry['topics'].items()}
+
+def load_contract(directory: str, name: str) -> Tuple[str, List]:
+    """Gets the address and abi of contract 'name' deployed from the contracts folder 'directory'.\n
+    Raises FileNotFoundError if the contract was never deployed."""
+    entry = DeploymentManifest(directory).get(name)
+    if entry is None:
+        raise FileNotFoundError(f"No deployment of {name} found in {directory}, please deploy the contracts first.")
+    return entry['address'], entry['abi']
@@ -0,0 +1,44 @@
+"""
+This file contains the batching API of the Multicall helper contract. View calls to the
+contracts of one chain are collected and run together in a single eth_call.
+"""
+from web3._utils.abi import get_abi_output_types
+from typing import List
+
+def aggregate_call(multicall_contract, functions: List):
+    "Returns the call of the Multicall contract running every function of 'functions'"
+    return multicall_contract.functions.aggregate(
+        [(function.address, function._encode_transaction_data()) for function in functions]
+    )
+
+def decode_result(w3, function, data: bytes):
+    "Decodes the raw result of a view call, a single output is returned on its own"
+    decoded = w3.codec.decode_abi(get_abi_output_types(function.abi), data)
+    return decoded[0] if len(decoded) == 1 else decoded
+
+class MulticallBatch:
+    """Collects view calls of contracts living on one chain and runs them as one eth_call
+    through the Multicall contract of that chain.\n
+    When the chain has no Multicall contract the calls are run one by one instead."""
+    def __init__(self, w3, multicall_contract = None):
+        # Instance Variables
+        self.w3 = w3
+        self.multicall = multicall_contract
+        self.calls = []
+
+    def add(self, function) -> int:
+        """Adds a view call to the batch.\n
+        function: contract function with its arguments i.e. contract.functions.get_state(receipt_number)\n
+        returns the index of its result in the list returned by 'execute'"""
+        self.calls.append(function)
+        return len(self.calls) - 1
+
+    def execute(self, block_identifier = 'latest') -> List:
+        """Runs every call of the batch at 'block_identifier'.\n
+        returns the decoded result of every call in the order they were added"""
+        if not self.calls:
+            return []
+        if self.multicall is None:
+            return [function.call(block_identifier = block_identifier) for function in self.calls]
+        _, return_data = aggregate_call(self.multicall, self.calls).call(block_identifier = block_identifier)
+        return [decode_result(self.w3, function, data) for function, data in zip(self.calls, return_data)]
@@ -0,0 +1,153 @@
+"""
+This file contains the settlement engine of the Bitcoin Bridge system. Payments go from the
+buyer to the seller and refunds from the seller back to the buyer, so over a settlement
+window they are netted against each other and only the difference is sent on chain. Every
+settlement and the receipts it covers are kept in the payout database as an audit trail.
+"""
+import time
+from bit.transaction import calc_txid
+from functions.payout_queue import PayoutQueue
+from typing import Dict, List, Optional, Tuple
+
+class NettingPayoutQueue(PayoutQueue):
+    """Payout queue netting the queued payouts between two of our own keys.\n
+    Every 'window' seconds the payouts queued between each pair of keys are settled with a
+    single transaction paying the net amount to the side owed, or with no transaction at all
+    when they cancel out. The payouts of the paying side point to output 0 of the settlement
+    transaction, the payouts it offsets have no output of their own. Payouts to an address
+    that is not one of our keys are sent like in PayoutQueue."""
+    def __init__(self, path: str, wallet, window: float = 30, max_outputs: int = 500):
+        """window: seconds of the settlement window\n
+        max_outputs: most payouts settled together"""
+        super().__init__(path, wallet, window, max_outputs)
+        with self.lock:
+            self.db.execute("""CREATE TABLE IF NOT EXISTS settlements (
+                settlement_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payer TEXT NOT NULL,
+                payee TEXT NOT NULL,
+                satoshis INTEGER NOT NULL,
+                gross INTEGER NOT NULL,
+                num_payouts INTEGER NOT NULL,
+                txid TEXT,
+                created REAL NOT NULL
+            )""")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS settlement_payouts (
+                settlement_id INTEGER NOT NULL REFERENCES settlements (settlement_id),
+                receipt_number INTEGER NOT NULL,
+                direction TEXT NOT NULL,
+                satoshis INTEGER NOT NULL,
+                PRIMARY KEY (receipt_number, direction, settlement_id)
+            )""")
+
+    def _send_queued(self, queued: List[Tuple]) -> None:
+        "Settles the queued payouts between our own keys and sends the others"
+        pairs: Dict[Tuple[str, str], List[Tuple]] = {}
+        others = []
+        for payout in queued:
+            _, _, sender, address, _, _ = payout
+            if address in self.wallet.keys:
+                pairs.setdefault(tuple(sorted((sender, address))), []).append(payout)
+            else:
+                others.append(payout)
+        for pair, payouts in pairs.items():
+            for start in range(0, len(payouts), self.max_outputs):
+                self._settle(pair, payouts[start:start + self.max_outputs])
+        if others:
+            super()._send_queued(others)
+
+    def _settle(self, pair: Tuple[str, str], payouts: List[Tuple]) -> None:
+        "Sends the net amount of 'payouts' between the two keys of 'pair' in one transaction"
+        first, second = pair
+        net = sum(satoshis if sender == first else -satoshis for _, _, sender, _, satoshis, _ in payouts)
+        payer, payee = (first, second) if net > 0 else (second, first)
+        net = abs(net)
+        gross = sum(payout[4] for payout in payouts)
+        attempts = max(payout[5] for payout in payouts)
+        raw_tx = None
+        txid = None
+        if net > 0:
+            try:
+                raw_tx = self.wallet.build(self.wallet.keys[payer], [(payee, net, 'satoshi')])
+            except Exception as err:
+                self._retry_later([(receipt_number, direction) for receipt_number, direction, _, _, _, _ in payouts],
+                                  attempts, 'queued', err)
+                return
+            txid = calc_txid(raw_tx)
+        # The settlement and its transaction are on disk before the network can see it
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            settlement_id = self.db.execute(
+                """INSERT INTO settlements (payer, payee, satoshis, gross, num_payouts, txid, created)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (payer, payee, net, gross, len(payouts), txid, time.time())
+            ).lastrowid
+            for receipt_number, direction, sender, _, satoshis, _ in payouts:
+                self.db.execute(
+                    "INSERT INTO settlement_payouts (settlement_id, receipt_number, direction, satoshis) VALUES (?, ?, ?, ?)",
+                    (settlement_id, receipt_number, direction, satoshis)
+                )
+                self.db.execute(
+                    """UPDATE payouts SET status = ?, txid = ?, output_index = ?, raw_tx = ?
+                    WHERE receipt_number = ? AND direction = ?""",
+                    ('netted' if txid is None else 'signed', txid, 0 if txid is not None and sender == payer else None,
+                     raw_tx, receipt_number, direction)
+                )
+            self.db.execute("COMMIT")
+            if txid is not None:
+                self.transactions += 1
+        print(f"Settlement {settlement_id}: {len(payouts)} payouts of {gross} satoshis netted to {net} satoshis")
+        if txid is None:
+            for receipt_number, direction, _, _, _, _ in payouts:
+                print(f"[SUCCESS] {direction.capitalize()} of receipt {receipt_number} cancelled out in settlement {settlement_id}")
+            return
+        self._broadcast(txid, raw_tx, attempts)
+
+    def audit(self, receipt_number: int) -> List[dict]:
+        """returns: every payout of 'receipt_number' with the settlement that covered it"""
+        with self.lock:
+            rows = self.db.execute(
+                """SELECT p.direction, p.satoshis, p.status, s.settlement_id, s.payer, s.payee, s.satoshis, s.gross, s.txid
+                FROM payouts p LEFT JOIN settlement_payouts sp
+                ON sp.receipt_number = p.receipt_number AND sp.direction = p.direction
+                LEFT JOIN settlements s ON s.settlement_id = sp.settlement_id
+                WHERE p.receipt_number = ? ORDER BY p.created""",
+                (receipt_number,)
+            ).fetchall()
+        return [
+            {
+                'direction': direction, 'satoshis': satoshis, 'status': status, 'settlement_id': settlement_id,
+                'payer': payer, 'payee': payee, 'net': net, 'gross': gross, 'txid': txid
+            }
+            for direction, satoshis, status, settlement_id, payer, payee, net, gross, txid in rows
+        ]
+
+    def settlement(self, settlement_id: int) -> Optional[dict]:
+        """returns: a settlement with the receipts it covered or None if it does not exist"""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT payer, payee, satoshis, gross, num_payouts, txid, created FROM settlements WHERE settlement_id = ?",
+                (settlement_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            payouts = self.db.execute(
+                "SELECT receipt_number, direction, satoshis FROM settlement_payouts WHERE settlement_id = ?",
+                (settlement_id,)
+            ).fetchall()
+        payer, payee, net, gross, num_payouts, txid, created = row
+        return {
+            'payer': payer, 'payee': payee, 'net': net, 'gross': gross, 'num_payouts': num_payouts,
+            'txid': txid, 'created': created, 'payouts': payouts
+        }
+
+    def print_stats(self) -> None:
+        "Prints the payout queue counters and how much bitcoin volume netting kept off the chain"
+        super().print_stats()
+        with self.lock:
+            settlements, gross, net = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(gross), 0), COALESCE(SUM(satoshis), 0) FROM settlements"
+            ).fetchone()
+            netted = self.db.execute("SELECT COUNT(*) FROM payouts WHERE status = 'netted'").fetchone()[0]
+        print(f"""\nSettlements [window of {self.window}s]:
+              \r\tSettlements: {settlements}\tCancelled Out Payouts: {netted}
+              \r\tGross Volume: {gross} satoshis\tNet Volume: {net} satoshis""")
@@ -0,0 +1,250 @@
+"""
+This file contains the durable bitcoin payout queue of the Bitcoin Bridge system. Event
+handlers only record a payout in a SQLite database and return, a sender thread sends the
+recorded payouts in the background. A payout is keyed by its receipt number and direction,
+and its signed transaction is stored before it is broadcast, so a crash, a retry or a
+replayed event never pays a receipt twice.
+"""
+import time
+import sqlite3
+import threading
+from bit.transaction import calc_txid
+from typing import Dict, List, Tuple
+
+# Directions of a payout
+PAYMENT = 'payment'
+REFUND = 'refund'
+
+class PayoutQueue:
+    """Persistent queue of bitcoin payouts sent through a wallet_state.WalletState.\n
+    A payout goes from 'queued' to 'signed' once the transaction paying it is built and
+    stored, and to 'sent' once the network accepted that transaction. Payouts queued by the
+    same key are sent together, up to 'max_outputs' per transaction, every 'window' seconds.
+    A signed transaction that could not be broadcast is broadcast again, never signed again,
+    with exponential backoff until MAX_ATTEMPTS, after which its payouts are 'failed'."""
+    # Attempts before a payout is given up, and first and longest wait between two attempts
+    MAX_ATTEMPTS = 8
+    BACKOFF = 2
+    MAX_BACKOFF = 300
+
+    def __init__(self, path: str, wallet, window: float = 2, max_outputs: int = 20):
+        """path: SQLite database file, created if missing\n
+        wallet: WalletState of the keys sending the payouts"""
+        # Instance Variables
+        self.path = path
+        self.wallet = wallet
+        self.window = window
+        self.max_outputs = max_outputs
+        self.lock = threading.Lock()
+        # Handlers and the sender thread share one connection guarded by the lock
+        self.db = sqlite3.connect(path, check_same_thread = False, isolation_level = None)
+        # WAL lets the sender commit while handlers insert, FULL syncs every commit to disk
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=FULL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS payouts (
+            receipt_number INTEGER NOT NULL,
+            direction TEXT NOT NULL,
+            sender TEXT NOT NULL,
+            address TEXT NOT NULL,
+            satoshis INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            txid TEXT,
+            output_index INTEGER,
+            raw_tx TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL DEFAULT 0,
+            error TEXT,
+            created REAL NOT NULL,
+            PRIMARY KEY (receipt_number, direction)
+        )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS payouts_status ON payouts (status, next_attempt)")
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        # Counters
+        self.duplicates = 0
+        self.transactions = 0
+        self.retries = 0
+
+    def enqueue(self, receipt_number: int, direction: str, sender, address: str, satoshis: int) -> bool:
+        """Records a payout of 'satoshis' from the bit key 'sender' to 'address'.\n
+        returns: False if the payout of this receipt and direction was already recorded"""
+        with self.lock:
+            cursor = self.db.execute(
+                """INSERT OR IGNORE INTO payouts (receipt_number, direction, sender, address, satoshis, created)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                (receipt_number, direction, sender.address, address, satoshis, time.time())
+            )
+            if cursor.rowcount == 0:
+                self.duplicates += 1
+                return False
+            queued = self.db.execute("SELECT COUNT(*) FROM payouts WHERE status = 'queued' AND sender = ?",
+                                     (sender.address,)).fetchone()[0]
+        # A full transaction is sent without waiting for the window
+        if queued >= self.max_outputs:
+            self.wake.set()
+        return True
+
+    def start(self) -> None:
+        "Takes back the transactions signed before a restart and starts the sender thread"
+        with self.lock:
+            # The run before may have crashed after its broadcast, count it as an attempt so the
+            # network is asked for the transaction before it is broadcast again
+            self.db.execute("UPDATE payouts SET attempts = 1 WHERE status = 'signed' AND attempts = 0")
+            signed = self.db.execute(
+                "SELECT DISTINCT txid, raw_tx, sender FROM payouts WHERE status = 'signed'"
+            ).fetchall()
+        for txid, raw_tx, sender in signed:
+            # Keep their inputs away from new transactions while they are broadcast again
+            if not self.wallet.reserve(raw_tx, sender):
+                print(f"Inputs of stored transaction {txid} are already spent, asking the network for it")
+        if self.thread is None:
+            self.thread = threading.Thread(target = self._send_loop, name = "payout-sender", daemon = True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        "Stops the sender thread after one last round sending the due payouts"
+        self.stopped.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _send_loop(self) -> None:
+        "Sends the due payouts once per window or as soon as a transaction is full"
+        while not self.stopped.is_set():
+            self.wake.wait(self.window)
+            self.wake.clear()
+            try:
+                self.send_due()
+            except Exception as err:
+                print(f"[ERROR] Payout sender failed: {err}")
+
+    def send_due(self) -> None:
+        "Broadcasts again the signed transactions due for a retry, then sends the queued payouts"
+        now = time.time()
+        with self.lock:
+            signed = self.db.execute(
+                """SELECT txid, raw_tx, sender, MAX(attempts) FROM payouts
+                WHERE status = 'signed' AND next_attempt <= ? GROUP BY txid""",
+                (now,)
+            ).fetchall()
+            queued = self.db.execute(
+                """SELECT receipt_number, direction, sender, address, satoshis, attempts FROM payouts
+                WHERE status = 'queued' AND next_attempt <= ? ORDER BY created""",
+                (now,)
+            ).fetchall()
+        for txid, raw_tx, sender, attempts in signed:
+            with self.lock:
+                self.retries += 1
+            self._broadcast(txid, raw_tx, attempts)
+        self._send_queued(queued)
+
+    def _send_queued(self, queued: List[Tuple]) -> None:
+        """Sends the queued payouts with one transaction per sending key and 'max_outputs' payouts\n
+        queued: (receipt number, direction, sender, address, satoshis, attempts) of every payout"""
+        senders: Dict[str, List[Tuple]] = {}
+        for payout in queued:
+            senders.setdefault(payout[2], []).append(payout)
+        for sender, payouts in senders.items():
+            for start in range(0, len(payouts), self.max_outputs):
+                self._send(sender, payouts[start:start + self.max_outputs])
+
+    def _send(self, sender: str, payouts: List[Tuple]) -> None:
+        "Signs and stores one transaction paying 'payouts', then broadcasts it"
+        key = self.wallet.keys[sender]
+        outputs = [(address, satoshis, 'satoshi') for _, _, _, address, satoshis, _ in payouts]
+        try:
+            raw_tx = self.wallet.build(key, outputs)
+        except Exception as err:
+            if len(payouts) > 1:
+                print(f"[ERROR] Signing {len(payouts)} payouts together failed, signing them one by one: {err}")
+                for payout in payouts:
+                    self._send(sender, [payout])
+                return
+            receipt_number, direction, _, _, _, attempts = payouts[0]
+            self._retry_later([(receipt_number, direction)], attempts, 'queued', err)
+            return
+        txid = calc_txid(raw_tx)
+        # The transaction is on disk before the network can see it
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            for index, (receipt_number, direction, _, _, _, _) in enumerate(payouts):
+                self.db.execute(
+                    """UPDATE payouts SET status = 'signed', txid = ?, output_index = ?, raw_tx = ?
+                    WHERE receipt_number = ? AND direction = ?""",
+                    (txid, index, raw_tx, receipt_number, direction)
+                )
+            self.db.execute("COMMIT")
+            self.transactions += 1
+        self._broadcast(txid, raw_tx, max(payout[5] for payout in payouts))
+
+    def _broadcast(self, txid: str, raw_tx: str, attempts: int) -> None:
+        "Broadcasts a stored transaction and records the outcome for all of its payouts"
+        try:
+            # After a failed attempt the broadcast may still have reached the network
+            if attempts == 0 or not self.wallet.backend.is_known(txid):
+                self.wallet.backend.broadcast(raw_tx)
+        except Exception as err:
+            with self.lock:
+                payouts = self.db.execute("SELECT receipt_number, direction FROM payouts WHERE txid = ?", (txid,)).fetchall()
+            if self._retry_later(payouts, attempts, 'signed', err):
+                # Given up, its inputs can be used by new transactions again
+                self.wallet.release(raw_tx)
+            return
+        with self.lock:
+            self.db.execute("UPDATE payouts SET status = 'sent', error = NULL WHERE txid = ?", (txid,))
+            payouts = self.db.execute("SELECT receipt_number, direction, output_index FROM payouts WHERE txid = ?",
+                                      (txid,)).fetchall()
+        for receipt_number, direction, index in payouts:
+            if index is None:
+                # Offset by other payouts of the transaction instead of having its own output
+                print(f"[SUCCESS] {direction.capitalize()} of receipt {receipt_number} settled by {txid}")
+            else:
+                print(f"[SUCCESS] {direction.capitalize()} of receipt {receipt_number} sent by output {index} of {txid}")
+
+    def _retry_later(self, payouts: List[Tuple[int, str]], attempts: int, status: str, err: Exception) -> bool:
+        """Schedules the next attempt of 'payouts' with exponential backoff.\n
+        returns: True if they ran out of attempts and were marked 'failed'"""
+        attempts += 1
+        failed = attempts >= self.MAX_ATTEMPTS
+        delay = min(self.BACKOFF * 2 ** (attempts - 1), self.MAX_BACKOFF)
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            for receipt_number, direction in payouts:
+                self.db.execute(
+                    """UPDATE payouts SET status = ?, attempts = ?, next_attempt = ?, error = ?
+                    WHERE receipt_number = ? AND direction = ?""",
+                    ('failed' if failed else status, attempts, time.time() + delay, str(err), receipt_number, direction)
+                )
+            self.db.execute("COMMIT")
+        for receipt_number, direction in payouts:
+            if failed:
+                print(f"[ERROR] {direction.capitalize()} of receipt {receipt_number} failed after {attempts} attempts: {err}")
+            else:
+                print(f"[ERROR] {direction.capitalize()} of receipt {receipt_number} failed, retrying in {delay}s: {err}")
+        return failed
+
+    def status(self, receipt_number: int, direction: str = PAYMENT) -> Tuple:
+        """returns: (status, transaction id, output index) of a payout or None if it was never recorded"""
+        with self.lock:
+            return self.db.execute(
+                "SELECT status, txid, output_index FROM payouts WHERE receipt_number = ? AND direction = ?",
+                (receipt_number, direction)
+            ).fetchone()
+
+    def counts(self) -> Dict[str, int]:
+        "Returns the number of payouts in every status"
+        with self.lock:
+            rows = self.db.execute("SELECT status, COUNT(*) FROM payouts GROUP BY status").fetchall()
+        counts = {'queued': 0, 'signed': 0, 'sent': 0, 'failed': 0}
+        counts.update(rows)
+        return counts
+
+    def print_stats(self) -> None:
+        "Prints how many payouts are in every status and how many transactions were sent"
+        counts = self.counts()
+        with self.lock:
+            print(f"""\nPayout Queue [{self.path}, window of {self.window}s, up to {self.max_outputs} outputs]:
+                  \r\tQueued: {counts['queued']}\tSigned: {counts['signed']}\tSent: {counts['sent']}\tFailed: {counts['failed']}
+                  \r\tBitcoin Transactions: {self.transactions}\tRetries: {self.retries}\tDuplicates: {self.duplicates}""")
@@ -0,0 +1,141 @@
+"""
+This file contains the product catalog cache of the Bitcoin Bridge system. It keeps the
+product information of the supply chain contract in memory and keeps it up to date with
+the events of the contract, so that pricing a basket does not need any RPC.
+"""
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+class ProductCatalog:
+    """In-process copy of the product information returned by 'inquire_product'.\n
+    When a bulk loader is given, a miss reads every product at once in a single call.
+    Every entry remembers the block it was read at and only events of later blocks are
+    applied to it. Until 'track' attaches the catalog to an EventPoller nothing keeps the
+    entries up to date, so every lookup reads the contract again."""
+    def __init__(self, loader: Callable, products: Tuple[Tuple[int, int], ...], key_args: Tuple[str, str],
+                 stock_index: int, changed_fields: Dict[str, int], bulk_loader: Callable = None):
+        """loader: function returning (product info, block number) for a product key\n
+        products: product keys in the order of the items_bought/items_defective lists\n
+        key_args: names of the two event arguments forming a product key\n
+        stock_index: index of the number of items in stock in the product info\n
+        changed_fields: index in the product info of every value of the price_changed event\n
+        bulk_loader: function returning ({product key: product info}, block number) for every product"""
+        # Instance Variables
+        self.loader = loader
+        self.bulk_loader = bulk_loader
+        self.products = products
+        self.key_args = key_args
+        self.stock_index = stock_index
+        self.changed_fields = changed_fields
+        self.lock = threading.Lock()
+        # product key -> (product info, block the info is up to date with)
+        self.entries: Dict[Tuple[int, int], Tuple[List, int]] = {}
+        # product key -> block of the last event seen for the product
+        self.event_blocks: Dict[Tuple[int, int], int] = {}
+        self.tracking = False
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[int, int]) -> List:
+        "Returns the product info of 'key', reading the contract only on a cache miss"
+        info = self.cached(key)
+        if info is not None:
+            return info
+        if self.bulk_loader is not None:
+            infos = self.refresh()
+            if key in infos:
+                return infos[key]
+        info, block = self.loader(*key)
+        info = list(info)
+        self._store(key, info, block)
+        return list(info)
+
+    def refresh(self) -> Dict[Tuple[int, int], List]:
+        """Reads every product with the bulk loader and caches them.\n
+        returns: the product info of every product"""
+        return self.store(*self.bulk_loader())
+
+    def cached(self, key: Tuple[int, int]) -> Optional[List]:
+        """Returns the cached product info of 'key' or None on a cache miss, so a caller that
+        reads the contract on its own (i.e. asynchronously) can 'store' what it read"""
+        with self.lock:
+            if self.tracking and key in self.entries:
+                self.hits += 1
+                return list(self.entries[key][0])
+            self.misses += 1
+        return None
+
+    def store(self, infos: Dict[Tuple[int, int], List], block: int) -> Dict[Tuple[int, int], List]:
+        """Caches the product info of every product read at 'block'.\n
+        returns: the product info of every product"""
+        infos = {key: list(info) for key, info in infos.items()}
+        for key, info in infos.items():
+            self._store(key, info, block)
+        return infos
+
+    def _store(self, key: Tuple[int, int], info: List, block: int) -> None:
+        "Caches the product info of 'key' read at 'block'"
+        with self.lock:
+            # Do not cache a read that may have missed an event the poller already applied
+            if self.tracking and block >= self.event_blocks.get(key, -1):
+                self.entries[key] = (list(info), block)
+
+    def invalidate(self, key: Tuple[int, int] = None) -> None:
+        "Drops the cached info of 'key' or of every product when no key is given"
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def _apply(self, key: Tuple[int, int], block: int, changes: Dict[int, int], delta: int = 0) -> None:
+        "Applies the changes of an event of 'block' to the cached info of 'key'"
+        with self.lock:
+            self.event_blocks[key] = max(block, self.event_blocks.get(key, -1))
+            if key not in self.entries:
+                return
+            info, cached_block = self.entries[key]
+            # The cached info already includes this event
+            if block <= cached_block:
+                return
+            for index, value in changes.items():
+                info[index] = value
+            info[self.stock_index] += delta
+
+    def _key(self, event) -> Tuple[int, int]:
+        "Gets the product key out of the arguments of an event"
+        return tuple(event['args'][name] for name in self.key_args)
+
+    # EVENT OBSERVERS------------------------------------------------------------------
+    def on_added_products(self, event) -> None:
+        "Adds the new items of an added_products event to the stock"
+        self._apply(self._key(event), event['blockNumber'], {}, event['args']['num_added'])
+
+    def on_items_bought(self, event) -> None:
+        "Removes the items of an items_bought event from the stock"
+        for index, key in enumerate(self.products):
+            if event['args']['num_buy'][index]:
+                self._apply(key, event['blockNumber'], {}, -event['args']['num_buy'][index])
+
+    def on_items_defective(self, event) -> None:
+        "Removes the items of an items_defective event from the stock"
+        for index, key in enumerate(self.products):
+            if event['args']['num_defective'][index]:
+                self._apply(key, event['blockNumber'], {}, -event['args']['num_defective'][index])
+
+    def on_price_changed(self, event) -> None:
+        "Updates the price and properties of a product from a price_changed event"
+        changes = {index: event['args'][name] for name, index in self.changed_fields.items()}
+        self._apply(self._key(event), event['blockNumber'], changes)
+
+    def track(self, poller, events) -> None:
+        """Keeps the catalog up to date with the events of the supply chain contract.\n
+        poller: EventPoller of the supply chain\n
+        events: events of the supply chain contract i.e. contract.events"""
+        poller.observe(events.added_products, self.on_added_products)
+        poller.observe(events.items_bought, self.on_items_bought)
+        poller.observe(events.items_defective, self.on_items_defective)
+        poller.observe(events.price_changed, self.on_price_changed)
+        with self.lock:
+            self.tracking = True
+    # ---------------------------------------------------------------------------------
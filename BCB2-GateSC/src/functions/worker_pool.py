@@ -0,0 +1,85 @@
+"""
+This file contains the worker pool used by the event listener to run event handlers.
+A fixed number of threads work through a bounded queue so that a burst of events can
+not start an unbounded number of threads.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+class BoundedExecutor:
+    """Runs handlers on 'max_workers' threads with room for 'max_queue' waiting handlers.\n
+    try_submit refuses new work when the queue is full so the caller can apply
+    backpressure instead of piling up threads."""
+    def __init__(self, max_workers: int = 8, max_queue: int = 100):
+        # Instance Variables
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers = max_workers, thread_name_prefix = "handler")
+        self.slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self.lock = threading.Lock()
+        # Counters
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.pending = 0
+        self.running = 0
+
+    def try_submit(self, handler: Callable, *args) -> Optional[Future]:
+        """Queues 'handler(*args)' to be run by a worker.\n
+        returns the Future of the handler or None if the queue is full."""
+        if not self.slots.acquire(blocking = False):
+            with self.lock:
+                self.rejected += 1
+            return None
+        with self.lock:
+            self.submitted += 1
+            self.pending += 1
+        return self.executor.submit(self._run, handler, args)
+
+    def _run(self, handler: Callable, args: tuple):
+        "Runs a single handler, keeps the counters up to date and returns what the handler returned"
+        with self.lock:
+            self.running += 1
+        try:
+            return handler(*args)
+        except Exception as err:
+            with self.lock:
+                self.failed += 1
+            print(f"[ERROR] Handler '{handler.__name__}' failed: {err}")
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.pending -= 1
+                self.completed += 1
+            self.slots.release()
+
+    def queue_depth(self) -> int:
+        "Number of handlers waiting for a free worker"
+        with self.lock:
+            return self.pending - self.running
+
+    def stats(self) -> Dict[str, int]:
+        "Returns a snapshot of the counters of the pool"
+        with self.lock:
+            return {
+                'queue_depth': self.pending - self.running,
+                'running': self.running,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
+
+    def print_stats(self) -> None:
+        "Prints the counters of the pool"
+        stats = self.stats()
+        print(f"""\nWorker Pool [{self.max_workers} workers, queue of {self.max_queue}]:
+              \r\tQueue Depth: {stats['queue_depth']}\tRunning: {stats['running']}
+              \r\tSubmitted: {stats['submitted']}\tCompleted: {stats['completed']}
+              \r\tFailed: {stats['failed']}\tRejected: {stats['rejected']}""")
+
+    def shutdown(self, wait: bool = True) -> None:
+        "Stops the workers once the queued handlers are done"
+        self.executor.shutdown(wait = wait)
@@ -1,3 +1,6 @@
+import sys
+import shlex
+from concurrent.futures import Future
 from functions.bcb_functions import BitcoinBridgeGanache
 
 bcb = BitcoinBridgeGanache()
@@ -13,6 +16,8 @@ gate_dict = {
     2: 'NOR'
 }
 receipts = set()
+# Arguments left of the scripted command being run, None when running interactively
+script_args = None
 chips_tuple = (
     (1,1),
     (2,1),
@@ -24,7 +29,7 @@ chips_tuple = (
     (2,4)
 )
 
-def main():
+def print_menu():
     print("""\n------------------------------------------------
     \rWelcome to the Bitcoin Bridge System Demo!
     \rPlease select from one of the following options:
@@ -43,70 +48,86 @@ def main():
     \r\t13. [Admin] Transfer Money (Between Seller/Buyer)
     \r------------------------------------------------\n
     """)
-    
-    choice = int(input("Please select an option from the above choices [1-13] or press 0 to exit: "))
-    
-    if choice == 0:
-        print("\nExiting from Bitcoin Bridge System!")
-        exit()
-    elif choice == 1:
-        print()
-        deploy_system()
-    elif choice == 2:
-        print()
-        connect_system()
-    elif choice == 3:
-        print()
-        instructions()
-    elif choice == 4:
-        print()
-        product_info()
-    elif choice == 5:
-        print()
-        buy_items()
-    elif choice == 6:
-        print()
-        change_item()
-    elif choice == 7:
-        print()
-        add_more_item()
-    elif choice == 8:
-        print()
-        seller_confirm()
-    elif choice == 9:
-        print()
-        buyer_confirm()
-    elif choice == 10:
-        print()
-        pay_for_item()
-    elif choice == 11:
-        print()
-        bitcoin_wallet_info()
-    elif choice == 12:
-        print()
-        process_refund()
-    elif choice == 13:
+
+def main():
+    "Shows the menu and runs the selected options until the user exits"
+    while True:
+        print_menu()
+        try:
+            choice = int(input("Please select an option from the above choices [1-13] or press 0 to exit: "))
+        except ValueError:
+            choice = None
+        except EOFError:
+            # Input closed, i.e. Ctrl-D or the end of a piped file
+            choice = 0
+        if choice == 0:
+            print("\nExiting from Bitcoin Bridge System!")
+            return
+        if choice not in MENU:
+            print(f"[ERROR] Invalid option, please enter a number between 0 and {len(MENU)}.")
+            continue
         print()
-        transfer_money()
-    else:
-        main()
+        run_command(MENU[choice])
+
+def run_command(name):
+    """Runs the command 'name', printing its error instead of leaving the session.\n
+    returns: True if the command succeeded"""
+    try:
+        result = COMMANDS[name]()
+    except Exception as err:
+        print(f"[ERROR] {name} failed: {err}")
+        return False
+    # Commands sending a transaction return its Future, the bridge prints why it failed
+    if isinstance(result, Future) and result.exception() is not None:
+        return False
+    return True
+
+def run_script(file_obj):
+    """Runs one named command per line with its answers as arguments, i.e. 'pay_for_items 123456'.\n
+    Empty lines and comments starting with '#' are skipped, 'exit' stops the script.\n
+    returns: the number of failed commands"""
+    global script_args
+    failed = 0
+    for line_num, line in enumerate(file_obj, 1):
+        words = shlex.split(line, comments = True)
+        if not words:
+            continue
+        if words[0] == 'exit':
+            break
+        if words[0] not in COMMANDS:
+            print(f"[ERROR] Line {line_num}: unknown command '{words[0]}', expected one of {', '.join(COMMANDS)}")
+            failed += 1
+            continue
+        script_args = words[1:]
+        if not run_command(words[0]):
+            failed += 1
+        elif script_args:
+            print(f"[ERROR] Line {line_num}: unused arguments {' '.join(script_args)}")
+            failed += 1
+    script_args = None
+    return failed
+
+def ask(prompt):
+    "Reads the answer to a prompt from the user, or from the arguments of the scripted command"
+    if script_args is None:
+        return input(prompt)
+    if not script_args:
+        raise ValueError(f"missing argument for '{prompt.strip()}'")
+    return script_args.pop(0)
 
 def chip_choice():
-    gate = int(input("Please enter the Gate Type of the product [1-2]: "))
-    pins = int(input("Please enter the Pins Type of the product[1-4]: "))
+    gate = int(ask("Please enter the Gate Type of the product [1-2]: "))
+    pins = int(ask("Please enter the Pins Type of the product[1-4]: "))
     return gate, pins
 
 def deploy_system():
     bcb.deploy_contracts()
-    main()
     
 def connect_system():
     bcb.connect()
-    main()
     
 def instructions():
     bcb.print_instructions()
-    main()
     
 def product_info():
     gate, pins = chip_choice()
@@ -119,72 +140,105 @@ def product_info():
           \r\tVoltage:\t{pinfo[4]/1000} V
           \r\tNum Left:\t{pinfo[5]}
           \r\tNum Gates:\t{pinfo[6]}""")
-    main()
     
 def buy_items():
     products = []
     for gate, pins in chips_tuple:
-        products.append(int(input(f"Please enter the amount of {gate_dict[gate]}-{pins_dict[pins]}s you want to purchase: ")))
+        products.append(int(ask(f"Please enter the amount of {gate_dict[gate]}-{pins_dict[pins]}s you want to purchase: ")))
     
     print("Sending request to supply chain!")
-    bcb.buy_items(products)
+    future = bcb.buy_items(products)
     print("Request sent!")
-    main()
+    return future
     
 def change_item():
     gate, pins = chip_choice()
-    price = int(input("Please enter the new price of the item in cents: "))
-    voltage = int(input("Please enter the new voltage of the item in millivolts: "))
+    price = int(ask("Please enter the new price of the item in cents: "))
+    voltage = int(ask("Please enter the new voltage of the item in millivolts: "))
     print(f"Changing {gate_dict[gate]}-{pins_dict[pins]} info")
-    bcb.change_item_info(gate, pins, price, voltage)
-    main()
+    return bcb.change_item_info(gate, pins, price, voltage)
 
 def add_more_item():
     gate, pins = chip_choice()
-    num = int(input("Please enter the number of items you want to add: "))
+    num = int(ask("Please enter the number of items you want to add: "))
     print(f"Adding {num} items to {gate_dict[gate]}-{pins_dict[pins]}")
-    bcb.add_product(gate, pins, num)
-    main()
+    return bcb.add_product(gate, pins, num)
 
 def seller_confirm():
-    receipt_num = int(input("Please enter the receipt number you received for your basket: "))
+    receipt_num = int(ask("Please enter the receipt number you received for your basket: "))
     print("Sending Confirmation from Seller")
-    bcb.seller_confirmation(receipt_num, bcb.bridge_w3.eth.accounts[1])
-    main()
+    return bcb.seller_confirmation(receipt_num, bcb.bridge_accounts[1])
 
 def buyer_confirm():
-    receipt_num = int(input("Please enter the receipt number you received for your basket: "))
+    receipt_num = int(ask("Please enter the receipt number you received for your basket: "))
     print("Sending Confirmation from Buyer")
-    bcb.buyer_confirmation(receipt_num, bcb.bridge_w3.eth.accounts[2])
+    future = bcb.buyer_confirmation(receipt_num, bcb.bridge_accounts[2])
     print("Bitcoins have been reserved!")
-    main()
+    return future
     
 def pay_for_item():
-    receipt_num = int(input("Please enter the receipt number you received for your basket: "))
+    receipt_num = int(ask("Please enter the receipt number you received for your basket: "))
     print("Sending payment request")
-    bcb.pay_basket(receipt_num)
-    main()
+    return bcb.pay_basket(receipt_num)
     
 def bitcoin_wallet_info():
-    curr = input("Do you want to check balance in 'usd' or 'btc'? ")
+    curr = ask("Do you want to check balance in 'usd' or 'btc'? ")
     bcb.get_balance_btc(curr)
-    main()
     
 def process_refund():
-    receipt_num = int(input("Please enter the receipt number you received for your basket: "))
+    receipt_num = int(ask("Please enter the receipt number you received for your basket: "))
     print("Sending refund request!")
-    bcb.refund_basket(receipt_num)
-    main()
+    return bcb.refund_basket(receipt_num)
 
 def transfer_money():
-    amount = int(input("Please enter the amount of money you want to transfer (US Cents): "))
-    reverse = input("Do you want to send money from buyer to seller [y/n]? ")
+    amount = int(ask("Please enter the amount of money you want to transfer (US Cents): "))
+    reverse = ask("Do you want to send money from buyer to seller [y/n]? ")
     if reverse.lower() == 'y':
         reverse = False
     else:
         reverse = True
     bcb.send_btc(amount, reverse)
-    main()
-    
+
+# Command name -> function, the names are used in scripts
+COMMANDS = {
+    'deploy': deploy_system,
+    'connect': connect_system,
+    'instructions': instructions,
+    'product_info': product_info,
+    'buy_items': buy_items,
+    'change_item': change_item,
+    'add_items': add_more_item,
+    'seller_confirm': seller_confirm,
+    'buyer_confirm': buyer_confirm,
+    'pay_for_items': pay_for_item,
+    'btc_balances': bitcoin_wallet_info,
+    'refund': process_refund,
+    'transfer_money': transfer_money
+}
+# Menu option -> command name
+MENU = {
+    1: 'deploy',
+    2: 'connect',
+    3: 'instructions',
+    4: 'product_info',
+    5: 'buy_items',
+    6: 'change_item',
+    7: 'add_items',
+    8: 'seller_confirm',
+    9: 'buyer_confirm',
+    10: 'pay_for_items',
+    11: 'btc_balances',
+    12: 'refund',
+    13: 'transfer_money'
+}
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if len(sys.argv) > 1:
+        # Non-interactive mode: commands are read from a file, or from stdin with '-'
+        if sys.argv[1] == '-':
+            failed = run_script(sys.stdin)
+        else:
+            with open(sys.argv[1], 'r') as file_obj:
+                failed = run_script(file_obj)
+        sys.exit(1 if failed else 0)
+    main()
@@ -0,0 +1,28 @@
+"""
+Shared fixtures of the BCB2-GateSC tests. The modules under test are imported like main.py
+imports them, i.e. 'from functions.checkpoint import BlockCheckpoint', so src is put on the path.
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+from functions.btc_backend import SimulatedBackend
+from functions.wallet_state import WalletState
+
+@pytest.fixture
+def backend():
+    "In-memory bitcoin network funding every new key with one bitcoin"
+    return SimulatedBackend()
+
+@pytest.fixture
+def wallet(backend):
+    "Wallet state of a buyer and a seller key on the simulated network"
+    buyer = backend.new_key()
+    seller = backend.new_key()
+    wallet = WalletState([buyer, seller], backend)
+    wallet.start()
+    wallet.buyer, wallet.seller = buyer, seller
+    yield wallet
+    wallet.stop()
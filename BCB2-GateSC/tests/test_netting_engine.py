@@ -0,0 +1,60 @@
+import pytest
+from functions.netting_engine import NettingPayoutQueue
+from functions.payout_queue import PAYMENT, REFUND
+
+@pytest.fixture
+def queue(tmp_path, wallet):
+    "Netting queue whose settlements only run when the test calls send_due"
+    queue = NettingPayoutQueue(str(tmp_path / 'payouts.db'), wallet, window = 60)
+    yield queue
+    queue.stop()
+
+def test_payments_and_refunds_are_netted(queue, wallet, backend):
+    queue.enqueue(1, PAYMENT, wallet.buyer, wallet.seller.address, 5000)
+    queue.enqueue(2, PAYMENT, wallet.buyer, wallet.seller.address, 3000)
+    queue.enqueue(1, REFUND, wallet.seller, wallet.buyer.address, 2000)
+    queue.send_due()
+    assert backend.broadcasts == 1
+    settlement = queue.settlement(1)
+    assert (settlement['payer'], settlement['payee']) == (wallet.buyer.address, wallet.seller.address)
+    assert settlement['net'] == 6000
+    assert settlement['gross'] == 10000
+    assert settlement['num_payouts'] == 3
+    # The paying side points to the output of the settlement, the offset refund has none
+    assert queue.status(1, PAYMENT) == ('sent', settlement['txid'], 0)
+    assert queue.status(1, REFUND) == ('sent', settlement['txid'], None)
+    assert wallet.balance(wallet.seller.address) == backend.initial_balance + 6000
+
+def test_refunds_can_outweigh_payments(queue, wallet):
+    queue.enqueue(1, PAYMENT, wallet.buyer, wallet.seller.address, 1000)
+    queue.enqueue(1, REFUND, wallet.seller, wallet.buyer.address, 1500)
+    queue.send_due()
+    settlement = queue.settlement(1)
+    assert (settlement['payer'], settlement['payee'], settlement['net']) == (wallet.seller.address, wallet.buyer.address, 500)
+    assert queue.status(1, REFUND)[2] == 0
+
+def test_payouts_cancelling_out_send_nothing(queue, wallet, backend):
+    queue.enqueue(4, PAYMENT, wallet.buyer, wallet.seller.address, 2500)
+    queue.enqueue(4, REFUND, wallet.seller, wallet.buyer.address, 2500)
+    queue.send_due()
+    assert backend.broadcasts == 0
+    assert queue.counts().get('netted') == 2
+    assert queue.settlement(1)['txid'] is None
+
+def test_audit_lists_the_settlement_of_every_payout(queue, wallet):
+    queue.enqueue(5, PAYMENT, wallet.buyer, wallet.seller.address, 800)
+    queue.send_due()
+    audit = queue.audit(5)
+    assert len(audit) == 1
+    assert audit[0]['direction'] == PAYMENT
+    assert audit[0]['settlement_id'] == 1
+    assert audit[0]['net'] == 800
+    assert queue.audit(99) == []
+    assert queue.settlement(99) is None
+
+def test_payouts_to_other_addresses_are_not_netted(queue, wallet, backend):
+    outsider = backend.new_key()
+    queue.enqueue(6, PAYMENT, wallet.buyer, outsider.address, 700)
+    queue.send_due()
+    assert queue.settlement(1) is None
+    assert queue.status(6)[0] == 'sent'
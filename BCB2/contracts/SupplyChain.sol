@@ -20,6 +20,7 @@ contract ClothingSupplyChain{
     event added_products(ApparelType indexed apparel, FabricType indexed fabric, uint256 num_added);
     event items_bought(uint256[6] num_buy);
     event items_defective(uint256[6] num_defective);
+    event price_changed(ApparelType indexed apparel, FabricType indexed fabric, uint256 price, uint256 weight);
 
     // MODIFIERS
     modifier admin_only(){
@@ -87,6 +88,7 @@ contract ClothingSupplyChain{
         if (price != 0) clothes[apparel][fabric].price = price;
         if (weight != 0) clothes[apparel][fabric].weight = weight;
 
+        emit price_changed(apparel, fabric, clothes[apparel][fabric].price, clothes[apparel][fabric].weight);
         return true;
     }
 
@@ -116,6 +116,26 @@ contract TransactionBridge {
         return true;
     }
 
+    // Function to create a new transaction and add its items in a
+    // single call so a basket only costs one transaction
+    function create_transaction_with_items(
+        /**ARGUMENTS**/
+        uint256 receipt_num,
+        uint256[] memory item_ids,
+        uint256[] memory item_prices
+    )
+        public
+        returns (bool)
+    {
+        require(transactions[receipt_num].state == TransactionState.NotCreated, "Transaction Already Created!");
+
+        // Create the transaction then push its items and update its total
+        create_transaction(receipt_num);
+        add_items_to_transaction(receipt_num, item_ids, item_prices);
+
+        return true;
+    }
+
     function confirm_seller(
         /**ARGUMENTS**/
         uint256 receipt_num
@@ -1,7 +1,9 @@
-import threading
 import asyncio
 import time
 from functions.bcb_functions import BitcoinBridgeGanache
+from functions.event_poller import EventPoller
+from functions.worker_pool import BoundedExecutor
+from functions.checkpoint import BlockCheckpoint
 import random
 
 # ---------------------CONNECT TO SUPPLY CHAIN CONTRACT ON GANACHE---------------------
@@ -49,15 +51,19 @@ def bought_items(num_buy):
     
     item_id = [random.randint(1,100) for _ in range(6)]
 
-    prices = [num_buy[index] * bcb.get_product_info(apparel, fabric)[4] for index, (apparel, fabric) in enumerate(clothes_tuple)]
+    prices = [num_buy[index] * bcb.get_product_price(apparel, fabric) for index, (apparel, fabric) in enumerate(clothes_tuple)]
     
     
     for index, (apparel, fabric) in enumerate(clothes_tuple):
         print(f"Item:{fabric_dict[fabric]} {apparel_dict[apparel]}\tNumber: {num_buy[index]}\tPrice: ${prices[index]/100}")
     
-    bcb.create_basket(receipt_number)
-    
-    bcb.add_items_to_basket(receipt_number, item_id, prices)
+    # The poller keeps the checkpoint before this block until the basket is written
+    return bcb.create_basket_with_items(receipt_number, item_id, prices)
+
+def product_changed(apparel, fabric, price, weight):
+    """A function to handle the event of the price or weight of a product being changed"""
+    print(f"""\nProduct Information Changed:
+          \r\tItem:{fabric_dict[fabric]} {apparel_dict[apparel]}\tPrice: ${price/100}\tWeight: {weight} grams""")
 
 def defective_items(num_defective):
     """A function to handle the event of removing defective items from the supply chain."""
@@ -108,9 +114,10 @@ def payment_initiated(receipt_number, total):
     )
     # Send BTC Transaction
     print("Sending Bitcoin Transaction as payment...")
-    
-    bcb.send_btc(total)
-  
+    # Recorded in the payout queue and sent in the background, a replayed event is ignored
+    if not bcb.queue_btc(receipt_number, total):
+        print(f"Payment of receipt {receipt_number} was already queued")
+
 def seller_ok(receipt_number, total):
     """
     A target function to handle the event of a seller confirming transaction
@@ -127,200 +134,70 @@ def buyer_ok(receipt_number, total):
           \rReceipt Number: {receipt_number}
           \rTotal: ${total/100}""")
 
-# ASYNC FUNCTION LOOPS
-# event items_defective(uint256[6] num_defective);
-async def id_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every defective item removed from
-    the supply chain.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = defective_items,
-                args = (
-                    event['args']['num_defective'],
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# event items_bought(uint256[6] num_buy);
-async def ib_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every bunch of items bought 
-    in supply chain.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = bought_items,
-                args = (
-                    event['args']['num_buy'],
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# event added_products(ApparelType indexed apparel, FabricType indexed fabric, uint256 num_added);
-async def ap_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every item added in  
-    supply chain.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = products_added,
-                args = (
-                    event['args']['apparel'],
-                    event['args']['fabric'],
-                    event['args']['num_added']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# event SellerOk (uint256 indexed receipt_number, uint256 total);
-async def sellerok_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every seller confirming the 
-    transaction.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = seller_ok,
-                args = (
-                    event['args']['receipt_number'],
-                    event['args']['total']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# event BuyerOk (uint256 indexed receipt_number, uint256 total);
-async def buyerok_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every buyer confirming the 
-    transaction.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = buyer_ok,
-                args = (
-                    event['args']['receipt_number'],
-                    event['args']['total']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# TransactionCreated (uint256 indexed receipt_number);
-async def tc_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every payment being
-    processed.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = transaction_created,
-                args = (
-                    event['args']['receipt_number'],
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# TransactionUpdated (uint256 indexed receipt_number, uint256 total);
-async def tu_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every transaction being
-    updated.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = transaction_updated,
-                args = (
-                    event['args']['receipt_number'],
-                    event['args']['total']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
+# Worker pool settings: number of handler threads and handlers allowed to wait for one
+MAX_WORKERS = 8
+MAX_QUEUE = 100
+# Seconds between two reports of the worker pool counters
+STATS_INTERVAL = 60
+# Receive new logs over WebSocket subscriptions (falls back to polling when unavailable)
+USE_WEBSOCKETS = True
+# File keeping the last block processed on every chain
+CHECKPOINT_FILE = "contracts/listener.checkpoint"
+# Without a checkpoint the listener starts at the newest block. Set to True to run the
+# handlers for every event since the deployment instead: this creates baskets and queues
+# bitcoin payouts for all past events again, so only use it with a fresh deployment
+REPLAY_FROM_DEPLOYMENT = False
+# SQLite file keeping every bitcoin payout until it is sent
+PAYOUT_DB = "contracts/payouts.db"
 
-# TransactionRefunded (uint256 indexed receipt_number);
-async def tr_loop(event_filter, poll_interval):
+async def stats_loop(executor, interval):
     """
-    Asynchronous function to create new threads for every transaction being
-    refunded.
+    Asynchronous function to report the queue depth and rejection counters of the
+    worker pool and the state of the bitcoin payout queue.
     """
     
     while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = transaction_refunded,
-                args = (
-                    event['args']['receipt_number'],
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# PaymentInitiated (uint256 indexed receipt_number, uint256 total);
-async def payment_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every payment being
-    processed.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = payment_initiated,
-                args = (
-                    event['args']['receipt_number'],
-                    event['args']['total']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
+        await asyncio.sleep(interval)
+        executor.print_stats()
+        bcb.payout_queue.print_stats()
+        bcb.wallet.print_stats()
 
 # Main Function
 def main():
-    # Creating filters for every event
-    ap_filter = bcb.supply_chain_contract.events.added_products().createFilter(fromBlock = 'latest')
-    ib_filter = bcb.supply_chain_contract.events.items_bought().createFilter(fromBlock = 'latest')
-    id_filter = bcb.supply_chain_contract.events.items_defective().createFilter(fromBlock = 'latest')
-    tc_filter = bcb.bridge_contract.events.TransactionCreated().createFilter(fromBlock = 'latest')
-    tu_filter = bcb.bridge_contract.events.TransactionUpdated().createFilter(fromBlock = 'latest')
-    tr_filter = bcb.bridge_contract.events.TransactionRefunded().createFilter(fromBlock = 'latest')
-    payment_filter = bcb.bridge_contract.events.PaymentInitiated().createFilter(fromBlock = 'latest')
-    sellerok_filter = bcb.bridge_contract.events.SellerOk().createFilter(fromBlock = 'latest')
-    buyerok_filter = bcb.bridge_contract.events.BuyerOk().createFilter(fromBlock = 'latest')
+    executor = BoundedExecutor(MAX_WORKERS, MAX_QUEUE)
+    checkpoint = BlockCheckpoint(CHECKPOINT_FILE)
+    bcb.start_payout_queue(PAYOUT_DB)
+    # One poller per chain, every event is routed by its topic
+    supply_poller = EventPoller(bcb.supply_chain_w3, "Supply Chain", executor, checkpoint, bcb.manifest.topics('SupplyChain'))
+    supply_poller.register(bcb.supply_chain_contract.events.added_products, products_added, ('apparel', 'fabric', 'num_added'))
+    supply_poller.register(bcb.supply_chain_contract.events.items_bought, bought_items, ('num_buy',))
+    supply_poller.register(bcb.supply_chain_contract.events.items_defective, defective_items, ('num_defective',))
+    supply_poller.register(bcb.supply_chain_contract.events.price_changed, product_changed, ('apparel', 'fabric', 'price', 'weight'))
+    # Keep the cached catalog used to price baskets up to date
+    bcb.catalog.track(supply_poller, bcb.supply_chain_contract.events)
+    bridge_poller = EventPoller(bcb.bridge_w3, "Transaction Bridge", executor, checkpoint, bcb.manifest.topics('TransactionBridge'))
+    bridge_poller.register(bcb.bridge_contract.events.TransactionCreated, transaction_created, ('receipt_number',))
+    bridge_poller.register(bcb.bridge_contract.events.TransactionUpdated, transaction_updated, ('receipt_number', 'total'))
+    bridge_poller.register(bcb.bridge_contract.events.TransactionRefunded, transaction_refunded, ('receipt_number',))
+    bridge_poller.register(bcb.bridge_contract.events.PaymentInitiated, payment_initiated, ('receipt_number', 'total'))
+    bridge_poller.register(bcb.bridge_contract.events.SellerOk, seller_ok, ('receipt_number', 'total'))
+    bridge_poller.register(bcb.bridge_contract.events.BuyerOk, buyer_ok, ('receipt_number', 'total'))
     loop = asyncio.get_event_loop()
     try:
         loop.run_until_complete(
             asyncio.gather(
-                ap_loop(ap_filter, 2),
-                ib_loop(ib_filter, 2),
-                id_loop(id_filter, 2),
-                tc_loop(tc_filter, 2),
-                tu_loop(tu_filter, 2),
-                tr_loop(tr_filter, 2),
-                payment_loop(payment_filter, 2),
-                sellerok_loop(sellerok_filter, 2),
-                buyerok_loop(buyerok_filter, 2)
+                # Without a checkpoint only new blocks are read unless REPLAY_FROM_DEPLOYMENT is set
+                supply_poller.run(
+                    2,
+                    bcb.SUPPLY_CHAIN_WS_URL if USE_WEBSOCKETS else None,
+                    bcb.manifest.deploy_block('SupplyChain') if REPLAY_FROM_DEPLOYMENT else None
+                ),
+                bridge_poller.run(
+                    2,
+                    bcb.BRIDGE_WS_URL if USE_WEBSOCKETS else None,
+                    bcb.manifest.deploy_block('TransactionBridge') if REPLAY_FROM_DEPLOYMENT else None
+                ),
+                stats_loop(executor, STATS_INTERVAL)
             )
         )
     except KeyboardInterrupt as err:
@@ -328,6 +205,11 @@ def main():
         print(err)
     finally:
         loop.close()
+        executor.shutdown()
+        bcb.payout_queue.stop()
+        executor.print_stats()
+        bcb.payout_queue.print_stats()
+        bcb.wallet.print_stats()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
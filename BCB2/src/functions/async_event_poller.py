@@ -0,0 +1,132 @@
+"""
+This file contains the asyncio counterpart of the EventPoller used by the async event
+listener. Logs are fetched with AsyncEth and coroutine handlers run as tasks on the
+same event loop, bounded by a semaphore instead of a thread pool.
+"""
+import asyncio
+from collections import deque
+from eth_utils import event_abi_to_log_topic
+from typing import Callable, Dict, List, Optional, Tuple
+
+class AsyncEventPoller:
+    """Polls one chain for new logs of every registered event using one eth_getLogs
+    call per tick and runs their handlers as asyncio tasks.\n
+    Plain functions are called inline, coroutine functions are started as tasks. At most
+    'max_in_flight' handler tasks run at the same time; the poller waits while they do."""
+    # Number of blocks fetched by one eth_getLogs call while catching up
+    BACKFILL_CHUNK = 2000
+
+    def __init__(self, w3, name: str, max_in_flight: int = 1000, checkpoint = None):
+        # Instance Variables
+        self.w3 = w3
+        self.name = name
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.checkpoint = checkpoint
+        self.addresses = []
+        # topic0 -> event object used for decoding
+        self.events: Dict[bytes, object] = {}
+        # topic0 -> (handler, names of args passed to handler)
+        self.routes: Dict[bytes, Tuple] = {}
+        # topic0 -> functions called with the decoded event before its handler runs
+        self.observers: Dict[bytes, List[Callable]] = {}
+        # Handler tasks that have not finished yet, in block order: (block number, task)
+        self.in_flight = deque()
+        self.last_block = None
+        self.last_saved = None
+
+    def register(self, event, handler: Callable, arg_names: Tuple[str, ...]) -> None:
+        """Routes every log of 'event' to 'handler'.\n
+        event: contract event class i.e. contract.events.items_bought\n
+        handler: function or coroutine function called with the event arguments in the order of 'arg_names'"""
+        topic = self._add_event(event)
+        self.routes[topic] = (handler, arg_names)
+
+    def observe(self, event, observer: Callable) -> None:
+        """Calls 'observer' with every decoded log of 'event' on the polling loop itself,
+        before the handler of the log runs.\n
+        Observers must be quick and must not make any RPC (i.e. updating a cache)."""
+        topic = self._add_event(event)
+        self.observers.setdefault(topic, []).append(observer)
+
+    def _add_event(self, event) -> bytes:
+        "Adds 'event' to the logs fetched by the poller and returns its topic"
+        topic = event_abi_to_log_topic(event._get_event_abi())
+        if event.address not in self.addresses:
+            self.addresses.append(event.address)
+        self.events[topic] = event()
+        return topic
+
+    async def run_handler(self, handler: Callable, args: tuple) -> None:
+        "Runs a coroutine handler and releases its slot once it is done"
+        try:
+            await handler(*args)
+        except Exception as err:
+            print(f"[ERROR] Handler '{handler.__name__}' failed: {err}")
+        finally:
+            self.slots.release()
+
+    async def dispatch(self, log) -> None:
+        """Decodes a raw log and runs its handler.\n
+        Waits while 'max_in_flight' handlers are running. Logs with an unknown topic are ignored."""
+        if not log['topics']:
+            return
+        topic = bytes(log['topics'][0])
+        event = self.events.get(topic)
+        if event is None:
+            return
+        event_data = event.processLog(log)
+        for observer in self.observers.get(topic, []):
+            observer(event_data)
+        route = self.routes.get(topic)
+        if route is None:
+            return
+        handler, arg_names = route
+        args = tuple(event_data['args'][name] for name in arg_names)
+        if not asyncio.iscoroutinefunction(handler):
+            handler(*args)
+            return
+        await self.slots.acquire()
+        task = asyncio.ensure_future(self.run_handler(handler, args))
+        self.in_flight.append((log['blockNumber'], task))
+
+    def save_checkpoint(self) -> None:
+        """Saves the highest block whose handlers, and the handlers of every block
+        before it, have all finished."""
+        if self.checkpoint is None:
+            return
+        while self.in_flight and self.in_flight[0][1].done():
+            self.in_flight.popleft()
+        processed = self.last_block
+        if self.in_flight:
+            processed = min(processed, self.in_flight[0][0] - 1)
+        if self.last_saved is None or processed > self.last_saved:
+            self.checkpoint.save(self.name, self.addresses, processed)
+            self.last_saved = processed
+
+    async def run(self, poll_interval: float, start_block: Optional[int] = None) -> None:
+        """Asynchronous function to replay the blocks missed since the last checkpoint and then
+        fetch the new logs of all registered events once every 'poll_interval' seconds.\n
+        start_block: first block to replay when there is no checkpoint, only new blocks are
+        fetched when it is None."""
+        if self.checkpoint is not None:
+            self.last_block = self.checkpoint.get(self.name, self.addresses)
+        if self.last_block is None and start_block is not None:
+            self.last_block = start_block - 1
+        if self.last_block is None:
+            self.last_block = await self.w3.eth.block_number
+        self.last_saved = self.last_block
+        while True:
+            head = await self.w3.eth.block_number
+            while self.last_block < head:
+                to_block = min(self.last_block + self.BACKFILL_CHUNK, head)
+                logs = await self.w3.eth.get_logs({
+                    'address': self.addresses,
+                    'fromBlock': self.last_block + 1,
+                    'toBlock': to_block
+                })
+                for log in logs:
+                    await self.dispatch(log)
+                self.last_block = to_block
+                self.save_checkpoint()
+            self.save_checkpoint()
+            await asyncio.sleep(poll_interval)
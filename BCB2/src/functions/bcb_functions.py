@@ -3,11 +3,20 @@ This file is used to store different functions that will be useful to the functi
 of the Bitcoin Bridge system.
 """
 import os
-import json
-from solcx import compile_source
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from web3 import Web3
-from bit import PrivateKeyTestnet
-from typing import List, Tuple
+from typing import Callable, List, Tuple
+from functions.product_catalog import ProductCatalog
+from functions.compile_cache import compile_source_cached
+from functions.deployment_manifest import DeploymentManifest, source_hash
+from functions.multicall import MulticallBatch
+from functions.tx_pipeline import TransactionPipeline
+from functions.connection_health import ConnectionHealth
+from functions.payout_queue import PayoutQueue, PAYMENT, REFUND
+from functions.wallet_state import WalletState
+from functions.btc_backend import BitcoinBackend, BitTestnetBackend
+from functions.exchange_rate import ExchangeRateProvider, bit_usd_feed, format_cents, format_satoshi
 
 class BitcoinBridgeGanache:
     """This class contains several methods and variables that help in the following functionality
@@ -17,8 +26,31 @@ class BitcoinBridgeGanache:
     # Class Variables
     SUPPLY_CHAIN_URL = "HTTP://127.0.0.1:7545"
     BRIDGE_URL = "HTTP://127.0.0.1:7546"
+    # Ganache serves WebSocket connections on the same ports
+    SUPPLY_CHAIN_WS_URL = "ws://127.0.0.1:7545"
+    BRIDGE_WS_URL = "ws://127.0.0.1:7546"
+    # Folder of the contract sources and of the deployment manifest
+    CONTRACTS_DIR = "contracts"
+    # Folder keeping the compiled contracts, reused while their source does not change
+    BUILD_CACHE = "contracts/build_cache"
+    # Seconds between two checks of the connection to both networks
+    HEARTBEAT_INTERVAL = 5
+    # Seconds the BTC/USD price is reused before it is read from the feed again
+    BTC_RATE_TTL = 60
+    # Seconds to gather payouts of the same wallet and most payouts sent in one bitcoin transaction
+    BTC_BATCH_WINDOW = 2
+    BTC_BATCH_SIZE = 20
+    # Seconds between two reads of the wallet outputs and seconds the fee rate is reused
+    BTC_REFRESH_INTERVAL = 60
+    BTC_FEE_TTL = 300
+    # (apparel, fabric) of every product in the order used by buy_items/defective_products
+    PRODUCTS = ((1, 1), (1, 2), (2, 1), (2, 2), (3, 1), (3, 2))
     
-    def __init__(self):
+    def __init__(self, rate_feed: Callable[[], int] = bit_usd_feed, btc_backend: BitcoinBackend = None):
+        """rate_feed: function returning the price of one bitcoin in US cents, i.e. exchange_rate.fixed_feed
+        to run without the internet\n
+        btc_backend: btc_backend.BitcoinBackend of the bitcoin leg, the public testnet when None,
+        i.e. btc_backend.SimulatedBackend to run without the internet"""
         # Instance Variables
         # SUPPLY CHAIN
         self.supply_chain_address = None
@@ -32,20 +64,55 @@ class BitcoinBridgeGanache:
         self.bridge_bytecode = None
         self.bridge_w3 = None
         self.bridge_contract = None
+        # DEPLOYMENT MANIFEST (addresses, abis, deploy blocks and event topics)
+        self.manifest = None
+        # MULTICALL (deployed on both chains to batch view calls)
+        self.multicall_abi = None
+        self.supply_chain_multicall = None
+        self.bridge_multicall = None
+        # TRANSACTION PIPELINES (local nonces, receipts gathered in the background)
+        self.supply_chain_pipeline = None
+        self.bridge_pipeline = None
+        # CONNECTION HEALTH (cached state of both networks kept by a heartbeat)
+        self.health = None
+        # CHAIN METADATA (read once, read again only on reconnect)
+        self.supply_chain_accounts = None
+        self.supply_chain_id = None
+        self.bridge_accounts = None
+        self.bridge_id = None
         # BITCOIN
         self.btc_seller = None
         self.btc_buyer = None
+        self.btc_backend = btc_backend if btc_backend != None else BitTestnetBackend()
+        # BTC/USD price cached for BTC_RATE_TTL seconds
+        self.exchange_rate = ExchangeRateProvider(rate_feed, self.BTC_RATE_TTL)
+        # Unspent outputs of both wallets and the fee rate, kept in memory
+        self.wallet = None
+        # Durable payouts of the event listener, opened by start_payout_queue
+        self.payout_queue = None
+        # PRODUCT CATALOG CACHE
+        self.catalog = ProductCatalog(
+            self._load_product,
+            self.PRODUCTS,
+            ('apparel', 'fabric'),
+            stock_index = 5,
+            changed_fields = {'price': 4, 'weight': 3},
+            bulk_loader = self._load_products
+        )
         
     def deploy_contracts(self) -> None:
         """Compiles, deploys and saves the supply chain and bitcoin bridge contracts onto
         two separate ethereum blockchains.
         contract .sol files located in contract folder.
+        Both chains are handled at the same time and the duration of every phase is printed.
         """
-        with open("contracts/SupplyChain.sol", "r") as file_object:
-            compiled_supply = compile_source(file_object.read())
-        
-        with open("contracts/TransactionBridge.sol", "r") as file_object:
-            compiled_bridge = compile_source(file_object.read())
+        start_time = time.perf_counter()
+        compiled_supply, compiled_bridge, compiled_multicall = self._run_phase(
+            "Compile",
+            lambda: self._compile(os.path.join(self.CONTRACTS_DIR, "SupplyChain.sol")),
+            lambda: self._compile(os.path.join(self.CONTRACTS_DIR, "TransactionBridge.sol")),
+            lambda: self._compile(os.path.join(self.CONTRACTS_DIR, "Multicall.sol"))
+        )
             
         # checking the contents of the compiled contract
         # print(compiled_sol.keys())
@@ -67,86 +134,156 @@ class BitcoinBridgeGanache:
         self.bridge_bytecode = contract_interface['bin']
         # getting the Contract abi
         self.bridge_abi = contract_interface['abi']
+
+        # MULTICALL CONTRACT (deployed on both chains)
+        _, multicall_interface = compiled_multicall.popitem()
+        self.multicall_abi = multicall_interface['abi']
         # DEPLOY SMART CONTRACT
         # web3.py instance - Connectiong to Ganache App
         self.supply_chain_w3 = Web3(Web3.HTTPProvider(self.SUPPLY_CHAIN_URL))
         self.bridge_w3 = Web3(Web3.HTTPProvider(self.BRIDGE_URL))
+        self.supply_chain_pipeline = TransactionPipeline(self.supply_chain_w3)
+        self.bridge_pipeline = TransactionPipeline(self.bridge_w3)
 
-        if self.supply_chain_w3.isConnected():
+        # Set first address as deployer for contract
+        supply_connected, bridge_connected = self._run_phase(
+            "Connect",
+            lambda: self._connect_chain('supply_chain'),
+            lambda: self._connect_chain('bridge')
+        )
+        if supply_connected:
             print("[SUCCESS] Connected to the Supply Chain Ganache Blockchain Environment!")
 
-        if self.bridge_w3.isConnected():
+        if bridge_connected:
             print("[SUCCESS] Connected to the Transaction Bridge Ganache Blockchain Environment!")
+        self._start_health(self.supply_chain_w3, self.bridge_w3)
 
-        # Set first address as deployer for contract
-        self.supply_chain_w3.eth.default_account = self.supply_chain_w3.eth.accounts[0]
-        self.bridge_w3.eth.default_account = self.bridge_w3.eth.accounts[0]
-
-        # Start deploying smart contract
-        # Supply Chain
-        print("[DEPLOYING] Deploying Supply Chain Contract...")
-
-        SupplyChainContract = self.supply_chain_w3.eth.contract(abi = self.supply_chain_abi, bytecode = self.supply_chain_bytecode)
-
-        # Submit transaction to deploy the contract then wait for receipt
-        tx_hash = SupplyChainContract.constructor().transact()
-        tx_receipt_supply = self.supply_chain_w3.eth.wait_for_transaction_receipt(tx_hash)
-        
-        print("[SUCCESS] Supply Chain Contract Deployed!")
-
-        # Transaction Bridge
-        print("[DEPLOYING] Deploying Transaction Bridge Contract...")
-
-        TransactionBridgeContract = self.bridge_w3.eth.contract(abi = self.bridge_abi, bytecode = self.bridge_bytecode)
-
-        # Submit transaction to deploy the contract then wait for receipt
-        tx_hash = TransactionBridgeContract.constructor().transact()
-        tx_receipt_bridge = self.bridge_w3.eth.wait_for_transaction_receipt(tx_hash)
-        
-        self.supply_chain_address = tx_receipt_supply.contractAddress
-        self.bridge_address = tx_receipt_bridge.contractAddress
-
-        print("[SUCCESS] Transaction Bridge Contract Deployed!")
+        # Start deploying smart contracts on both chains at the same time
+        print("[DEPLOYING] Deploying Supply Chain and Transaction Bridge Contracts...")
+        supply_receipts, bridge_receipts = self._run_phase(
+            "Deploy",
+            lambda: self._deploy_chain(self.supply_chain_w3, self.supply_chain_abi, self.supply_chain_bytecode, multicall_interface['bin']),
+            lambda: self._deploy_chain(self.bridge_w3, self.bridge_abi, self.bridge_bytecode, multicall_interface['bin'])
+        )
+        print("[SUCCESS] Supply Chain and Transaction Bridge Contracts Deployed!")
         # SAVE CONTRACT INFO
-        # Supply Chain
-        print("Saving Supply Chain Contract Info")
-
-        with open('contracts/SupplyChain.info', "w") as file_obj:
-            file_obj.write(self.supply_chain_address),
-            file_obj.write("\n")
-            file_obj.write(json.dumps(self.supply_chain_abi))
-        print('[SUCCESS] Supply Chain info saved!')
+        print("Saving Deployment Manifest")
+        self.manifest = DeploymentManifest(self.CONTRACTS_DIR)
+        sources = {
+            name: source_hash(os.path.join(self.CONTRACTS_DIR, f"{name}.sol"))
+            for name in ('SupplyChain', 'TransactionBridge', 'Multicall')
+        }
+        for chain, name, abi, receipts in (
+            ('supply_chain', 'SupplyChain', self.supply_chain_abi, supply_receipts),
+            ('bridge', 'TransactionBridge', self.bridge_abi, bridge_receipts)
+        ):
+            tx_receipt, multicall_receipt = receipts
+            self.manifest.add(name, chain, tx_receipt.contractAddress, abi, tx_receipt.blockNumber, sources[name])
+            self.manifest.add(f"{name}Multicall", chain, multicall_receipt.contractAddress, self.multicall_abi,
+                              multicall_receipt.blockNumber, sources['Multicall'])
+        self.manifest.save()
+        print('[SUCCESS] Deployment Manifest saved!')
 
+        # Supply Chain
+        self.supply_chain_address = supply_receipts[0].contractAddress
         self.supply_chain_contract = self.supply_chain_w3.eth.contract(
             address = self.supply_chain_address,
             abi = self.supply_chain_abi
         )
+        self.supply_chain_multicall = self.supply_chain_w3.eth.contract(
+            address = supply_receipts[1].contractAddress,
+            abi = self.multicall_abi
+        )
 
         print('[SUCCESS] Supply Chain Contract Deployed Successfully!!!')
 
         # Transaction Bridge
-        print("Saving Transaction Bridge Contract Info")
-
-        with open('contracts/TransactionBridge.info', "w") as file_obj:
-            file_obj.write(self.bridge_address),
-            file_obj.write("\n")
-            file_obj.write(json.dumps(self.bridge_abi))
-        print('[SUCCESS] Supply Chain info saved!')
-
+        self.bridge_address = bridge_receipts[0].contractAddress
         self.bridge_contract = self.bridge_w3.eth.contract(
             address = self.bridge_address,
             abi = self.bridge_abi
         )
+        self.bridge_multicall = self.bridge_w3.eth.contract(
+            address = bridge_receipts[1].contractAddress,
+            abi = self.multicall_abi
+        )
         print('[SUCCESS] Transaction Bridge Contract Deployed Successfully!!!')
         
-        # BITCOIN TESTNET
-        with open("wallet/wallet.info", 'r') as file_object:
-            accs = file_object.readlines()
-            accs[0] = accs[0][:-1]
-        self.buyer = PrivateKeyTestnet(accs[0])
-        self.seller = PrivateKeyTestnet(accs[1])
-        print('[SUCCESS] Connected to Bitcoin Testnet!')
+        # BITCOIN (testnet unless another backend was given)
+        self._load_wallet()
+        print(f"[TIMING] Total: {time.perf_counter() - start_time:.2f}s")
         
+    @staticmethod
+    def _run_phase(phase: str, *tasks: Callable) -> List:
+        """Runs the tasks of a phase at the same time, one thread each, and prints how long it took.\n
+        returns: the result of every task in order"""
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers = len(tasks)) as pool:
+            futures = [pool.submit(task) for task in tasks]
+            results = [future.result() for future in futures]
+        print(f"[TIMING] {phase}: {time.perf_counter() - start_time:.2f}s")
+        return results
+
+    def _compile(self, path: str) -> dict:
+        "Compiles the contract file at 'path', reusing the build cache when it did not change"
+        with open(path, "r") as file_object:
+            return compile_source_cached(file_object.read(), self.BUILD_CACHE)
+
+    def _connect_chain(self, chain: str) -> bool:
+        """Checks the connection to one network and reads its metadata.\n
+        chain: 'supply_chain' or 'bridge'\n
+        returns: False if the network cannot be reached"""
+        w3 = self.supply_chain_w3 if chain == 'supply_chain' else self.bridge_w3
+        if not w3.isConnected():
+            return False
+        self._load_metadata(chain, w3)
+        return True
+
+    def _deploy_chain(self, w3: Web3, abi: list, bytecode: str, multicall_bytecode: str) -> Tuple:
+        """Deploys a contract and a Multicall contract on one chain, sending both transactions
+        before waiting for their receipts.\n
+        returns: receipts of the contract and of the Multicall contract deployments"""
+        tx_hash = w3.eth.contract(abi = abi, bytecode = bytecode).constructor().transact()
+        multicall_hash = w3.eth.contract(abi = self.multicall_abi, bytecode = multicall_bytecode).constructor().transact()
+        tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        multicall_receipt = w3.eth.wait_for_transaction_receipt(multicall_hash)
+        return tx_receipt, multicall_receipt
+
+    def _load_manifest(self) -> None:
+        "Reads the addresses and abis of the deployed contracts from the deployment manifest"
+        self.manifest = DeploymentManifest(self.CONTRACTS_DIR)
+        supply_chain = self.manifest.get('SupplyChain')
+        bridge = self.manifest.get('TransactionBridge')
+        if supply_chain is None or bridge is None:
+            print("[ERROR] Contracts not deployed, please deploy the system first.")
+            exit()
+        self.supply_chain_address = supply_chain['address']
+        self.supply_chain_abi = supply_chain['abi']
+        self.bridge_address = bridge['address']
+        self.bridge_abi = bridge['abi']
+
+    def _load_multicall(self, w3, name: str):
+        """Connects to the Multicall contract 'name' of the deployment manifest.\n
+        returns: None when the system was deployed without one"""
+        entry = self.manifest.get(name)
+        if entry is None:
+            return None
+        self.multicall_abi = entry['abi']
+        return w3.eth.contract(address = entry['address'], abi = self.multicall_abi)
+
+    def _load_contracts(self, supply_chain_w3: Web3, bridge_w3: Web3) -> None:
+        "Connects to the contracts and Multicall contracts of the deployment manifest through the given web3 instances"
+        self.supply_chain_contract = supply_chain_w3.eth.contract(
+            address = self.supply_chain_address,
+            abi = self.supply_chain_abi
+        )
+        self.bridge_contract = bridge_w3.eth.contract(
+            address = self.bridge_address,
+            abi = self.bridge_abi
+        )
+        self.supply_chain_multicall = self._load_multicall(supply_chain_w3, 'SupplyChainMulticall')
+        self.bridge_multicall = self._load_multicall(bridge_w3, 'TransactionBridgeMulticall')
+        print("[SUCCESS] Connected to Supply Chain / Transaction Bridge Smart Contracts!")
         
     def connect(self) -> None:
         "A method to connect to already deployed System"
@@ -155,45 +292,85 @@ class BitcoinBridgeGanache:
             self.supply_chain_w3 = Web3(Web3.HTTPProvider(self.SUPPLY_CHAIN_URL))
         if self.bridge_w3 == None:
             self.bridge_w3 = Web3(Web3.HTTPProvider(self.BRIDGE_URL))
+        self.supply_chain_pipeline = TransactionPipeline(self.supply_chain_w3)
+        self.bridge_pipeline = TransactionPipeline(self.bridge_w3)
         
-        if self.supply_chain_w3.isConnected() and self.bridge_w3.isConnected():
+        # Check both networks and set their default accounts at the same time
+        connected = self._run_phase(
+            "Connect",
+            lambda: self._connect_chain('supply_chain'),
+            lambda: self._connect_chain('bridge')
+        )
+        if all(connected):
             print("[SUCCESS] Connected to Supply Chain and Transaction Bridge Networks!")
         else:
             print("[ERROR] Cannot connect to one of the Networks...")
             exit()
         
         # Get contract info
-        with open('contracts/SupplyChain.info', 'r') as file_obj:
-            contract_info = file_obj.readlines()
-            self.supply_chain_address = contract_info[0][:-1]
-            self.supply_chain_abi = json.loads(contract_info[1])
-        with open('contracts/TransactionBridge.info', 'r') as file_obj:
-            contract_info = file_obj.readlines()
-            self.bridge_address = contract_info[0][:-1]
-            self.bridge_abi = json.loads(contract_info[1])
+        self._load_manifest()
             
-        # Set default accounts
-        self.supply_chain_w3.eth.default_account = self.supply_chain_w3.eth.accounts[0]
-        self.bridge_w3.eth.default_account = self.bridge_w3.eth.accounts[0]
+        self._start_health(self.supply_chain_w3, self.bridge_w3)
         
         # Connect to contracts
-        self.supply_chain_contract = self.supply_chain_w3.eth.contract(
-            address = self.supply_chain_address,
-            abi = self.supply_chain_abi
-        )
-        self.bridge_contract = self.bridge_w3.eth.contract(
-            address = self.bridge_address,
-            abi = self.bridge_abi
-        )
-        print("[SUCCESS] Connected to Supply Chain / Transaction Bridge Smart Contracts!")
-        # BITCOIN TESTNET
+        self._load_contracts(self.supply_chain_w3, self.bridge_w3)
+        # BITCOIN (testnet unless another backend was given)
+        self._load_wallet()
+    
+    def _load_wallet(self) -> None:
+        "Loads the buyer and seller bitcoin keys of wallet/wallet.info"
         with open("wallet/wallet.info", 'r') as file_object:
             accs = file_object.readlines()
             accs[0] = accs[0][:-1]
-        self.buyer = PrivateKeyTestnet(accs[0])
-        self.seller = PrivateKeyTestnet(accs[1])
-        print('[SUCCESS] Connected to Bitcoin Testnet!')
-    
+        self._start_wallet(self.btc_backend.load_key(accs[0]), self.btc_backend.load_key(accs[1]))
+
+    def _start_wallet(self, buyer, seller) -> None:
+        "Uses the bit keys 'buyer' and 'seller' and starts tracking their unspent outputs"
+        self.buyer = buyer
+        self.seller = seller
+        if self.wallet != None:
+            self.wallet.stop()
+        self.wallet = WalletState((self.buyer, self.seller), self.btc_backend, self.BTC_REFRESH_INTERVAL, self.BTC_FEE_TTL)
+        self.wallet.start()
+        if self.payout_queue != None:
+            self.payout_queue.wallet = self.wallet
+        print(f'[SUCCESS] Connected to Bitcoin {self.btc_backend.NAME}!')
+
+    def _start_health(self, supply_chain_w3: Web3, bridge_w3: Web3) -> None:
+        "Starts the heartbeat keeping the state of both networks, replacing any previous one"
+        if self.health != None:
+            self.health.stop()
+        self.health = ConnectionHealth({
+            'Supply Chain': supply_chain_w3,
+            'Transaction Bridge': bridge_w3
+        }, self.HEARTBEAT_INTERVAL, self._on_reconnect)
+        self.health.start()
+
+    def _load_metadata(self, chain: str, w3: Web3) -> None:
+        """Reads the accounts and chain id of a network and sets its first account as default.\n
+        chain: 'supply_chain' or 'bridge'"""
+        accounts = w3.eth.accounts
+        chain_id = w3.eth.chain_id
+        if chain == 'supply_chain':
+            self.supply_chain_accounts, self.supply_chain_id = accounts, chain_id
+            self.supply_chain_w3.eth.default_account = accounts[0]
+            pipeline = self.supply_chain_pipeline
+        else:
+            self.bridge_accounts, self.bridge_id = accounts, chain_id
+            self.bridge_w3.eth.default_account = accounts[0]
+            pipeline = self.bridge_pipeline
+        if pipeline != None:
+            pipeline.chain_id = chain_id
+
+    def _on_reconnect(self, name: str) -> None:
+        "Reads the metadata of a network again once the heartbeat reaches it after it was down"
+        chain = 'supply_chain' if name == 'Supply Chain' else 'bridge'
+        self._load_metadata(chain, self.health.endpoints[name])
+        # The network may have been restarted so its nonces are read again too
+        pipeline = self.supply_chain_pipeline if chain == 'supply_chain' else self.bridge_pipeline
+        if pipeline != None:
+            pipeline.nonces.reset()
+
     def is_connected(self) -> bool:
         """Method used to check if we are connected to the Ganache Apps.
         Returns True when connected.
@@ -201,7 +378,8 @@ class BitcoinBridgeGanache:
         if self.supply_chain_w3 == None or self.bridge_w3 == None:
             print("[ERROR] Please deploy the system or connect to already deployed contract.")
             return False
-        if not (self.supply_chain_w3.isConnected() and self.bridge_w3.isConnected()):
+        # Cached by the heartbeat so checking costs no round trip
+        if self.health == None or not self.health.is_up():
             print("[ERROR] Cannot connect to Blockchain Network!")
             return False
         if self.supply_chain_contract == None or self.bridge_contract == None:
@@ -220,39 +398,16 @@ class BitcoinBridgeGanache:
     
     
     # SUPPLY CHAIN CONTRACT METHODS--------------------------------------------------
-    def buy_items(self, buy_list: List[int]) -> bool:
+    def buy_items(self, buy_list: List[int]) -> Future:
         """Buy items based on a list of 6 integers indicating how many of each item you want to get.\n
         Argument: List of integers indicating the number of each item you want to buy\n
         [Cotton Shirt, Polyester Shirt, Cotton T-Shirt, Polyester T-Shirt, Cotton Pants, Polyester Pants]\n
-        returns 'True' if transaction was successful otherwise returns 'False'"""
+        returns: Future of the transaction receipt or None if the arguments are invalid"""
         # Error Checking
         if not self.is_connected():
-            return False
-        if len(buy_list) != 6:
-            print("[ERROR] Argument must be a list of exactly 6 integers!")
-            return False
-        for item in buy_list:
-            if type(item) != int:
-                print("[ERROR] Item in argument was not an integer!")
-                return False
-        
-        # Get user account input
-        # try:
-        #     acc = int(input("Please enter the Account you want to buy from [1-9]: "))
-        #     acc = self.supply_chain_w3.eth.accounts[acc]
-        # except Exception:
-        #     print("[ERROR] Invalid Account Number!\n")
-        #     return False
-        acc = self.supply_chain_w3.eth.accounts[1]
-        
-        # Send Transaction
-        try:
-            tx_hash = self.supply_chain_contract.functions.buy_product(buy_list).transact({'from': acc})
-            tx_receipt = self.supply_chain_w3.eth.wait_for_transaction_receipt(tx_hash)
-        except Exception:
-            print("[ERROR] Transaction Failed!")
-            return False
-        return True
+            return None
+        # Send Transaction, the caller collects the receipt
+        return self._submit_write(self._buy_items_call(buy_list))
         
     def get_product_info(self, apparel: int, fabric: int) -> Tuple:
         """Gets information about each product in the Supply Chain.\n
@@ -264,220 +419,154 @@ class BitcoinBridgeGanache:
             print("[ERROR] Arguments are not integers!")
             return None
         return self.supply_chain_contract.functions.inquire_product(apparel, fabric).call()
+
+    def _load_product(self, apparel: int, fabric: int) -> Tuple:
+        "Reads the product information along with the block it was read at for the catalog cache"
+        block = self.supply_chain_w3.eth.block_number
+        return self.supply_chain_contract.functions.inquire_product(apparel, fabric).call(block_identifier = block), block
+
+    def _load_products(self) -> Tuple:
+        "Reads the product information of every product in one call along with the block it was read at"
+        block = self.supply_chain_w3.eth.block_number
+        batch = self.multicall('supply_chain')
+        for apparel, fabric in self.PRODUCTS:
+            batch.add(self.supply_chain_contract.functions.inquire_product(apparel, fabric))
+        return dict(zip(self.PRODUCTS, batch.execute(block_identifier = block))), block
+
+    def get_product_price(self, apparel: int, fabric: int) -> int:
+        """Gets the price of a product in US cents from the catalog cache.\n
+        Only reads the contract when the product is not cached or the catalog is not tracking events.\n
+        returns: None if an error occurs."""
+        # Cached reads do not need a round trip to check the connection
+        if self.supply_chain_contract == None:
+            print("[ERROR] Please Connect to Smart Contract.")
+            return None
+        if type(apparel) != int or type(fabric) != int:
+            print("[ERROR] Arguments are not integers!")
+            return None
+        return self.catalog.get((apparel, fabric))[4]
+
+    def get_product_stock(self, apparel: int, fabric: int) -> int:
+        """Gets the number of items left in stock of a product from the catalog cache.\n
+        returns: None if an error occurs."""
+        # Cached reads do not need a round trip to check the connection
+        if self.supply_chain_contract == None:
+            print("[ERROR] Please Connect to Smart Contract.")
+            return None
+        if type(apparel) != int or type(fabric) != int:
+            print("[ERROR] Arguments are not integers!")
+            return None
+        return self.catalog.get((apparel, fabric))[5]
     
-    def change_item_info(self, apparel: int, fabric: int, price: int, weight: int) -> bool:
+    def change_item_info(self, apparel: int, fabric: int, price: int, weight: int) -> Future:
         """This function can only be used by the admin.\n
         Changes the price and weight of a particular item in Supply Chain.\n
         Price: US Cents, Weight: grams\n
-        returns 'True' if transaction was successful otherwise returns 'False'"""
+        returns: Future of the transaction receipt or None if the arguments are invalid"""
         # Error Checking
         if not self.is_connected():
-            return False
-        if type(apparel) != int or type(fabric) != int or type(price) != int or type(weight) != int:
-            print("[ERROR] Arguments are not integers!")
-            return False
-        # Send Transaction
-        try:
-            tx_hash = self.supply_chain_contract.functions.change_clothes(
-                apparel,
-                fabric,
-                price,
-                weight
-            ).transact({'from': self.supply_chain_w3.eth.accounts[0]})
-            tx_receipt = self.supply_chain_w3.eth.wait_for_transaction_receipt(tx_hash)
-        except Exception:
-            print("[ERROR] Transaction Failed!")
-            return False
-        return True
+            return None
+        # Send Transaction, the caller collects the receipt
+        return self._submit_write(self._change_item_info_call(apparel, fabric, price, weight))
     
-    def add_product(self, apparel: int, fabric: int, num_items: int) -> bool:
+    def add_product(self, apparel: int, fabric: int, num_items: int) -> Future:
         """To be used by the Admin of the supply chain.\n
         Adds 'num_items' number of items to the particular apparel\n
-        returns 'True' if transaction was successful otherwise returns 'False'"""
+        returns: Future of the transaction receipt or None if the arguments are invalid"""
         # Error Checking
         if not self.is_connected():
-            return False
-        if type(apparel) != int or type(fabric) != int or type(num_items) != int:
-            print("[ERROR] Arguments are not integers!")
-            return False
-        # Send Transaction
-        try:
-            tx_hash = self.supply_chain_contract.functions.add_products(
-                apparel,
-                fabric,
-                num_items
-            ).transact({'from': self.supply_chain_w3.eth.accounts[0]})
-            tx_receipt = self.supply_chain_w3.eth.wait_for_transaction_receipt(tx_hash)
-        except Exception:
-            print("[ERROR] Transaction Failed!")
-            return False
-        return True
+            return None
+        # Send Transaction, the caller collects the receipt
+        return self._submit_write(self._add_product_call(apparel, fabric, num_items))
     
-    def defective_products(self, defective_list: List[int]) -> bool:
+    def defective_products(self, defective_list: List[int]) -> Future:
         """A method to be used by the admin of supply chain contract.\n
         A method used to remove defective products from the supply chain.\n
         argument: defective_list is a list of 6 integers that are the number of each corresponding item below.\n
         [Cotton Shirt, Polyester Shirt, Cotton T-Shirt, Polyester T-Shirt, Cotton Pants, Polyester Pants]\n
-        returns 'True' if transaction was successful otherwise returns 'False'"""
+        returns: Future of the transaction receipt or None if the arguments are invalid"""
         # Error Checking
         if not self.is_connected():
-            return False
-        if len(defective_list) != 6:
-            print("[ERROR] Argument must be a list of 6 integers!")
-            return False
-        for item in defective_list:
-            if type(item) != int:
-                print("[ERROR] Items in argument must be integers!")
-                return False
-        # Send Transaction
-        try:
-            tx_hash = self.supply_chain_contract.functions.defective_products(
-                defective_list
-            ).transact({'from': self.supply_chain_w3.eth.accounts[0]})
-            tx_receipt = self.supply_chain_w3.eth.wait_for_transaction_receipt(tx_hash)
-        except Exception:
-            print("[ERROR] Transaction Failed!")
-            return False
-        return True
+            return None
+        # Send Transaction, the caller collects the receipt
+        return self._submit_write(self._defective_products_call(defective_list))
     # ---------------------------------------------------------------------------------
     
     # BRIDGE CONTRACT METHODS----------------------------------------------------------
-    def create_basket(self, receipt_number: int) -> bool:
+    def create_basket(self, receipt_number: int) -> Future:
         """Create a new transaction to get total of all items in the basket.\n
         arguments: receipt_number is the receipt number of basket to be paid with bitcoin.\n
-        returns 'True' if transaction was successful otherwise returns 'False'"""
+        returns: Future of the transaction receipt or None if the arguments are invalid"""
         # Error Checking
         if not self.is_connected():
-            return False
-        if type(receipt_number) != int:
-            print("[ERROR] Receipt Number must be an integer!")
-            return False
-        # Send Transaction
-        try:
-            tx_hash = self.bridge_contract.functions.create_transaction(
-                receipt_number
-            ).transact({'from': self.bridge_w3.eth.accounts[0]})
-            tx_receipt = self.bridge_w3.eth.wait_for_transaction_receipt(tx_hash)
-        except Exception:
-            print("[ERROR] Transaction Failed!")
-            return False
-        return True
+            return None
+        # Send Transaction, the caller collects the receipt
+        return self._submit_write(self._create_basket_call(receipt_number))
     
-    def add_items_to_basket(self, receipt_number: int, items: List[int], prices: List[int]) -> bool:
+    def add_items_to_basket(self, receipt_number: int, items: List[int], prices: List[int]) -> Future:
         """Add particular items to the basket to be ready for payment.\n
         Arguments:\n
         \treceipt_num -> integer representing the receipt number of basket\n
         \titems -> A list of item numbers to be added to basket\n
         \tprices -> A list of prices in cents used to calculate new total for whole basket.\n
-        returns 'True' if transaction was successful otherwise returns 'False'"""
+        returns: Future of the transaction receipt or None if the arguments are invalid"""
         # Error Checking
         if not self.is_connected():
-            return False
-        if type(receipt_number) != int:
-            print("[ERROR] Receipt Number must be an integer!")
-            return False
-        if len(items) != len(prices):
-            print("[ERROR] Number of items does not match number of prices!")
-            return False
-        for index in range(len(items)):
-            if type(items[index]) != int or type(prices[index]) != int:
-                print("[ERROR] Arguments 'items' and 'prices' must contain only integers!")
-                return False
-        # Send Transaction
-        try:
-            tx_hash = self.bridge_contract.functions.add_items_to_transaction(
-                receipt_number,
-                items,
-                prices
-            ).transact({'from': self.bridge_w3.eth.accounts[0]})
-            tx_receipt = self.bridge_w3.eth.wait_for_transaction_receipt(tx_hash)
-        except Exception:
-            print("[ERROR] Transaction Failed!")
-            return False
-        return True
+            return None
+        # Send Transaction, the caller collects the receipt
+        return self._submit_write(self._add_items_to_basket_call(receipt_number, items, prices))
+    
+    def create_basket_with_items(self, receipt_number: int, items: List[int], prices: List[int]) -> Future:
+        """Creates a new basket and adds its items in a single transaction.\n
+        Arguments:\n
+        \treceipt_num -> integer representing the receipt number of the new basket\n
+        \titems -> A list of item numbers to be added to basket\n
+        \tprices -> A list of prices in cents used to calculate the total of the basket.\n
+        returns: Future of the transaction receipt or None if the arguments are invalid"""
+        # Error Checking
+        if not self.is_connected():
+            return None
+        # Send Transaction, the caller collects the receipt
+        return self._submit_write(self._create_basket_with_items_call(receipt_number, items, prices))
     
-    def seller_confirmation(self, receipt_number: int, seller_address: str) -> bool:
+    def seller_confirmation(self, receipt_number: int, seller_address: str) -> Future:
         """Method to get confirmation from the seller to proceed with payment\n
-        returns 'True' if transaction was successful otherwise returns 'False'"""
+        returns: Future of the transaction receipt or None if the arguments are invalid"""
         # Error Checking
         if not self.is_connected():
-            return False
-        if type(receipt_number) != int:
-            print("[ERROR] Receipt Number must be an integer!")
-            return False
-        # Send Transaction
-        try:
-            tx_hash = self.bridge_contract.functions.confirm_seller(
-                receipt_number
-            ).transact({'from': seller_address})
-            tx_receipt = self.bridge_w3.eth.wait_for_transaction_receipt(tx_hash)
-        except Exception:
-            print("[ERROR] Transaction Failed! Please check Receipt Number to see if it is valid!")
-            return False
-        return True
+            return None
+        # Send Transaction, the caller collects the receipt
+        return self._submit_write(self._seller_confirmation_call(receipt_number, seller_address))
     
-    def buyer_confirmation(self, receipt_number: int, buyer_address: str) -> bool:
+    def buyer_confirmation(self, receipt_number: int, buyer_address: str) -> Future:
         """Method to get confirmation from the buyer to proceed with payment\n
-        returns 'True' if transaction was successful otherwise returns 'False'"""
+        returns: Future of the transaction receipt or None if the arguments are invalid"""
         # Error Checking
         if not self.is_connected():
-            return False
-        if type(receipt_number) != int:
-            print("[ERROR] Receipt Number must be an integer!")
-            return False
-        # Send Transaction
-        try:
-            tx_hash = self.bridge_contract.functions.confirm_buyer(
-                receipt_number
-            ).transact({'from': buyer_address})
-            tx_receipt = self.bridge_w3.eth.wait_for_transaction_receipt(tx_hash)
-        except Exception:
-            print("[ERROR] Transaction Failed! Please check Receipt Number to see if it is valid!")
-            return False
-        return True
+            return None
+        # Send Transaction, the caller collects the receipt
+        return self._submit_write(self._buyer_confirmation_call(receipt_number, buyer_address))
     
-    def pay_basket(self, receipt_number: int) -> bool:
+    def pay_basket(self, receipt_number: int) -> Future:
         """A method to initiate the payment process for a receipt number.\n
         This method only succeeds after both the seller and the buyer have sent their
         confirmations for payment.\n
-        returns 'True' if transaction was successful otherwise returns 'False'"""
+        returns: Future of the transaction receipt or None if the arguments are invalid"""
         # Error Checking
         if not self.is_connected():
-            return False
-        if type(receipt_number) != int:
-            print("[ERROR] Receipt Number must be an integer!")
-            return False
-        # Send Transaction
-        try:
-            tx_hash = self.bridge_contract.functions.pay_transaction(
-                receipt_number
-            ).transact({'from': self.bridge_w3.eth.accounts[0]})
-            tx_receipt = self.bridge_w3.eth.wait_for_transaction_receipt(tx_hash)
-        except Exception:
-            print("[ERROR] Transaction Failed! Please enter a valid receipt number or check to see if transaction is already paid.")
-            return False
-        return True
+            return None
+        # Send Transaction, the caller collects the receipt
+        return self._submit_write(self._pay_basket_call(receipt_number))
     
-    def refund_basket(self, receipt_number: int) -> bool:
+    def refund_basket(self, receipt_number: int) -> Future:
         """A method to initiate the refund process for a receipt number.\n
         This method only succeeds after a payment has been successfully been processed.\n
-        returns 'True' if transaction was successful otherwise returns 'False'"""
+        returns: Future of the transaction receipt or None if the arguments are invalid"""
         # Error Checking
         if not self.is_connected():
-            return False
-        if type(receipt_number) != int:
-            print("[ERROR] Receipt Number must be an integer!")
-            return False
-        # Send Transaction
-        try:
-            tx_hash = self.bridge_contract.functions.refund_transaction(
-                receipt_number
-            ).transact({'from': self.bridge_w3.eth.accounts[0]})
-            tx_receipt = self.bridge_w3.eth.wait_for_transaction_receipt(tx_hash)
-        except Exception:
-            print("[ERROR] Transaction Failed! Please enter a valid receipt number or check to see if transaction failed or is already refunded.")
-            return False
-        return True
+            return None
+        # Send Transaction, the caller collects the receipt
+        return self._submit_write(self._refund_basket_call(receipt_number))
     
     def get_basket_state(self, receipt_number: int) -> int:
         """Gets state of the basket with associated receipt number\n
@@ -490,6 +579,20 @@ class BitcoinBridgeGanache:
             return None
         return self.bridge_contract.functions.get_state(receipt_number).call()
     
+    def get_basket_states(self, receipt_numbers: List[int]) -> List[int]:
+        """Gets the states of several baskets in a single call.\n
+        return value: list of states in the order of 'receipt_numbers', see get_basket_state"""
+        # Error Checking
+        if not self.is_connected():
+            return None
+        if any(type(receipt_number) != int for receipt_number in receipt_numbers):
+            print("[ERROR] Receipt Number must be an integer!")
+            return None
+        batch = self.multicall('bridge')
+        for receipt_number in receipt_numbers:
+            batch.add(self.bridge_contract.functions.get_state(receipt_number))
+        return batch.execute()
+    
     def get_num_baskets(self) -> int:
         """Gets the number of baskets made by the TransactionBridge Contract."""
         # Error Checking
@@ -499,6 +602,216 @@ class BitcoinBridgeGanache:
     
     # ---------------------------------------------------------------------------------
     
+    # WRITE CALLS----------------------------------------------------------------------
+    # Each validates the arguments of a write method and returns its call as
+    # (chain, contract function, sender or None for the default account, error message),
+    # so the blocking and the asyncio classes send the same transactions
+    def _buy_items_call(self, buy_list: List[int]) -> Tuple:
+        "Validates the arguments of buy_items, returns its write call or None if they are invalid"
+        if len(buy_list) != 6:
+            print("[ERROR] Argument must be a list of exactly 6 integers!")
+            return None
+        for item in buy_list:
+            if type(item) != int:
+                print("[ERROR] Item in argument was not an integer!")
+                return None
+        
+        # Get user account input
+        # try:
+        #     acc = int(input("Please enter the Account you want to buy from [1-9]: "))
+        #     acc = self.supply_chain_w3.eth.accounts[acc]
+        # except Exception:
+        #     print("[ERROR] Invalid Account Number!\n")
+        #     return False
+        acc = self.supply_chain_accounts[1]
+        
+        return (
+            'supply_chain',
+            self.supply_chain_contract.functions.buy_product(buy_list),
+            acc,
+            "Transaction Failed!"
+        )
+
+    def _change_item_info_call(self, apparel: int, fabric: int, price: int, weight: int) -> Tuple:
+        "Validates the arguments of change_item_info, returns its write call or None if they are invalid"
+        if type(apparel) != int or type(fabric) != int or type(price) != int or type(weight) != int:
+            print("[ERROR] Arguments are not integers!")
+            return None
+        return (
+            'supply_chain',
+            self.supply_chain_contract.functions.change_clothes(apparel, fabric, price, weight),
+            None,
+            "Transaction Failed!"
+        )
+
+    def _add_product_call(self, apparel: int, fabric: int, num_items: int) -> Tuple:
+        "Validates the arguments of add_product, returns its write call or None if they are invalid"
+        if type(apparel) != int or type(fabric) != int or type(num_items) != int:
+            print("[ERROR] Arguments are not integers!")
+            return None
+        return (
+            'supply_chain',
+            self.supply_chain_contract.functions.add_products(apparel, fabric, num_items),
+            None,
+            "Transaction Failed!"
+        )
+
+    def _defective_products_call(self, defective_list: List[int]) -> Tuple:
+        "Validates the arguments of defective_products, returns its write call or None if they are invalid"
+        if len(defective_list) != 6:
+            print("[ERROR] Argument must be a list of 6 integers!")
+            return None
+        for item in defective_list:
+            if type(item) != int:
+                print("[ERROR] Items in argument must be integers!")
+                return None
+        return (
+            'supply_chain',
+            self.supply_chain_contract.functions.defective_products(defective_list),
+            None,
+            "Transaction Failed!"
+        )
+
+    def _create_basket_call(self, receipt_number: int) -> Tuple:
+        "Validates the arguments of create_basket, returns its write call or None if they are invalid"
+        if type(receipt_number) != int:
+            print("[ERROR] Receipt Number must be an integer!")
+            return None
+        return (
+            'bridge',
+            self.bridge_contract.functions.create_transaction(receipt_number),
+            None,
+            "Transaction Failed!"
+        )
+
+    def _add_items_to_basket_call(self, receipt_number: int, items: List[int], prices: List[int]) -> Tuple:
+        "Validates the arguments of add_items_to_basket, returns its write call or None if they are invalid"
+        if type(receipt_number) != int:
+            print("[ERROR] Receipt Number must be an integer!")
+            return None
+        if len(items) != len(prices):
+            print("[ERROR] Number of items does not match number of prices!")
+            return None
+        for index in range(len(items)):
+            if type(items[index]) != int or type(prices[index]) != int:
+                print("[ERROR] Arguments 'items' and 'prices' must contain only integers!")
+                return None
+        return (
+            'bridge',
+            self.bridge_contract.functions.add_items_to_transaction(receipt_number, items, prices),
+            None,
+            "Transaction Failed!"
+        )
+
+    def _create_basket_with_items_call(self, receipt_number: int, items: List[int], prices: List[int]) -> Tuple:
+        "Validates the arguments of create_basket_with_items, returns its write call or None if they are invalid"
+        if type(receipt_number) != int:
+            print("[ERROR] Receipt Number must be an integer!")
+            return None
+        if len(items) != len(prices):
+            print("[ERROR] Number of items does not match number of prices!")
+            return None
+        for index in range(len(items)):
+            if type(items[index]) != int or type(prices[index]) != int:
+                print("[ERROR] Arguments 'items' and 'prices' must contain only integers!")
+                return None
+        return (
+            'bridge',
+            self.bridge_contract.functions.create_transaction_with_items(receipt_number, items, prices),
+            None,
+            "Transaction Failed! Please check that the receipt number is not already used."
+        )
+
+    def _seller_confirmation_call(self, receipt_number: int, seller_address: str) -> Tuple:
+        "Validates the arguments of seller_confirmation, returns its write call or None if they are invalid"
+        if type(receipt_number) != int:
+            print("[ERROR] Receipt Number must be an integer!")
+            return None
+        return (
+            'bridge',
+            self.bridge_contract.functions.confirm_seller(receipt_number),
+            seller_address,
+            "Transaction Failed! Please check Receipt Number to see if it is valid!"
+        )
+
+    def _buyer_confirmation_call(self, receipt_number: int, buyer_address: str) -> Tuple:
+        "Validates the arguments of buyer_confirmation, returns its write call or None if they are invalid"
+        if type(receipt_number) != int:
+            print("[ERROR] Receipt Number must be an integer!")
+            return None
+        return (
+            'bridge',
+            self.bridge_contract.functions.confirm_buyer(receipt_number),
+            buyer_address,
+            "Transaction Failed! Please check Receipt Number to see if it is valid!"
+        )
+
+    def _pay_basket_call(self, receipt_number: int) -> Tuple:
+        "Validates the arguments of pay_basket, returns its write call or None if they are invalid"
+        if type(receipt_number) != int:
+            print("[ERROR] Receipt Number must be an integer!")
+            return None
+        return (
+            'bridge',
+            self.bridge_contract.functions.pay_transaction(receipt_number),
+            None,
+            "Transaction Failed! Please enter a valid receipt number or check to see if transaction is already paid."
+        )
+
+    def _refund_basket_call(self, receipt_number: int) -> Tuple:
+        "Validates the arguments of refund_basket, returns its write call or None if they are invalid"
+        if type(receipt_number) != int:
+            print("[ERROR] Receipt Number must be an integer!")
+            return None
+        return (
+            'bridge',
+            self.bridge_contract.functions.refund_transaction(receipt_number),
+            None,
+            "Transaction Failed! Please enter a valid receipt number or check to see if transaction failed or is already refunded."
+        )
+
+    # ---------------------------------------------------------------------------------
+    
+    # MULTICALL METHODS----------------------------------------------------------------
+    def multicall(self, chain: str) -> MulticallBatch:
+        """Starts a batch of view calls run as a single eth_call.\n
+        chain: 'supply_chain' or 'bridge', the chain of every contract called in the batch"""
+        if chain == 'supply_chain':
+            return MulticallBatch(self.supply_chain_w3, self.supply_chain_multicall)
+        return MulticallBatch(self.bridge_w3, self.bridge_multicall)
+    
+    # ---------------------------------------------------------------------------------
+    
+    # TRANSACTION METHODS--------------------------------------------------------------
+    def _submit_write(self, call: Tuple) -> Future:
+        """Submits the write call of a write method, its error message is printed if it fails.\n
+        returns: Future of the transaction receipt or None if the call is None"""
+        if call is None:
+            return None
+        chain, function, sender, error = call
+        def report(future: Future) -> None:
+            if future.exception() is not None:
+                print(f"[ERROR] {error}")
+        future = self.submit_transaction(chain, function, sender)
+        future.add_done_callback(report)
+        return future
+
+    def submit_transaction(self, chain: str, function, sender: str = None) -> Future:
+        """Sends a transaction without waiting for it to be mined.\n
+        chain: 'supply_chain' or 'bridge', the chain of the contract called\n
+        function: contract function with its arguments i.e. bridge_contract.functions.pay_transaction(receipt_number)\n
+        sender: account sending the transaction, the default account of the chain if None\n
+        returns: Future of the transaction receipt, many transactions can be pending at once"""
+        if chain == 'supply_chain':
+            w3, pipeline = self.supply_chain_w3, self.supply_chain_pipeline
+        else:
+            w3, pipeline = self.bridge_w3, self.bridge_pipeline
+        if sender is None:
+            sender = w3.eth.default_account
+        return pipeline.submit(function, sender)
+    
+    # ---------------------------------------------------------------------------------
+    
     # BITCOIN METHODS------------------------------------------------------------------
     def get_balance_btc(self, currency: str) -> None:
         """Gets the buyer and seller balances in either usd or btc\n
@@ -508,9 +821,17 @@ class BitcoinBridgeGanache:
             print("[ERROR] Currency should be only 'btc' or 'usd'!")
             return
         
+        # Balances are read from the wallet state in satoshis and converted with the cached price
+        balances = []
+        for key in (self.buyer, self.seller):
+            satoshis = self.wallet.balance(key.address)
+            if currency == 'usd':
+                balances.append(format_cents(self.exchange_rate.satoshi_to_cents(satoshis)))
+            else:
+                balances.append(format_satoshi(satoshis))
         print(f"""Current Balances [{currency}]\n
-        \r\tBuyer:\tAddress: {self.buyer.address}\t{self.buyer.get_balance(currency)}\n
-        \r\tSeller:\tAddress: {self.seller.address}\t{self.seller.get_balance(currency)}""")
+        \r\tBuyer:\tAddress: {self.buyer.address}\t{balances[0]}\n
+        \r\tSeller:\tAddress: {self.seller.address}\t{balances[1]}""")
     
     def send_btc(self, amount: int, reverse = False) -> bool:
         """Sends 'amount', in US cents, worth of bitcoin from one account to another\n
@@ -522,15 +843,38 @@ class BitcoinBridgeGanache:
             return False
         
         try:
+            # Sent in satoshis so bit does not look up the exchange rate again, the wallet state
+            # provides the unspent outputs and the fee rate
+            satoshis = self.exchange_rate.cents_to_satoshi(amount)
             if not reverse:
-                tx_hash = self.buyer.send([(self.seller.address, amount/100, 'usd')])
+                tx_hash = self.wallet.send(self.buyer, [(self.seller.address, satoshis, 'satoshi')])
                 print(tx_hash)
             else:
-                tx_hash = self.seller.send([(self.buyer.address, amount/100, 'usd')])
+                tx_hash = self.wallet.send(self.seller, [(self.buyer.address, satoshis, 'satoshi')])
                 print(tx_hash)
         except Exception:
             print("[ERROR] Bitcoin transaction failed! Please try again!")
             return False
         return True
     
+    def start_payout_queue(self, path: str) -> None:
+        """Opens the payout queue kept in the SQLite file 'path' and starts sending its payouts,
+        payouts left over by a previous run are sent first"""
+        self.payout_queue = PayoutQueue(path, self.wallet, self.BTC_BATCH_WINDOW, self.BTC_BATCH_SIZE)
+        self.payout_queue.start()
+
+    def queue_btc(self, receipt_number: int, amount: int, reverse: bool = False) -> bool:
+        """Records a payout of 'amount', in US cents, worth of bitcoin for 'receipt_number' in the
+        payout queue, it is sent in the background\n
+        by default sends from buyer to seller\n
+        if reverse = True then sends from seller to buyer (a refund).\n
+        returns: False if this payout of the receipt was already recorded"""
+        if type(amount) != int:
+            print("[ERROR] 'Amount' should be an integer!")
+            return False
+        satoshis = self.exchange_rate.cents_to_satoshi(amount)
+        if not reverse:
+            return self.payout_queue.enqueue(receipt_number, PAYMENT, self.buyer, self.seller.address, satoshis)
+        return self.payout_queue.enqueue(receipt_number, REFUND, self.seller, self.buyer.address, satoshis)
+
     # ---------------------------------------------------------------------------------
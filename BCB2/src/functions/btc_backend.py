@@ -0,0 +1,234 @@
+"""
+This file contains the bitcoin backends of the Bitcoin Bridge system. A backend gives the
+wallet state the unspent outputs of an address, the fee rate and a way to broadcast a signed
+transaction. Keys are always bit testnet keys and transactions are always signed locally,
+so the same payment code runs against the public testnet, a local bitcoind regtest node or
+an in-memory simulator that needs no network at all.
+"""
+import os
+import json
+import time
+import base64
+import threading
+import urllib.request
+from decimal import Decimal
+from bit import PrivateKeyTestnet
+from bit.network import NetworkAPI, get_fee
+from bit.network.meta import Unspent
+from bit.transaction import address_to_scriptpubkey, calc_txid, deserialize
+from typing import Dict, List, Tuple
+
+SATOSHIS_PER_BTC = 100000000
+
+class BitcoinBackend:
+    """Interface of a bitcoin backend.\n
+    Implementations provide 'get_unspents', 'get_fee', 'broadcast' and 'is_known', 'load_key'
+    and 'new_key' are shared since every backend uses bit testnet keys."""
+    # Name printed when connecting
+    NAME = None
+
+    def load_key(self, wif: str) -> PrivateKeyTestnet:
+        "Loads a key from its wallet import format"
+        return PrivateKeyTestnet(wif)
+
+    def new_key(self) -> PrivateKeyTestnet:
+        "Creates a new random key"
+        return PrivateKeyTestnet()
+
+    def get_unspents(self, address: str) -> List[Unspent]:
+        "Returns the unspent outputs of 'address'"
+        raise NotImplementedError
+
+    def get_fee(self) -> int:
+        "Returns the fee rate in satoshis per byte"
+        raise NotImplementedError
+
+    def broadcast(self, tx_hex: str) -> None:
+        "Sends a signed transaction to the network, raises if it is rejected"
+        raise NotImplementedError
+
+    def is_known(self, txid: str) -> bool:
+        "Returns True when the network already has the transaction 'txid'"
+        raise NotImplementedError
+
+class BitTestnetBackend(BitcoinBackend):
+    "The public bitcoin testnet reached through the web APIs used by bit"
+    NAME = "Testnet"
+
+    def get_unspents(self, address: str) -> List[Unspent]:
+        return NetworkAPI.get_unspent_testnet(address)
+
+    def get_fee(self) -> int:
+        return get_fee()
+
+    def broadcast(self, tx_hex: str) -> None:
+        NetworkAPI.broadcast_tx_testnet(tx_hex)
+
+    def is_known(self, txid: str) -> bool:
+        return NetworkAPI.get_transaction_by_id_testnet(txid) is not None
+
+class RegtestBackend(BitcoinBackend):
+    """A local bitcoind node in regtest mode reached over its JSON-RPC interface.\n
+    Regtest uses the testnet address format, so bit testnet keys are valid there. Loaded
+    keys are imported as watch-only addresses so the node lists their unspent outputs,
+    including the ones still in its mempool."""
+    NAME = "Regtest"
+    # Fee rate used while the node has too few transactions to estimate one
+    DEFAULT_FEE = 1
+
+    def __init__(self, url: str = "http://127.0.0.1:18443", user: str = None, password: str = None):
+        # Instance Variables
+        self.url = url
+        self.headers = {'Content-Type': 'application/json'}
+        if user is not None:
+            credentials = base64.b64encode(f"{user}:{password}".encode()).decode()
+            self.headers['Authorization'] = f"Basic {credentials}"
+        self.request_id = 0
+        self.lock = threading.Lock()
+
+    def rpc(self, method: str, *params):
+        "Calls a JSON-RPC method of the node and returns its result"
+        with self.lock:
+            self.request_id += 1
+            request_id = self.request_id
+        body = json.dumps({'jsonrpc': '1.0', 'id': request_id, 'method': method, 'params': params}).encode()
+        request = urllib.request.Request(self.url, body, self.headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                reply = json.loads(response.read(), parse_float = Decimal)
+        except urllib.error.HTTPError as err:
+            # bitcoind answers failed calls with an error status and the error in the body
+            reply = json.loads(err.read(), parse_float = Decimal)
+        if reply.get('error') is not None:
+            raise ValueError(f"{method} failed: {reply['error']['message']}")
+        return reply['result']
+
+    def load_key(self, wif: str) -> PrivateKeyTestnet:
+        key = super().load_key(wif)
+        self.watch(key.address)
+        return key
+
+    def new_key(self) -> PrivateKeyTestnet:
+        key = super().new_key()
+        self.watch(key.address)
+        return key
+
+    def watch(self, address: str) -> None:
+        "Imports 'address' into the node wallet without a rescan"
+        try:
+            self.rpc('importaddress', address, "", False)
+        except ValueError:
+            # Descriptor wallets only import descriptors
+            descriptor = self.rpc('getdescriptorinfo', f"addr({address})")['descriptor']
+            self.rpc('importdescriptors', [{'desc': descriptor, 'timestamp': 'now'}])
+
+    def get_unspents(self, address: str) -> List[Unspent]:
+        return [
+            Unspent(
+                int(output['amount'] * SATOSHIS_PER_BTC),
+                output['confirmations'],
+                output['scriptPubKey'],
+                output['txid'],
+                output['vout']
+            )
+            for output in self.rpc('listunspent', 0, 9999999, [address])
+        ]
+
+    def get_fee(self) -> int:
+        estimate = self.rpc('estimatesmartfee', 6)
+        if 'feerate' not in estimate:
+            return self.DEFAULT_FEE
+        # BTC per kilobyte -> satoshis per byte
+        return max(1, int(estimate['feerate'] * SATOSHIS_PER_BTC / 1000))
+
+    def broadcast(self, tx_hex: str) -> None:
+        self.rpc('sendrawtransaction', tx_hex)
+
+    def is_known(self, txid: str) -> bool:
+        # Our transactions are in the node wallet since their addresses are watched
+        try:
+            self.rpc('gettransaction', txid, True)
+        except ValueError:
+            return False
+        return True
+
+    def mine(self, num_blocks: int, address: str) -> List[str]:
+        "Mines 'num_blocks' blocks paying their reward to 'address', i.e. to fund a test wallet"
+        return self.rpc('generatetoaddress', num_blocks, address)
+
+class SimulatedBackend(BitcoinBackend):
+    """An in-memory bitcoin network used for offline tests and benchmarks.\n
+    Every key it loads or creates is funded with 'initial_balance' satoshis. Broadcast
+    transactions are checked against the simulated unspent outputs, so spending an output
+    twice fails like it would on a real node. Every call waits 'latency' seconds to stand
+    in for the round trip to a real backend."""
+    NAME = "Simulator"
+
+    def __init__(self, latency: float = 0.0, fee: int = 1, initial_balance: int = SATOSHIS_PER_BTC):
+        # Instance Variables
+        self.latency = latency
+        self.fee = fee
+        self.initial_balance = initial_balance
+        self.lock = threading.Lock()
+        # (txid, output index) -> (output script in hex, amount) of every unspent output
+        self.outputs: Dict[Tuple[str, int], Tuple[str, int]] = {}
+        # Ids of every accepted transaction
+        self.transactions = set()
+        # Counters
+        self.broadcasts = 0
+
+    def load_key(self, wif: str) -> PrivateKeyTestnet:
+        key = super().load_key(wif)
+        self.fund(key.address, self.initial_balance)
+        return key
+
+    def new_key(self) -> PrivateKeyTestnet:
+        key = super().new_key()
+        self.fund(key.address, self.initial_balance)
+        return key
+
+    def fund(self, address: str, satoshis: int) -> None:
+        "Gives 'address' a new output of 'satoshis' out of thin air"
+        if satoshis <= 0:
+            return
+        with self.lock:
+            self.outputs[(os.urandom(32).hex(), 0)] = (address_to_scriptpubkey(address).hex(), satoshis)
+
+    def get_unspents(self, address: str) -> List[Unspent]:
+        time.sleep(self.latency)
+        script = address_to_scriptpubkey(address).hex()
+        with self.lock:
+            return [
+                Unspent(amount, 1, output_script, txid, index)
+                for (txid, index), (output_script, amount) in self.outputs.items() if output_script == script
+            ]
+
+    def get_fee(self) -> int:
+        time.sleep(self.latency)
+        return self.fee
+
+    def broadcast(self, tx_hex: str) -> None:
+        time.sleep(self.latency)
+        tx = deserialize(tx_hex)
+        txid = calc_txid(tx_hex)
+        inputs = [(tx_in.txid[::-1].hex(), int.from_bytes(tx_in.txindex, 'little')) for tx_in in tx.TxIn]
+        with self.lock:
+            missing = [outpoint for outpoint in inputs if outpoint not in self.outputs]
+            if missing:
+                raise ValueError(f"Transaction {txid} spends missing or spent outputs {missing}")
+            outputs = [(tx_out.script_pubkey.hex(), int.from_bytes(tx_out.amount, 'little')) for tx_out in tx.TxOut]
+            spent = sum(self.outputs[outpoint][1] for outpoint in inputs)
+            paid = sum(amount for _, amount in outputs)
+            if paid > spent:
+                raise ValueError(f"Transaction {txid} pays {paid} satoshis but only spends {spent}")
+            for outpoint in inputs:
+                del self.outputs[outpoint]
+            for index, output in enumerate(outputs):
+                self.outputs[(txid, index)] = output
+            self.transactions.add(txid)
+            self.broadcasts += 1
+
+    def is_known(self, txid: str) -> bool:
+        time.sleep(self.latency)
+        with self.lock:
+            return txid in self.transactions
@@ -0,0 +1,27 @@
+"""
+This file contains the compiled contract cache used when deploying the contracts. The output
+of solc is saved on disk under the hash of the source code and the compiler version, so a
+contract is only compiled again once its source or the compiler changes.
+"""
+import os
+import json
+import hashlib
+from solcx import compile_source, get_solc_version
+
+def compile_source_cached(source: str, cache_dir: str) -> dict:
+    """Drop-in replacement of solcx.compile_source reading the result from 'cache_dir' when
+    the same source was already compiled with the same compiler.\n
+    returns: contract id -> contract interface (abi, bin, ...) like compile_source"""
+    solc_version = str(get_solc_version())
+    key = hashlib.sha256(f"{solc_version}\n{source}".encode()).hexdigest()
+    cache_file = os.path.join(cache_dir, f"{key}.json")
+    if os.path.exists(cache_file):
+        with open(cache_file, 'r') as file_obj:
+            return json.load(file_obj)
+    compiled = compile_source(source)
+    os.makedirs(cache_dir, exist_ok = True)
+    # Write to a temporary file first so an interrupted compile never leaves a broken entry
+    with open(f"{cache_file}.tmp", 'w') as file_obj:
+        json.dump(compiled, file_obj)
+    os.replace(f"{cache_file}.tmp", cache_file)
+    return compiled
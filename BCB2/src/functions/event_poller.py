@@ -0,0 +1,280 @@
+"""
+This file contains the log poller used by the event listener. A single poller tails every
+event of the contracts living on one chain with one log filter and routes each log to
+the right handler using its first topic (the event signature hash). Handlers are run by a
+BoundedExecutor and the poller stops fetching new logs while its queue is full. A handler
+may return a Future for work it handed off (i.e. a write batch), the checkpoint then waits
+for that Future too without holding a worker.
+On start the poller replays the blocks it missed since its last checkpoint.
+When a WebSocket url is given, logs are pushed by an eth_subscribe("logs") subscription
+and the poller falls back to HTTP polling whenever the subscription is down.
+"""
+import time
+import json
+import asyncio
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from eth_utils import event_abi_to_log_topic
+from hexbytes import HexBytes
+from typing import Callable, Dict, List, Optional, Tuple
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+def format_log(raw_log: dict) -> dict:
+    "Converts a log received from a WebSocket subscription to the format returned by web3"
+    log = dict(raw_log)
+    log['topics'] = [HexBytes(topic) for topic in raw_log['topics']]
+    log['blockHash'] = HexBytes(raw_log['blockHash'])
+    log['transactionHash'] = HexBytes(raw_log['transactionHash'])
+    for key in ('blockNumber', 'logIndex', 'transactionIndex'):
+        log[key] = int(raw_log[key], 16)
+    return log
+
+class EventPoller:
+    """Polls one chain for new logs of every registered event using a single filter.\n
+    Register handlers with 'register' and then run the 'run' coroutine inside the
+    asyncio loop of the event listener. RPC load is one call per tick no matter how
+    many events are registered."""
+    # Seconds to wait before offering a log again to a full worker pool
+    BACKPRESSURE_DELAY = 0.1
+    # Number of blocks fetched by one eth_getLogs call while catching up
+    BACKFILL_CHUNK = 2000
+    # Number of eth_getLogs calls running at the same time while catching up
+    BACKFILL_WORKERS = 4
+    # Seconds to wait before the first attempt to reconnect a WebSocket and the longest wait
+    RECONNECT_DELAY = 1
+    MAX_RECONNECT_DELAY = 30
+    # Log index marking that every log of a block was dispatched
+    BLOCK_DONE = float('inf')
+
+    def __init__(self, w3, name: str, executor, checkpoint = None, topics: Optional[Dict[str, bytes]] = None):
+        """topics: precomputed topic of every event by event name i.e. from the deployment manifest"""
+        # Instance Variables
+        self.w3 = w3
+        self.name = name
+        self.executor = executor
+        self.checkpoint = checkpoint
+        self.topics = topics or {}
+        self.addresses = []
+        # topic0 -> event object used for decoding
+        self.events: Dict[bytes, object] = {}
+        # topic0 -> (handler, names of args passed to handler)
+        self.routes: Dict[bytes, Tuple] = {}
+        # topic0 -> functions called with the decoded event before its handler is queued
+        self.observers: Dict[bytes, List[Callable]] = {}
+        self.event_filter = None
+        # Handlers that have not finished yet, in block order: (block number, future)
+        self.in_flight = deque()
+        # (block number, log index) of the last dispatched log
+        self.position = None
+        self.last_saved = None
+        # WebSocket reconnection state
+        self.reconnect_delay = self.RECONNECT_DELAY
+        self.reconnect_at = 0
+
+    def register(self, event, handler: Callable, arg_names: Tuple[str, ...]) -> None:
+        """Routes every log of 'event' to 'handler'.\n
+        event: contract event class i.e. contract.events.items_bought\n
+        handler: function called with the event arguments in the order of 'arg_names', it may
+        return a Future the checkpoint waits for before moving past the log"""
+        topic = self._add_event(event)
+        self.routes[topic] = (handler, arg_names)
+
+    def observe(self, event, observer: Callable) -> None:
+        """Calls 'observer' with every decoded log of 'event' on the polling loop itself,
+        before the handler of the log is queued.\n
+        Observers must be quick and must not make any RPC (i.e. updating a cache)."""
+        topic = self._add_event(event)
+        self.observers.setdefault(topic, []).append(observer)
+
+    def _add_event(self, event) -> bytes:
+        "Adds 'event' to the logs fetched by the poller and returns its topic"
+        topic = self.topics.get(event.event_name)
+        if topic is None:
+            topic = event_abi_to_log_topic(event._get_event_abi())
+        if event.address not in self.addresses:
+            self.addresses.append(event.address)
+        self.events[topic] = event()
+        return topic
+
+    async def dispatch(self, log) -> None:
+        """Decodes a raw log and queues its handler on the worker pool.\n
+        Waits while the pool is full. Logs that were already dispatched, removed by a
+        reorganisation or have an unknown topic are ignored."""
+        position = (log['blockNumber'], log['logIndex'])
+        if log.get('removed') or position <= self.position:
+            return
+        self.position = position
+        if not log['topics']:
+            return
+        topic = bytes(log['topics'][0])
+        event = self.events.get(topic)
+        if event is None:
+            return
+        event_data = event.processLog(log)
+        for observer in self.observers.get(topic, []):
+            observer(event_data)
+        route = self.routes.get(topic)
+        if route is None:
+            return
+        handler, arg_names = route
+        args = tuple(event_data['args'][name] for name in arg_names)
+        future = self.executor.try_submit(handler, *args)
+        while future is None:
+            await asyncio.sleep(self.BACKPRESSURE_DELAY)
+            future = self.executor.try_submit(handler, *args)
+        self.in_flight.append((log['blockNumber'], future))
+
+    def block_done(self, block: Optional[int] = None) -> None:
+        "Marks every log up to the end of 'block' (by default the current block) as dispatched"
+        if block is None:
+            block = self.position[0]
+        if (block, self.BLOCK_DONE) > self.position:
+            self.position = (block, self.BLOCK_DONE)
+
+    def save_checkpoint(self) -> None:
+        """Saves the highest block whose handlers, and the handlers of every block
+        before it, have all finished."""
+        if self.checkpoint is None:
+            return
+        while self.in_flight and self.in_flight[0][1].done():
+            block, future = self.in_flight[0]
+            if future.exception() is None and isinstance(future.result(), Future):
+                # The handler handed its work off, wait for that instead
+                self.in_flight[0] = (block, future.result())
+                continue
+            self.in_flight.popleft()
+        block, log_index = self.position
+        processed = block if log_index == self.BLOCK_DONE else block - 1
+        if self.in_flight:
+            processed = min(processed, self.in_flight[0][0] - 1)
+        if self.last_saved is None or processed > self.last_saved:
+            self.checkpoint.save(self.name, self.addresses, processed)
+            self.last_saved = processed
+
+    def get_logs(self, from_block: int, to_block: int) -> List:
+        "Fetches the logs of every registered contract between two blocks (inclusive)"
+        return self.w3.eth.get_logs({
+            'address': self.addresses,
+            'fromBlock': from_block,
+            'toBlock': to_block
+        })
+
+    async def backfill(self, from_block: int, to_block: int) -> None:
+        """Asynchronous function to replay every log between two blocks (inclusive).\n
+        The range is split in chunks that are fetched in parallel and dispatched in order."""
+        print(f"[BACKFILL] {self.name}: catching up on blocks {from_block} to {to_block}...")
+        start_time = time.perf_counter()
+        chunks = [
+            (start, min(start + self.BACKFILL_CHUNK - 1, to_block))
+            for start in range(from_block, to_block + 1, self.BACKFILL_CHUNK)
+        ]
+        loop = asyncio.get_event_loop()
+        num_logs = 0
+        with ThreadPoolExecutor(max_workers = self.BACKFILL_WORKERS) as pool:
+            # Fetch one wave of chunks at a time so memory stays bounded
+            for index in range(0, len(chunks), self.BACKFILL_WORKERS):
+                wave = chunks[index:index + self.BACKFILL_WORKERS]
+                results = await asyncio.gather(*[
+                    loop.run_in_executor(pool, self.get_logs, start, end) for start, end in wave
+                ])
+                for logs in results:
+                    for log in logs:
+                        await self.dispatch(log)
+                    num_logs += len(logs)
+                self.block_done(wave[-1][1])
+                self.save_checkpoint()
+        elapsed = time.perf_counter() - start_time
+        num_blocks = to_block - from_block + 1
+        print(f"""[BACKFILL] {self.name}: replayed {num_logs} logs from {num_blocks} blocks in {elapsed:.2f}s
+              \r\tThroughput: {num_blocks / max(elapsed, 1e-9):.1f} blocks/s""")
+
+    async def catch_up(self) -> None:
+        "Asynchronous function to replay every log between the last dispatched log and the head"
+        head = self.w3.eth.block_number
+        block, log_index = self.position
+        start = block + 1 if log_index == self.BLOCK_DONE else block
+        if start <= head:
+            await self.backfill(start, head)
+
+    async def poll(self, poll_interval: float) -> None:
+        "Asynchronous function to run one tick of HTTP polling"
+        if self.event_filter is None:
+            # Create the filter before catching up so no block falls in between
+            self.event_filter = self.w3.eth.filter({
+                'address': self.addresses,
+                'fromBlock': 'latest'
+            })
+            await self.catch_up()
+        for log in self.event_filter.get_new_entries():
+            await self.dispatch(log)
+        # A filter always returns every log of a block at once
+        self.block_done()
+        self.save_checkpoint()
+        await asyncio.sleep(poll_interval)
+
+    async def subscribe(self, ws_url: str, poll_interval: float) -> None:
+        """Asynchronous function to receive the logs pushed by an eth_subscribe("logs")
+        subscription. Returns only by raising when the connection is lost."""
+        async with websockets.connect(ws_url) as websocket:
+            await websocket.send(json.dumps({
+                'jsonrpc': '2.0',
+                'id': 1,
+                'method': 'eth_subscribe',
+                'params': ['logs', {'address': self.addresses}]
+            }))
+            reply = json.loads(await websocket.recv())
+            if 'result' not in reply:
+                raise ConnectionError(reply.get('error'))
+            print(f"[SUCCESS] {self.name}: subscribed to new logs over WebSocket!")
+            self.reconnect_delay = self.RECONNECT_DELAY
+            # Logs pushed meanwhile wait in the socket and are skipped if already replayed
+            self.event_filter = None
+            await self.catch_up()
+            while True:
+                try:
+                    message = json.loads(await asyncio.wait_for(websocket.recv(), poll_interval))
+                except asyncio.TimeoutError:
+                    # Nothing new for a while so the last block is complete
+                    self.block_done()
+                    self.save_checkpoint()
+                    continue
+                if message.get('method') != 'eth_subscription':
+                    continue
+                log = format_log(message['params']['result'])
+                # A log of a new block means the previous block is complete
+                if log['blockNumber'] > self.position[0]:
+                    self.block_done()
+                await self.dispatch(log)
+                self.save_checkpoint()
+
+    async def run(self, poll_interval: float, ws_url: Optional[str] = None, start_block: Optional[int] = None) -> None:
+        """Asynchronous function to replay the blocks missed since the last checkpoint and then
+        dispatch new logs as they come.\n
+        ws_url: WebSocket endpoint used to push new logs, HTTP polling every 'poll_interval'
+        seconds is used while it is down or when it is None.\n
+        start_block: first block to replay when there is no checkpoint i.e. the deploy block of
+        the contracts, only new blocks are dispatched when it is None."""
+        last_block = None
+        if self.checkpoint is not None:
+            last_block = self.checkpoint.get(self.name, self.addresses)
+        if last_block is None and start_block is not None:
+            last_block = start_block - 1
+        if last_block is None:
+            last_block = self.w3.eth.block_number
+        self.last_saved = last_block
+        self.position = (last_block, self.BLOCK_DONE)
+        if ws_url is not None and websockets is None:
+            print(f"[ERROR] {self.name}: 'websockets' is not installed, using HTTP polling.")
+            ws_url = None
+        while True:
+            if ws_url is not None and time.monotonic() >= self.reconnect_at:
+                try:
+                    await self.subscribe(ws_url, poll_interval)
+                except Exception as err:
+                    print(f"[ERROR] {self.name}: WebSocket subscription down ({err}), falling back to HTTP polling.")
+                    self.reconnect_at = time.monotonic() + self.reconnect_delay
+                    self.reconnect_delay = min(self.reconnect_delay * 2, self.MAX_RECONNECT_DELAY)
+            await self.poll(poll_interval)
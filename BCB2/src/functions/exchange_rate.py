@@ -0,0 +1,72 @@
+"""
+This file contains the BTC/USD exchange rate provider of the Bitcoin Bridge system. The
+price of a bitcoin is read from a feed at most once per time to live and kept as an integer
+number of US cents, so cents and satoshis are converted with integer arithmetic only.
+"""
+import time
+import threading
+from decimal import Decimal
+from bit.network.rates import RatesAPI
+from typing import Callable
+
+SATOSHIS_PER_BTC = 100000000
+
+def bit_usd_feed() -> int:
+    "Reads the price of one bitcoin in US cents from the rate APIs used by bit"
+    # bit gives the number of satoshis worth one dollar
+    return round(Decimal(100 * SATOSHIS_PER_BTC) / RatesAPI.usd_to_satoshi())
+
+def fixed_feed(cents_per_btc: int) -> Callable[[], int]:
+    "Local stand-in feed always giving the price 'cents_per_btc', used for offline tests"
+    return lambda: cents_per_btc
+
+class ExchangeRateProvider:
+    """Keeps the price of one bitcoin in US cents read from 'feed'.\n
+    The price is read again once it is older than 'ttl' seconds. When the feed fails the
+    last price is kept, a conversion only fails if no price was ever read."""
+    def __init__(self, feed: Callable[[], int] = bit_usd_feed, ttl: float = 60):
+        # Instance Variables
+        self.feed = feed
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.price = None
+        self.read_time = 0
+        # Counters
+        self.feed_reads = 0
+
+    def cents_per_btc(self) -> int:
+        "Returns the cached price of one bitcoin in US cents, reading the feed when it expired"
+        with self.lock:
+            if self.price is None or time.monotonic() - self.read_time >= self.ttl:
+                try:
+                    price = int(self.feed())
+                    if price <= 0:
+                        raise ValueError(f"Invalid bitcoin price of {price} cents")
+                except Exception as err:
+                    if self.price is None:
+                        raise
+                    print(f"[ERROR] Could not refresh the bitcoin price, using the last one: {err}")
+                else:
+                    self.price = price
+                    self.feed_reads += 1
+                # A failed read is retried after the next 'ttl' seconds, not on every call
+                self.read_time = time.monotonic()
+            return self.price
+
+    def cents_to_satoshi(self, cents: int) -> int:
+        "Converts US cents to satoshis, rounded to the nearest satoshi"
+        price = self.cents_per_btc()
+        return (2 * cents * SATOSHIS_PER_BTC + price) // (2 * price)
+
+    def satoshi_to_cents(self, satoshis: int) -> int:
+        "Converts satoshis to US cents, rounded to the nearest cent"
+        price = self.cents_per_btc()
+        return (2 * satoshis * price + SATOSHIS_PER_BTC) // (2 * SATOSHIS_PER_BTC)
+
+def format_cents(cents: int) -> str:
+    "Formats US cents as dollars, i.e. 12345 -> '$123.45'"
+    return f"${cents // 100}.{cents % 100:02d}"
+
+def format_satoshi(satoshis: int) -> str:
+    "Formats satoshis as bitcoins, i.e. 1500 -> '0.00001500 BTC'"
+    return f"{satoshis // SATOSHIS_PER_BTC}.{satoshis % SATOSHIS_PER_BTC:08d} BTC"
@@ -0,0 +1,159 @@
+"""
+This file contains the transaction pipeline of the Bitcoin Bridge system. Nonces are handed
+out locally for every sender account so that many transactions can wait in the mempool at
+once, and their receipts are gathered by a single background thread instead of one blocking
+wait per transaction. Other processes (main.py, the listeners, the Base scripts) send from the
+same Ganache accounts, so a nonce rejected by the node is read again and the transaction resent.
+"""
+import time
+import threading
+from concurrent.futures import Future
+from web3.exceptions import TimeExhausted, TransactionNotFound
+from typing import Dict, Tuple
+
+def is_nonce_error(err: Exception) -> bool:
+    "True when the node rejected a transaction because of its nonce, i.e. 'nonce too low'"
+    return 'nonce' in str(err).lower()
+
+class NonceManager:
+    """Hands out the nonces of every sender account of one chain.\n
+    The next nonce of an account is read from the node on first use and then counted
+    locally. Sends of one account are serialised, sends of different accounts are not.
+    When another process sent from the same account the node rejects the counted nonce,
+    the nonce is then read from the node again and the transaction sent again."""
+    # Times a transaction is sent again with a nonce read from the node
+    NONCE_RETRIES = 5
+
+    def __init__(self, w3):
+        # Instance Variables
+        self.w3 = w3
+        self.lock = threading.Lock()
+        # account -> lock held while sending a transaction of the account
+        self.account_locks: Dict[str, threading.Lock] = {}
+        # account -> next nonce to use, only read or written with the lock of the account held
+        self.nonces: Dict[str, int] = {}
+
+    def send(self, transaction: dict) -> bytes:
+        """Sends 'transaction' with the next nonce of its sender.\n
+        returns: the transaction hash"""
+        account = transaction['from']
+        with self.lock:
+            account_lock = self.account_locks.setdefault(account, threading.Lock())
+        with account_lock:
+            attempt = 0
+            while True:
+                if account not in self.nonces:
+                    self.nonces[account] = self.w3.eth.get_transaction_count(account, 'pending')
+                transaction['nonce'] = self.nonces[account]
+                try:
+                    tx_hash = self.w3.eth.send_transaction(transaction)
+                except Exception as err:
+                    # The node disagrees with the local count, read it again
+                    self.nonces.pop(account, None)
+                    if is_nonce_error(err) and attempt < self.NONCE_RETRIES:
+                        attempt += 1
+                        continue
+                    raise
+                self.nonces[account] += 1
+                return tx_hash
+
+    def reset(self, account: str = None) -> None:
+        "Forgets the local nonce of 'account' or of every account, i.e. after a chain restart"
+        with self.lock:
+            accounts = list(self.account_locks) if account is None else [account]
+            account_locks = [self.account_locks.setdefault(name, threading.Lock()) for name in accounts]
+        # Waits for a send of the account in progress to finish
+        for name, account_lock in zip(accounts, account_locks):
+            with account_lock:
+                self.nonces.pop(name, None)
+
+class TransactionPipeline:
+    """Submits transactions of one chain without waiting for them to be mined.\n
+    'submit' returns a Future resolved with the receipt of the transaction. A collector
+    thread looks up the receipts of every pending transaction once per 'poll_interval'
+    seconds and fails transactions still pending after 'timeout' seconds.\n
+    Gas is estimated against the mined state, which misses the transactions still pending,
+    so while any is pending a transaction gets PENDING_GAS_LIMIT instead of an estimate."""
+    # Gas limit of transactions sent while earlier ones are not mined, below the Ganache block limit
+    PENDING_GAS_LIMIT = 3000000
+
+    def __init__(self, w3, poll_interval: float = 0.1, timeout: float = 120):
+        # Instance Variables
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.nonces = NonceManager(w3)
+        # Chain id given to every transaction, read from the node by web3 when None
+        self.chain_id = None
+        self.lock = threading.Lock()
+        # transaction hash -> (future of the receipt, deadline)
+        self.pending: Dict[bytes, Tuple[Future, float]] = {}
+        self.collector = None
+
+    def submit(self, function, sender: str, gas: int = None) -> Future:
+        """Sends a transaction calling 'function' from 'sender'.\n
+        function: contract function with its arguments i.e. contract.functions.pay_transaction(receipt_number)\n
+        gas: gas limit of the transaction, estimated when None and nothing is pending\n
+        returns: Future of the transaction receipt, failing if the transaction is not sent or reverts"""
+        future = Future()
+        try:
+            transaction = {'from': sender}
+            if self.chain_id is not None:
+                transaction['chainId'] = self.chain_id
+            if gas is None and self.num_pending() > 0:
+                gas = self.PENDING_GAS_LIMIT
+            if gas is not None:
+                transaction['gas'] = gas
+            # Otherwise gas is estimated before taking a nonce, a call that would revert never leaves a gap
+            transaction = function.buildTransaction(transaction)
+            tx_hash = self.nonces.send(transaction)
+        except Exception as err:
+            future.set_exception(err)
+            return future
+        with self.lock:
+            self.pending[tx_hash] = (future, time.monotonic() + self.timeout)
+            if self.collector is None:
+                self.collector = threading.Thread(target = self._collect, name = "receipt-collector", daemon = True)
+                self.collector.start()
+        return future
+
+    def _collect(self) -> None:
+        "Resolves the futures of mined transactions until nothing is pending"
+        while True:
+            with self.lock:
+                pending = list(self.pending.items())
+                if not pending:
+                    self.collector = None
+                    return
+            now = time.monotonic()
+            for tx_hash, (future, deadline) in pending:
+                try:
+                    tx_receipt = self.w3.eth.get_transaction_receipt(tx_hash)
+                except TransactionNotFound:
+                    if now < deadline:
+                        continue
+                    error = TimeExhausted(f"Transaction {tx_hash.hex()} is not in the chain after {self.timeout} seconds")
+                    self._resolve(tx_hash, future, error = error)
+                    continue
+                except Exception as err:
+                    self._resolve(tx_hash, future, error = err)
+                    continue
+                if tx_receipt['status'] != 1:
+                    self._resolve(tx_hash, future, error = ValueError(f"Transaction {tx_hash.hex()} reverted"))
+                else:
+                    self._resolve(tx_hash, future, tx_receipt)
+            time.sleep(self.poll_interval)
+
+    def _resolve(self, tx_hash: bytes, future: Future, tx_receipt = None, error: Exception = None) -> None:
+        "Removes a transaction from the pending ones and resolves its future"
+        with self.lock:
+            self.pending.pop(tx_hash, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(tx_receipt)
+
+    def num_pending(self) -> int:
+        "Returns the number of transactions sent but not mined yet"
+        with self.lock:
+            return len(self.pending)
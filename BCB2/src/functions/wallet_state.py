@@ -0,0 +1,199 @@
+"""
+This file contains the local wallet state of the Bitcoin Bridge system. The unspent outputs
+of our own bit keys and the network fee rate are kept in memory, so a payment is built and
+signed without a network lookup and balances are read without a round trip. Our own
+broadcasts update the state right away, a background thread reconciles it with the network.
+"""
+import time
+import threading
+from bit.network.meta import Unspent
+from bit.transaction import address_to_scriptpubkey, calc_txid, deserialize
+from typing import Dict, List, Tuple
+
+class WalletState:
+    """Tracks the unspent outputs of the bit keys in 'keys' and the fee rate.\n
+    'build' signs a transaction from the cached outputs and marks its inputs as spent and its
+    outputs to our keys as unspent before it is broadcast, 'broadcast' sends it and undoes
+    that update if the network rejects it. Outputs created by our own transactions are kept
+    until the network lists them, so a refresh never brings back an output we already spent."""
+    # Seconds an output of our own broadcast is kept while the network does not list it yet
+    PENDING_TTL = 3600
+
+    def __init__(self, keys: List, backend, refresh_interval: float = 60, fee_ttl: float = 300):
+        """keys: bit keys whose outputs are tracked\n
+        backend: btc_backend.BitcoinBackend giving the outputs and the fee rate and broadcasting"""
+        # Instance Variables
+        self.keys = {key.address: key for key in keys}
+        self.scripts = {address_to_scriptpubkey(address).hex(): address for address in self.keys}
+        self.refresh_interval = refresh_interval
+        self.fee_ttl = fee_ttl
+        self.backend = backend
+        self.lock = threading.Lock()
+        # address -> unspent outputs usable by the next transaction
+        self.unspents: Dict[str, List[Unspent]] = {address: [] for address in self.keys}
+        # (txid, output index) -> (address, output, spending time) of outputs spent by our transactions
+        self.spent: Dict[Tuple[str, int], Tuple[str, Unspent, float]] = {}
+        # (txid, output index) -> (address, output, creation time) of outputs of our transactions
+        self.pending: Dict[Tuple[str, int], Tuple[str, Unspent, float]] = {}
+        self.fee_rate = None
+        self.fee_time = 0
+        self.stopped = threading.Event()
+        self.thread = None
+        # Counters
+        self.refreshes = 0
+        self.fee_reads = 0
+
+    def start(self) -> None:
+        "Reads the outputs of every key now and starts the background refresh"
+        try:
+            self.refresh()
+        except Exception as err:
+            print(f"[ERROR] Could not read the bitcoin wallets, retrying in the background: {err}")
+        if self.thread is None:
+            self.thread = threading.Thread(target = self._refresh_loop, name = "wallet-refresh", daemon = True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        "Stops the background refresh"
+        self.stopped.set()
+
+    def _refresh_loop(self) -> None:
+        "Refreshes the outputs of every key once per interval until stopped"
+        while not self.stopped.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as err:
+                print(f"[ERROR] Could not refresh the bitcoin wallets: {err}")
+
+    def refresh(self) -> None:
+        "Reads the unspent outputs of every key from the network and merges our own updates"
+        for address in self.keys:
+            network_unspents = self.backend.get_unspents(address)
+            listed = {(unspent.txid, unspent.txindex) for unspent in network_unspents}
+            with self.lock:
+                now = time.monotonic()
+                # Forget our updates once the network agrees with them or they are too old
+                for outpoint, (_, _, created) in list(self.pending.items()):
+                    if outpoint in listed or now - created > self.PENDING_TTL:
+                        del self.pending[outpoint]
+                for outpoint, (spent_address, _, spent_time) in list(self.spent.items()):
+                    # An output the network does not list is either spent for good or one of our pending ones
+                    gone = outpoint not in listed and outpoint not in self.pending
+                    if spent_address == address and (gone or now - spent_time > self.PENDING_TTL):
+                        del self.spent[outpoint]
+                unspents = [unspent for unspent in network_unspents if (unspent.txid, unspent.txindex) not in self.spent]
+                unspents += [
+                    unspent for outpoint, (pending_address, unspent, _) in self.pending.items()
+                    if pending_address == address and outpoint not in listed and outpoint not in self.spent
+                ]
+                self.unspents[address] = unspents
+                self.refreshes += 1
+
+    def fee(self) -> int:
+        "Returns the cached fee rate in satoshis per byte, reading it again once it expired"
+        with self.lock:
+            if self.fee_rate is None or time.monotonic() - self.fee_time >= self.fee_ttl:
+                try:
+                    self.fee_rate = int(self.backend.get_fee())
+                    self.fee_reads += 1
+                except Exception as err:
+                    if self.fee_rate is None:
+                        raise
+                    print(f"[ERROR] Could not refresh the bitcoin fee rate, using the last one: {err}")
+                self.fee_time = time.monotonic()
+            return self.fee_rate
+
+    def balance(self, address: str) -> int:
+        "Returns the balance of one of our keys in satoshis without a network lookup"
+        with self.lock:
+            return sum(unspent.amount for unspent in self.unspents[address])
+
+    def build(self, key, outputs: List[Tuple]) -> str:
+        """Builds and signs a transaction of 'key' paying 'outputs' from the cached outputs.\n
+        outputs: (address, amount, currency) like bit's send\n
+        returns: the signed transaction in hex, already applied to the wallet state"""
+        fee = self.fee()
+        with self.lock:
+            tx_hex = key.create_transaction(outputs, fee = fee, unspents = list(self.unspents[key.address]))
+            self._apply(tx_hex, key.address)
+        return tx_hex
+
+    def broadcast(self, tx_hex: str) -> str:
+        """Sends a transaction made by 'build' to the network.\n
+        returns: the transaction id"""
+        try:
+            self.backend.broadcast(tx_hex)
+        except Exception:
+            with self.lock:
+                self._revert(tx_hex)
+            raise
+        return calc_txid(tx_hex)
+
+    def reserve(self, tx_hex: str, sender_address: str) -> bool:
+        """Applies a transaction signed before a restart so its inputs are not spent again.\n
+        returns: False when its inputs are no longer unspent outputs of 'sender_address'"""
+        inputs, _ = self._outpoints(tx_hex)
+        with self.lock:
+            available = {(unspent.txid, unspent.txindex) for unspent in self.unspents[sender_address]}
+            if not all(outpoint in available for outpoint in inputs):
+                return False
+            self._apply(tx_hex, sender_address)
+        return True
+
+    def release(self, tx_hex: str) -> None:
+        "Gives back the inputs of a transaction made by 'build' that will never be broadcast"
+        with self.lock:
+            self._revert(tx_hex)
+
+    def send(self, key, outputs: List[Tuple]) -> str:
+        """Drop-in replacement of bit's key.send(outputs) using the cached outputs and fee rate.\n
+        returns: the transaction id"""
+        return self.broadcast(self.build(key, outputs))
+
+    def _outpoints(self, tx_hex: str) -> Tuple[List[Tuple[str, int]], List[Tuple[int, str, int]]]:
+        """Reads a transaction.\n
+        returns: (outpoints it spends, (output index, address, amount) of its outputs to our keys)"""
+        tx = deserialize(tx_hex)
+        inputs = [(tx_in.txid[::-1].hex(), int.from_bytes(tx_in.txindex, 'little')) for tx_in in tx.TxIn]
+        outputs = []
+        for index, tx_out in enumerate(tx.TxOut):
+            address = self.scripts.get(tx_out.script_pubkey.hex())
+            if address is not None:
+                outputs.append((index, address, int.from_bytes(tx_out.amount, 'little')))
+        return inputs, outputs
+
+    def _apply(self, tx_hex: str, sender_address: str) -> None:
+        "Marks the inputs of a transaction as spent and its outputs to our keys as unspent"
+        txid = calc_txid(tx_hex)
+        inputs, outputs = self._outpoints(tx_hex)
+        now = time.monotonic()
+        spending = set(inputs)
+        unspents = []
+        for unspent in self.unspents[sender_address]:
+            if (unspent.txid, unspent.txindex) in spending:
+                self.spent[(unspent.txid, unspent.txindex)] = (sender_address, unspent, now)
+            else:
+                unspents.append(unspent)
+        self.unspents[sender_address] = unspents
+        for index, address, amount in outputs:
+            unspent = Unspent(amount, 0, address_to_scriptpubkey(address).hex(), txid, index)
+            self.pending[(txid, index)] = (address, unspent, now)
+            self.unspents[address].append(unspent)
+
+    def _revert(self, tx_hex: str) -> None:
+        "Undoes '_apply' for a transaction the network did not accept"
+        txid = calc_txid(tx_hex)
+        inputs, outputs = self._outpoints(tx_hex)
+        for index, address, _ in outputs:
+            self.pending.pop((txid, index), None)
+            self.unspents[address] = [unspent for unspent in self.unspents[address] if unspent.txid != txid]
+        for outpoint in inputs:
+            if outpoint in self.spent:
+                address, unspent, _ = self.spent.pop(outpoint)
+                self.unspents[address].append(unspent)
+
+    def print_stats(self) -> None:
+        "Prints how often the wallets and the fee rate were read from the network"
+        with self.lock:
+            print(f"""\nWallet State [refresh every {self.refresh_interval}s, fee kept {self.fee_ttl}s]:
+                  \r\tRefreshes: {self.refreshes}\tFee Reads: {self.fee_reads}\tPending Outputs: {len(self.pending)}""")
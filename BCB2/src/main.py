@@ -1,3 +1,6 @@
+import sys
+import shlex
+from concurrent.futures import Future
 from functions.bcb_functions import BitcoinBridgeGanache
 
 bcb = BitcoinBridgeGanache()
@@ -12,6 +15,8 @@ fabric_dict = {
     2: 'Polyester'
 }
 receipts = set()
+# Arguments left of the scripted command being run, None when running interactively
+script_args = None
 clothes_tuple = (
     (1,1),
     (1,2),
@@ -21,7 +26,7 @@ clothes_tuple = (
     (3,2)
 )
 
-def main():
+def print_menu():
     print("""\n------------------------------------------------
     \rWelcome to the Bitcoin Bridge System Demo!
     \rPlease select from one of the following options:
@@ -38,64 +43,86 @@ def main():
     \r\t11. Get Seller and Buyer Bitcoin Balances
     \r------------------------------------------------\n
     """)
-    
-    choice = int(input("Please select an option from the above choices [1-11] or press 0 to exit: "))
-    
-    if choice == 0:
-        print("\nExiting from Bitcoin Bridge System!")
-        exit()
-    elif choice == 1:
-        print()
-        deploy_system()
-    elif choice == 2:
-        print()
-        connect_system()
-    elif choice == 3:
-        print()
-        instructions()
-    elif choice == 4:
-        print()
-        product_info()
-    elif choice == 5:
-        print()
-        buy_items()
-    elif choice == 6:
-        print()
-        change_item()
-    elif choice == 7:
-        print()
-        add_more_item()
-    elif choice == 8:
-        print()
-        seller_confirm()
-    elif choice == 9:
-        print()
-        buyer_confirm()
-    elif choice == 10:
-        print()
-        pay_for_item()
-    elif choice == 11:
+
+def main():
+    "Shows the menu and runs the selected options until the user exits"
+    while True:
+        print_menu()
+        try:
+            choice = int(input("Please select an option from the above choices [1-11] or press 0 to exit: "))
+        except ValueError:
+            choice = None
+        except EOFError:
+            # Input closed, i.e. Ctrl-D or the end of a piped file
+            choice = 0
+        if choice == 0:
+            print("\nExiting from Bitcoin Bridge System!")
+            return
+        if choice not in MENU:
+            print(f"[ERROR] Invalid option, please enter a number between 0 and {len(MENU)}.")
+            continue
         print()
-        bitcoin_wallet_info()
-    else:
-        main()
+        run_command(MENU[choice])
+
+def run_command(name):
+    """Runs the command 'name', printing its error instead of leaving the session.\n
+    returns: True if the command succeeded"""
+    try:
+        result = COMMANDS[name]()
+    except Exception as err:
+        print(f"[ERROR] {name} failed: {err}")
+        return False
+    # Commands sending a transaction return its Future, the bridge prints why it failed
+    if isinstance(result, Future) and result.exception() is not None:
+        return False
+    return True
+
+def run_script(file_obj):
+    """Runs one named command per line with its answers as arguments, i.e. 'pay_for_items 123456'.\n
+    Empty lines and comments starting with '#' are skipped, 'exit' stops the script.\n
+    returns: the number of failed commands"""
+    global script_args
+    failed = 0
+    for line_num, line in enumerate(file_obj, 1):
+        words = shlex.split(line, comments = True)
+        if not words:
+            continue
+        if words[0] == 'exit':
+            break
+        if words[0] not in COMMANDS:
+            print(f"[ERROR] Line {line_num}: unknown command '{words[0]}', expected one of {', '.join(COMMANDS)}")
+            failed += 1
+            continue
+        script_args = words[1:]
+        if not run_command(words[0]):
+            failed += 1
+        elif script_args:
+            print(f"[ERROR] Line {line_num}: unused arguments {' '.join(script_args)}")
+            failed += 1
+    script_args = None
+    return failed
+
+def ask(prompt):
+    "Reads the answer to a prompt from the user, or from the arguments of the scripted command"
+    if script_args is None:
+        return input(prompt)
+    if not script_args:
+        raise ValueError(f"missing argument for '{prompt.strip()}'")
+    return script_args.pop(0)
 
 def apparel_choice():
-    apparel = int(input("Please enther the Apparel type of the product [1-3]: "))
-    fabric = int(input("Please enter the Fabric of the product[1-2]: "))
+    apparel = int(ask("Please enther the Apparel type of the product [1-3]: "))
+    fabric = int(ask("Please enter the Fabric of the product[1-2]: "))
     return apparel, fabric
 
 def deploy_system():
     bcb.deploy_contracts()
-    main()
     
 def connect_system():
     bcb.connect()
-    main()
     
 def instructions():
     bcb.print_instructions()
-    main()
     
 def product_info():
     apparel, fabric = apparel_choice()
@@ -107,56 +134,87 @@ def product_info():
           \r\tWeight:\t\t{pinfo[3]} grams
           \r\tPrice:\t\t${pinfo[4]/100}
           \r\tNum Left:\t{pinfo[5]}""")
-    main()
     
 def buy_items():
     products = []
     for apparel, fabric in clothes_tuple:
-        products.append(int(input(f"Please enter the amount of {fabric_dict[fabric]} {apparel_dict[apparel]}s you want to purchase: ")))
+        products.append(int(ask(f"Please enter the amount of {fabric_dict[fabric]} {apparel_dict[apparel]}s you want to purchase: ")))
     
     print("Sending request to supply chain!")
-    bcb.buy_items(products)
+    future = bcb.buy_items(products)
     print("Request sent!")
-    main()
+    return future
     
 def change_item():
     apparel, fabric = apparel_choice()
-    price = int(input("Please enter the new price of the item in cents: "))
-    weight = int(input("Please enter the new weight of the item in grams: "))
+    price = int(ask("Please enter the new price of the item in cents: "))
+    weight = int(ask("Please enter the new weight of the item in grams: "))
     print(f"Changing {fabric_dict[fabric]} {apparel_dict[apparel]} info")
-    bcb.change_item_info(apparel, fabric, price, weight)
-    main()
+    return bcb.change_item_info(apparel, fabric, price, weight)
 
 def add_more_item():
     apparel, fabric = apparel_choice()
-    num = int(input("Please enter the number of items you want to add: "))
+    num = int(ask("Please enter the number of items you want to add: "))
     print(f"Adding {num} items to {fabric_dict[fabric]} {apparel_dict[apparel]}")
-    bcb.add_product(apparel, fabric, num)
-    main()
+    return bcb.add_product(apparel, fabric, num)
 
 def seller_confirm():
-    receipt_num = int(input("Please enter the receipt number you received for your basket: "))
+    receipt_num = int(ask("Please enter the receipt number you received for your basket: "))
     print("Sending Confirmation from Seller")
-    bcb.seller_confirmation(receipt_num, bcb.bridge_w3.eth.accounts[1])
-    main()
+    return bcb.seller_confirmation(receipt_num, bcb.bridge_accounts[1])
 
 def buyer_confirm():
-    receipt_num = int(input("Please enter the receipt number you received for your basket: "))
+    receipt_num = int(ask("Please enter the receipt number you received for your basket: "))
     print("Sending Confirmation from Buyer")
-    bcb.buyer_confirmation(receipt_num, bcb.bridge_w3.eth.accounts[2])
+    future = bcb.buyer_confirmation(receipt_num, bcb.bridge_accounts[2])
     print("Bitcoins have been reserved!")
-    main()
+    return future
     
 def pay_for_item():
-    receipt_num = int(input("Please enter the receipt number you received for your basket: "))
+    receipt_num = int(ask("Please enter the receipt number you received for your basket: "))
     print("Sending payment request")
-    bcb.pay_basket(receipt_num)
-    main()
+    return bcb.pay_basket(receipt_num)
     
 def bitcoin_wallet_info():
-    curr = input("Do you want to check balance in 'usd' or 'btc'? ")
+    curr = ask("Do you want to check balance in 'usd' or 'btc'? ")
     bcb.get_balance_btc(curr)
-    main()
-    
+
+# Command name -> function, the names are used in scripts
+COMMANDS = {
+    'deploy': deploy_system,
+    'connect': connect_system,
+    'instructions': instructions,
+    'product_info': product_info,
+    'buy_items': buy_items,
+    'change_item': change_item,
+    'add_items': add_more_item,
+    'seller_confirm': seller_confirm,
+    'buyer_confirm': buyer_confirm,
+    'pay_for_items': pay_for_item,
+    'btc_balances': bitcoin_wallet_info
+}
+# Menu option -> command name
+MENU = {
+    1: 'deploy',
+    2: 'connect',
+    3: 'instructions',
+    4: 'product_info',
+    5: 'buy_items',
+    6: 'change_item',
+    7: 'add_items',
+    8: 'seller_confirm',
+    9: 'buyer_confirm',
+    10: 'pay_for_items',
+    11: 'btc_balances'
+}
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if len(sys.argv) > 1:
+        # Non-interactive mode: commands are read from a file, or from stdin with '-'
+        if sys.argv[1] == '-':
+            failed = run_script(sys.stdin)
+        else:
+            with open(sys.argv[1], 'r') as file_obj:
+                failed = run_script(file_obj)
+        sys.exit(1 if failed else 0)
+    main()
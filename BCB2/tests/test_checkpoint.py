@@ -0,0 +1,35 @@
+import os
+from functions.checkpoint import BlockCheckpoint
+
+ADDRESSES = ['0xSupplyChain', '0xSupplyChainMulticall']
+
+def test_missing_file_has_no_checkpoint(tmp_path):
+    checkpoint = BlockCheckpoint(str(tmp_path / 'listener.checkpoint'))
+    assert checkpoint.get('Supply Chain', ADDRESSES) is None
+
+def test_saved_block_is_read_back(tmp_path):
+    path = str(tmp_path / 'listener.checkpoint')
+    checkpoint = BlockCheckpoint(path)
+    checkpoint.save('Supply Chain', ADDRESSES, 12)
+    checkpoint.save('Transaction Bridge', ['0xBridge'], 40)
+    checkpoint.save('Supply Chain', ADDRESSES, 15)
+    assert checkpoint.get('Supply Chain', ADDRESSES) == 15
+    # A new listener run reads the file
+    reloaded = BlockCheckpoint(path)
+    assert reloaded.get('Supply Chain', ADDRESSES) == 15
+    assert reloaded.get('Transaction Bridge', ['0xBridge']) == 40
+
+def test_addresses_are_compared_in_any_order(tmp_path):
+    checkpoint = BlockCheckpoint(str(tmp_path / 'listener.checkpoint'))
+    checkpoint.save('Supply Chain', ADDRESSES, 7)
+    assert checkpoint.get('Supply Chain', list(reversed(ADDRESSES))) == 7
+
+def test_checkpoint_of_another_deployment_is_ignored(tmp_path):
+    checkpoint = BlockCheckpoint(str(tmp_path / 'listener.checkpoint'))
+    checkpoint.save('Supply Chain', ADDRESSES, 7)
+    assert checkpoint.get('Supply Chain', ['0xRedeployed', '0xSupplyChainMulticall']) is None
+
+def test_save_leaves_no_temporary_file(tmp_path):
+    path = str(tmp_path / 'listener.checkpoint')
+    BlockCheckpoint(path).save('Supply Chain', ADDRESSES, 3)
+    assert os.listdir(tmp_path) == ['listener.checkpoint']
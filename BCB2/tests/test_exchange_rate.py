@@ -0,0 +1,57 @@
+import pytest
+from functions.exchange_rate import ExchangeRateProvider, fixed_feed, format_cents, format_satoshi
+
+class CountingFeed:
+    "Feed giving the prices of 'prices' in turn, an exception in the list is raised"
+    def __init__(self, *prices):
+        self.prices = list(prices)
+        self.reads = 0
+
+    def __call__(self):
+        self.reads += 1
+        price = self.prices.pop(0)
+        if isinstance(price, Exception):
+            raise price
+        return price
+
+def test_conversions_round_to_the_nearest_unit():
+    # $50,000.00 per bitcoin, one cent is 20 satoshis
+    rates = ExchangeRateProvider(fixed_feed(5000000))
+    assert rates.cents_to_satoshi(1) == 20
+    assert rates.cents_to_satoshi(12345) == 246900
+    assert rates.satoshi_to_cents(20) == 1
+    assert rates.satoshi_to_cents(29) == 1
+    assert rates.satoshi_to_cents(30) == 2
+
+def test_price_is_read_once_per_ttl():
+    feed = CountingFeed(5000000, 6000000)
+    rates = ExchangeRateProvider(feed, ttl = 60)
+    assert rates.cents_per_btc() == 5000000
+    assert rates.cents_per_btc() == 5000000
+    assert feed.reads == 1
+    rates.ttl = 0
+    assert rates.cents_per_btc() == 6000000
+    assert rates.feed_reads == 2
+
+def test_failed_read_keeps_the_last_price():
+    feed = CountingFeed(5000000, ConnectionError("rate api down"))
+    rates = ExchangeRateProvider(feed, ttl = 0)
+    assert rates.cents_per_btc() == 5000000
+    assert rates.cents_per_btc() == 5000000
+    assert rates.feed_reads == 1
+
+def test_failed_first_read_raises():
+    rates = ExchangeRateProvider(CountingFeed(ConnectionError("rate api down")))
+    with pytest.raises(ConnectionError):
+        rates.cents_to_satoshi(100)
+
+def test_invalid_price_is_rejected():
+    rates = ExchangeRateProvider(fixed_feed(0))
+    with pytest.raises(ValueError):
+        rates.cents_per_btc()
+
+def test_formatting():
+    assert format_cents(12345) == "$123.45"
+    assert format_cents(5) == "$0.05"
+    assert format_satoshi(1500) == "0.00001500 BTC"
+    assert format_satoshi(150000000) == "1.50000000 BTC"
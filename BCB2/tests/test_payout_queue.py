@@ -0,0 +1,79 @@
+import time
+import pytest
+from functions.payout_queue import PayoutQueue, PAYMENT, REFUND
+
+@pytest.fixture
+def queue(tmp_path, wallet):
+    "Payout queue whose payouts are only sent when the test calls send_due"
+    queue = PayoutQueue(str(tmp_path / 'payouts.db'), wallet, window = 60, max_outputs = 3)
+    yield queue
+    queue.stop()
+
+def test_payout_is_recorded_once(queue, wallet):
+    assert queue.enqueue(1, PAYMENT, wallet.buyer, wallet.seller.address, 1000)
+    assert not queue.enqueue(1, PAYMENT, wallet.buyer, wallet.seller.address, 1000)
+    # The refund of the same receipt is another payout
+    assert queue.enqueue(1, REFUND, wallet.seller, wallet.buyer.address, 1000)
+    assert queue.duplicates == 1
+    assert queue.counts()['queued'] == 2
+
+def test_payouts_of_one_key_share_a_transaction(queue, wallet, backend):
+    for receipt_number in range(5):
+        queue.enqueue(receipt_number, PAYMENT, wallet.buyer, wallet.seller.address, 1000 + receipt_number)
+    queue.send_due()
+    assert queue.counts()['sent'] == 5
+    # Five payouts with at most three outputs per transaction
+    assert backend.broadcasts == 2
+    first = [queue.status(receipt_number) for receipt_number in range(3)]
+    assert len({txid for _, txid, _ in first}) == 1
+    assert [index for _, _, index in first] == [0, 1, 2]
+    assert wallet.balance(wallet.seller.address) == backend.initial_balance + sum(1000 + n for n in range(5))
+
+def test_failed_broadcast_resends_the_stored_transaction(queue, wallet, backend):
+    queue.enqueue(7, PAYMENT, wallet.buyer, wallet.seller.address, 2500)
+    broadcast = backend.broadcast
+    def offline(tx_hex):
+        raise ConnectionError("node unreachable")
+    backend.broadcast = offline
+    queue.send_due()
+    status, txid, _ = queue.status(7)
+    assert status == 'signed'
+    # Due again without waiting for the backoff
+    queue.db.execute("UPDATE payouts SET next_attempt = 0")
+    backend.broadcast = broadcast
+    queue.send_due()
+    assert queue.status(7) == ('sent', txid, 0)
+    assert queue.retries == 1
+    assert queue.transactions == 1
+
+def test_payout_fails_after_max_attempts(queue, wallet, backend):
+    queue.MAX_ATTEMPTS = 2
+    queue.enqueue(8, PAYMENT, wallet.buyer, wallet.seller.address, 2500)
+    def offline(tx_hex):
+        raise ConnectionError("node unreachable")
+    backend.broadcast = offline
+    backend.is_known = lambda txid: False
+    queue.send_due()
+    queue.db.execute("UPDATE payouts SET next_attempt = 0")
+    queue.send_due()
+    assert queue.status(8)[0] == 'failed'
+    # The inputs of the given up transaction can be spent again
+    assert wallet.balance(wallet.buyer.address) == backend.initial_balance
+
+def test_signed_payout_survives_a_restart(tmp_path, wallet, backend):
+    path = str(tmp_path / 'payouts.db')
+    queue = PayoutQueue(path, wallet, window = 60)
+    queue.enqueue(9, PAYMENT, wallet.buyer, wallet.seller.address, 4000)
+    # Crash between storing the signed transaction and broadcasting it
+    queue._broadcast = lambda txid, raw_tx, attempts: None
+    queue.send_due()
+    _, txid, _ = queue.status(9)
+    queue.db.close()
+    restarted = PayoutQueue(path, wallet, window = 0.05)
+    restarted.start()
+    deadline = time.monotonic() + 5
+    while restarted.status(9)[0] != 'sent' and time.monotonic() < deadline:
+        time.sleep(0.05)
+    restarted.stop()
+    assert restarted.status(9) == ('sent', txid, 0)
+    assert backend.broadcasts == 1
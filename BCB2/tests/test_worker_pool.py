@@ -0,0 +1,52 @@
+import threading
+from functions.worker_pool import BoundedExecutor
+
+def test_handler_result_is_returned():
+    executor = BoundedExecutor(max_workers = 2, max_queue = 2)
+    future = executor.try_submit(lambda a, b: a + b, 2, 3)
+    assert future.result(timeout = 5) == 5
+    executor.shutdown()
+    assert executor.stats()['completed'] == 1
+
+def test_full_queue_rejects_work():
+    executor = BoundedExecutor(max_workers = 1, max_queue = 1)
+    release = threading.Event()
+    running = executor.try_submit(release.wait)
+    waiting = executor.try_submit(release.wait)
+    assert executor.try_submit(release.wait) is None
+    assert executor.stats()['rejected'] == 1
+    release.set()
+    running.result(timeout = 5)
+    waiting.result(timeout = 5)
+    # A finished handler frees its slot
+    assert executor.try_submit(lambda: 'again').result(timeout = 5) == 'again'
+    executor.shutdown()
+
+def test_failed_handler_is_counted_and_frees_its_slot():
+    executor = BoundedExecutor(max_workers = 1, max_queue = 0)
+    def broken():
+        raise ValueError("bad event")
+    assert executor.try_submit(broken).result(timeout = 5) is None
+    assert executor.try_submit(lambda: 1).result(timeout = 5) == 1
+    executor.shutdown()
+    stats = executor.stats()
+    assert stats['failed'] == 1
+    assert stats['completed'] == 2
+    assert stats['queue_depth'] == 0 and stats['running'] == 0
+
+def test_queue_depth_counts_waiting_handlers():
+    executor = BoundedExecutor(max_workers = 1, max_queue = 3)
+    started = threading.Event()
+    release = threading.Event()
+    def block():
+        started.set()
+        release.wait()
+    futures = [executor.try_submit(block)]
+    started.wait(5)
+    futures += [executor.try_submit(release.wait) for _ in range(2)]
+    assert executor.queue_depth() == 2
+    release.set()
+    for future in futures:
+        future.result(timeout = 5)
+    executor.shutdown()
+    assert executor.queue_depth() == 0
@@ -33,9 +33,12 @@ contract ClothingSupplyChain{
         uint256 num_clothes;
         uint256 price_per;          // price in cents per clothing made
         uint256 cost_per;           // cost in cents per clothing made
+        uint256 item_start;         // id of the first item, the batch holds items item_start to item_start + num_clothes - 1
     }
 
     // Struct to represent an individual item
+    // Only sold or returned items are stored, every other item of a completed
+    // batch is created implicitly by the item range of its batch
     struct Item {
         ItemState state;
         uint256 batch_no;
@@ -74,17 +77,17 @@ contract ClothingSupplyChain{
     }
 
     modifier item_created (uint256 item_id){
-        require (items[item_id].state == ItemState.Created);
+        require (item_state(item_id) == ItemState.Created);
         _;
     }
 
     modifier item_shipped (uint256 item_id){
-        require (batches[items[item_id].batch_no].state == BatchState.Shipped);
+        require (batches[item_batch(item_id)].state == BatchState.Shipped);
         _;
     }
 
     modifier item_sold (uint256 item_id){
-        require (items[item_id].state == ItemState.Sold);
+        require (item_state(item_id) == ItemState.Sold);
         _;
     }
 
@@ -99,6 +102,7 @@ contract ClothingSupplyChain{
     mapping (uint256 => MaterialDelivery) deliveries;
     mapping (uint256 => ManufactureBatch) batches;
     mapping (uint256 => Item) items;
+    uint256 [] private item_batches;        // ids of the completed batches with items, in the order of their item ranges
     
     // FUNCTIONS
     constructor ()
@@ -303,6 +307,8 @@ contract ClothingSupplyChain{
     }
 
     // Function to create the number of items made in a batch
+    // The items are not written one by one, the batch keeps the range of its
+    // item ids so completing a batch costs the same gas for any batch size
     function create_item(
         /**Batch ID**/
         uint256 batch_id
@@ -312,12 +318,10 @@ contract ClothingSupplyChain{
     {
         uint256 item_start = num_items;
         num_items += batches[batch_id].num_clothes;
+        batches[batch_id].item_start = item_start;
 
-        // Create new items and set state to 'Created'
-        for (uint256 i = item_start; i < num_items; i++){
-            items[i].state = ItemState.Created;
-            items[i].batch_no = batch_id;
-        }
+        // Batches without items have no range to look up
+        if (batches[batch_id].num_clothes > 0) item_batches.push(batch_id);
 
         emit NewItemsCreated(
             item_start,
@@ -327,6 +331,45 @@ contract ClothingSupplyChain{
         );
     }
 
+    // A helper function to find the state of an item
+    // Items that were never sold or returned are 'Created' once their batch is complete
+    function item_state(
+        uint256 item_id
+    )
+        internal
+        view
+        returns (ItemState)
+    {
+        if (items[item_id].state != ItemState.NotCreated) return items[item_id].state;
+        if (item_id < num_items) return ItemState.Created;
+        return ItemState.NotCreated;
+    }
+
+    // A helper function to find the batch of an item
+    // Item ranges grow with every completed batch, so the batch is found with a
+    // binary search over the first item ids of the completed batches: an unsold item
+    // costs 2 storage reads per halving, about 2 * log2(completed batches) in total
+    function item_batch(
+        uint256 item_id
+    )
+        internal
+        view
+        returns (uint256)
+    {
+        if (items[item_id].state != ItemState.NotCreated) return items[item_id].batch_no;
+        require (item_id < num_items, "Item does not exist");
+
+        uint256 low = 0;
+        uint256 high = item_batches.length;
+        // Last batch whose first item is not after item_id
+        while (high - low > 1){
+            uint256 mid = (low + high) / 2;
+            if (batches[item_batches[mid]].item_start <= item_id) low = mid;
+            else high = mid;
+        }
+        return item_batches[low];
+    }
+
     // A function to ship the batch of items
     function ship_batch(
         /**Batch ID**/
@@ -355,6 +398,8 @@ contract ClothingSupplyChain{
         item_shipped(item_id)
         returns (bool)
     {
+        // The item gets its own storage the first time it is sold
+        items[item_id].batch_no = item_batch(item_id);
         items[item_id].state = ItemState.Sold;
         items[item_id].receipt_number = receipt_number;
         items[item_id].retail_price = price;
@@ -427,4 +472,17 @@ contract ClothingSupplyChain{
     {
         return items[item_id].retail_price;
     }
+
+    function get_item(
+        uint256 item_id
+    )
+        public
+        view
+        returns (ItemState, uint256)
+    {
+        ItemState state = item_state(item_id);
+        // Unknown items have no batch
+        if (state == ItemState.NotCreated) return (ItemState.NotCreated, 0);
+        return (state, item_batch(item_id));
+    }
 }
\ No newline at end of file
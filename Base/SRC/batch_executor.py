@@ -0,0 +1,131 @@
+"""
+This file contains the batch executor of the Base system. It reads a csv or jsonl file of
+operations, validates every row and sends the valid ones as pipelined transactions, so a
+day of warehouse activity is loaded without answering one prompt per operation.
+
+csv: a header with an 'op' column and one column per argument, empty cells are left out
+    op,material,supplier,weight,cost,batch_id
+    create_delivery_order,0,Acme,5000,2000,
+    ship_batch,,,,,1
+jsonl: one {"op": ..., "args": {...}} object per line
+
+Rows of the same chain are sent in file order from one account with consecutive nonces, so
+they are mined in that order without waiting for each other. Gas cannot be estimated for a
+row depending on rows not mined yet, so every row gets the fixed limit BATCH_GAS_LIMIT and a
+row that reverts is reported from its receipt. Rows depending on writes of the event
+listener (i.e. paying a receipt filled by sell_item) should go in a later file.
+"""
+import os
+import sys
+import csv
+import json
+import time
+from operations import Operations, receipt_result
+from tx_pipeline import TransactionPipeline
+from typing import List, Tuple
+
+def read_rows(path: str) -> List[Tuple[int, str, dict]]:
+    """Reads the operations of a csv or jsonl file.\n
+    returns: (line number, operation, arguments) of every row"""
+    rows = []
+    with open(path, 'r', newline = '') as file_obj:
+        if path.endswith('.jsonl'):
+            for line_num, line in enumerate(file_obj, 1):
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    rows.append((line_num, request.get('op'), request.get('args', {})))
+                except ValueError as err:
+                    rows.append((line_num, None, {'error': f"Invalid json: {err}"}))
+        else:
+            # Line 1 is the header
+            for line_num, row in enumerate(csv.DictReader(file_obj), 2):
+                operation = row.pop('op', None)
+                args = {name: Operations.parse_argument(name, value) for name, value in row.items() if name is not None and value not in (None, '')}
+                rows.append((line_num, operation, args))
+    return rows
+
+class BatchExecutor:
+    """Validates and sends the rows of an operations file.\n
+    Every valid row is submitted without waiting for the previous ones, one transaction
+    pipeline per chain hands out the nonces and collects the receipts. The listener and the
+    command daemon send from the same accounts, a nonce they used is read again from the
+    node and the row sent again."""
+    # Gas limit of every row, estimates would miss the state left by the rows before it
+    BATCH_GAS_LIMIT = TransactionPipeline.PENDING_GAS_LIMIT
+
+    def __init__(self, operations: Operations):
+        # Instance Variables
+        self.operations = operations
+        self.pipelines = {
+            operations.w3: TransactionPipeline(operations.w3),
+            operations.w32: TransactionPipeline(operations.w32)
+        }
+
+    def execute(self, rows: List[Tuple[int, str, dict]]) -> List[dict]:
+        """Validates every row, then sends the valid ones.\n
+        returns: the result of every row in file order"""
+        results = []
+        submitted = []
+        for line_num, operation, args in rows:
+            result = {'line': line_num, 'op': operation}
+            results.append(result)
+            try:
+                if operation is None:
+                    raise ValueError(args.get('error', "Missing 'op'"))
+                w3, function, sender, extra = self.operations.prepare(operation, args)
+            except Exception as err:
+                result.update(ok = False, error = f"Invalid row: {err}")
+                continue
+            result.update(extra)
+            if operation in Operations.READ_OPERATIONS:
+                submitted.append((result, None, function))
+            else:
+                submitted.append((result, self.pipelines[w3].submit(function, sender, self.BATCH_GAS_LIMIT), None))
+        # Wait for the receipts only once every transaction is on its way
+        for result, future, function in submitted:
+            try:
+                if future is None:
+                    result.update(ok = True, result = function.call())
+                else:
+                    result.update(receipt_result(future.result()), ok = True)
+            except Exception as err:
+                result.update(ok = False, error = f"{type(err).__name__}: {err}")
+        return results
+
+def print_report(results: List[dict], elapsed: float) -> None:
+    "Prints the result of every row and a summary"
+    for result in results:
+        if result['ok']:
+            details = ', '.join(f"{name}: {value}" for name, value in result.items() if name not in ('line', 'op', 'ok'))
+            print(f"[SUCCESS] Line {result['line']} {result['op']} - {details}")
+        else:
+            print(f"[ERROR] Line {result['line']} {result['op']} - {result['error']}")
+    succeeded = sum(1 for result in results if result['ok'])
+    print(f"""\nBatch Executor:
+          \r\tRows: {len(results)}\tSucceeded: {succeeded}\tFailed: {len(results) - succeeded}""")
+    print(f"[TIMING] Batch: {elapsed:.2f}s")
+
+# Main Function
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 SRC/batch_executor.py <operations.csv|operations.jsonl> [report.jsonl]")
+        sys.exit(1)
+    if not os.path.exists(sys.argv[1]):
+        print(f"[ERROR] File {sys.argv[1]} does not exist!")
+        sys.exit(1)
+    rows = read_rows(sys.argv[1])
+    print("\n[CONNECTING] Connecting to the Supply Chain and Transaction Bridge Contracts...")
+    executor = BatchExecutor(Operations())
+    start = time.perf_counter()
+    results = executor.execute(rows)
+    print_report(results, time.perf_counter() - start)
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], 'w') as file_obj:
+            for result in results:
+                file_obj.write(json.dumps(result) + '\n')
+        print(f"\n[SUCCESS] Report written to {sys.argv[2]}")
+
+if __name__ == '__main__':
+    main()
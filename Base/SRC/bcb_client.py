@@ -0,0 +1,44 @@
+"""
+This file contains the thin client of the command daemon. It sends one operation with its
+arguments and prints the response, i.e.
+
+    python3 SRC/bcb_client.py sell_item item_id=3 receipt_number=-1 price=1500
+    python3 SRC/bcb_client.py operations
+"""
+import sys
+import json
+import socket
+from operations import Operations
+
+# Local address of the command daemon, only reachable from this machine
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 7600
+
+def send_command(operation: str, args: dict) -> dict:
+    "Sends one request to the command daemon and waits for its response"
+    with socket.create_connection((DAEMON_HOST, DAEMON_PORT)) as sock:
+        sock.sendall((json.dumps({'op': operation, 'args': args}) + '\n').encode())
+        with sock.makefile('rb') as file_obj:
+            return json.loads(file_obj.readline())
+
+# Main Function
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 SRC/bcb_client.py <operation> [argument=value ...]")
+        sys.exit(1)
+    args = {}
+    for argument in sys.argv[2:]:
+        name, _, value = argument.partition('=')
+        args[name] = Operations.parse_argument(name, value)
+    try:
+        response = send_command(sys.argv[1], args)
+    except ConnectionRefusedError:
+        print("[ERROR] Command daemon is not running, start it with 'python3 SRC/command_daemon.py'")
+        sys.exit(1)
+    if not response['ok']:
+        print(f"[ERROR] {response['error']}")
+        sys.exit(1)
+    print(f"[SUCCESS] {json.dumps(response['result'])}")
+
+if __name__ == '__main__':
+    main()
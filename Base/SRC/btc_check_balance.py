@@ -1,16 +1,22 @@
-from bit import PrivateKeyTestnet
+from btc_backend import BitTestnetBackend
+from exchange_rate import ExchangeRateProvider, format_cents, format_satoshi
 import os
 
+# Bitcoin network used, i.e. btc_backend.RegtestBackend for a local bitcoind node
+btc_backend = BitTestnetBackend()
+
 with open(os.path.join(os.getcwd(), "Wallet/wallet.info"), 'r') as file_obj:
     accs = file_obj.readlines()
 accs[0] = accs[0][:-1]
 
 keys = []
 for acc in accs:
-    keys.append(PrivateKeyTestnet(acc))
+    keys.append(btc_backend.load_key(acc))
 
+exchange_rate = ExchangeRateProvider()
 curr = input("Bitcoin ('btc') or USD ('usd'): ")
 for key in keys:
+    satoshis = sum(unspent.amount for unspent in btc_backend.get_unspents(key.address))
     print(key.address)
-    print(key.get_balance(curr))
-    print()
\ No newline at end of file
+    print(format_cents(exchange_rate.satoshi_to_cents(satoshis)) if curr == 'usd' else format_satoshi(satoshis))
+    print()
@@ -1,13 +1,22 @@
-from bit import PrivateKeyTestnet
+from btc_backend import BitTestnetBackend
+from bit.transaction import calc_txid
 import os
 
+# Bitcoin network used, i.e. btc_backend.RegtestBackend for a local bitcoind node
+btc_backend = BitTestnetBackend()
+
 with open(os.path.join(os.getcwd(), "Wallet/wallet.info"), 'r') as file_obj:
     accs = file_obj.readlines()
 accs[0] = accs[0][:-1]
 
 keys = []
 for acc in accs:
-    keys.append(PrivateKeyTestnet(acc))
+    keys.append(btc_backend.load_key(acc))
 
-tx_hash = keys[0].send([(keys[1].address, 1, 'usd')])
-print(tx_hash)
\ No newline at end of file
+tx_hex = keys[0].create_transaction(
+    [(keys[1].address, 1, 'usd')],
+    fee = btc_backend.get_fee(),
+    unspents = btc_backend.get_unspents(keys[0].address)
+)
+btc_backend.broadcast(tx_hex)
+print(calc_txid(tx_hex))
@@ -1,8 +1,11 @@
-from bit import PrivateKeyTestnet
+from btc_backend import BitTestnetBackend
 import os
 
-my_key1 = PrivateKeyTestnet()
-my_key2 = PrivateKeyTestnet()
+# Bitcoin network used, i.e. btc_backend.RegtestBackend for a local bitcoind node
+btc_backend = BitTestnetBackend()
+
+my_key1 = btc_backend.new_key()
+my_key2 = btc_backend.new_key()
 
 print(my_key1.version)
 print(my_key1.to_wif())
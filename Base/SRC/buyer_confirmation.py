@@ -1,6 +1,6 @@
 # IMPORT STATEMENTS
 from web3 import Web3
-import json
+from deployment_manifest import load_contract
 
 # ---------------------CONNECT TO SUPPLY CHAIN CONTRACT ON GANACHE---------------------
 # web3.py instance - Connectiong to Ganache App
@@ -11,11 +11,7 @@ if w3.isConnected():
     print("\n[SUCCESS] Connected to the Ganache Blockchain Environment!")
     
 # Getting smart conract information
-with open('Contracts/TransactionBridge.info', 'r') as file_object:
-    contract_info = file_object.readlines()
-
-bridge_address = contract_info[0][:-1]
-abi = json.loads(contract_info[1])
+bridge_address, abi = load_contract('Contracts', 'TransactionBridge')
 
 # Start deploying smart contract
 print("\n[CONNECTING] Connecting to Supply Chain Contract...")
@@ -0,0 +1,57 @@
+"""
+This file contains the command daemon of the Base system. It keeps one warm connection to
+both chains and serves the operations of the one-shot scripts over a local socket, one json
+request per line, so every command skips the web3 start up and contract loading.
+
+Request: {"op": "sell_item", "args": {"item_id": 3, "receipt_number": -1, "price": 1500}}
+Response: {"ok": true, "result": {...}} or {"ok": false, "error": "..."}
+"""
+import json
+import socketserver
+from operations import Operations
+from bcb_client import DAEMON_HOST, DAEMON_PORT
+
+def handle_request(operations: Operations, line: bytes) -> dict:
+    "Runs the operation of one request line and returns its response"
+    try:
+        request = json.loads(line)
+        if request.get('op') == 'operations':
+            return {'ok': True, 'result': {name: list(args) for name, args in Operations.OPERATIONS.items()}}
+        return {'ok': True, 'result': operations.run(request.get('op'), request.get('args', {}))}
+    except Exception as err:
+        return {'ok': False, 'error': f"{type(err).__name__}: {err}"}
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    "Answers every request line of one client connection"
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = handle_request(self.server.operations, line)
+            self.wfile.write((json.dumps(response) + '\n').encode())
+            self.wfile.flush()
+
+class CommandDaemon(socketserver.ThreadingTCPServer):
+    "Serves every client on its own thread with the shared warm connection"
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, operations: Operations, address = (DAEMON_HOST, DAEMON_PORT)):
+        super().__init__(address, CommandHandler)
+        # Instance Variables
+        self.operations = operations
+
+# Main Function
+def main():
+    print("\n[CONNECTING] Connecting to the Supply Chain and Transaction Bridge Contracts...")
+    operations = Operations()
+    print("\n[SUCCESS] Connected to both Smart Contracts...")
+    with CommandDaemon(operations) as daemon:
+        print(f"\nListening for commands on {DAEMON_HOST}:{DAEMON_PORT}...\n")
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            print('\nClosing command daemon...')
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,18 @@
 # IMPORT STATEMENTS
-from solcx import compile_source
+from compile_cache import compile_source_cached
+from deployment_manifest import DeploymentManifest, source_hash
 from web3 import Web3
-import json
 import os
 
 # ---------------------------------COMPILE SOLIDITY CODE---------------------------------
+# Compiled contracts are reused while their source does not change
+BUILD_CACHE = os.path.join(os.getcwd(), "Contracts/build_cache")
+
 with open(os.path.join(os.getcwd(), "Contracts/SupplyChain.sol"), 'r') as file_obj:
-    compiled_supply = compile_source(file_obj.read())
+    compiled_supply = compile_source_cached(file_obj.read(), BUILD_CACHE)
     
 with open(os.path.join(os.getcwd(), "Contracts/TransactionBridge.sol"), 'r') as file_obj:
-    compiled_bridge = compile_source(file_obj.read())
+    compiled_bridge = compile_source_cached(file_obj.read(), BUILD_CACHE)
 
 # checking the contents of the compiled contract
 # print(compiled_sol.keys())
@@ -73,14 +76,21 @@ tx_receipt_bridge = w32.eth.wait_for_transaction_receipt(tx_hash)
 
 print("[SUCCESS] Transaction Bridge Contract Deployed!")
 # ---------------------------------SAVE CONTRACT INFO---------------------------------
-# Supply Chain
-print("Saving Supply Chain Contract Info")
+print("Saving Deployment Manifest")
 
-with open(os.path.join(os.getcwd(), 'Contracts/SupplyChain.info'), "w") as file_obj:
-    file_obj.write(tx_receipt_supply.contractAddress),
-    file_obj.write("\n")
-    file_obj.write(json.dumps(abi_supply))
-print('[SUCCESS] Supply Chain info saved!')
+manifest = DeploymentManifest(os.path.join(os.getcwd(), "Contracts"))
+manifest.add(
+    'SupplyChain', 'supply_chain', tx_receipt_supply.contractAddress, abi_supply,
+    tx_receipt_supply.blockNumber, source_hash(os.path.join(os.getcwd(), "Contracts/SupplyChain.sol"))
+)
+manifest.add(
+    'TransactionBridge', 'bridge', tx_receipt_bridge.contractAddress, abi_bridge,
+    tx_receipt_bridge.blockNumber, source_hash(os.path.join(os.getcwd(), "Contracts/TransactionBridge.sol"))
+)
+manifest.save()
+print('[SUCCESS] Deployment Manifest saved!')
+
+# Supply Chain
 
 supplychain = w3.eth.contract(
     address = tx_receipt_supply.contractAddress,
@@ -90,13 +100,6 @@ supplychain = w3.eth.contract(
 print('[SUCCESS] Supply Chain Contract Deployed Successfully!!!')
 
 # Transaction Bridge
-print("Saving Transaction Bridge Contract Info")
-
-with open(os.path.join(os.getcwd(), 'Contracts/TransactionBridge.info'), "w") as file_obj:
-    file_obj.write(tx_receipt_bridge.contractAddress),
-    file_obj.write("\n")
-    file_obj.write(json.dumps(abi_bridge))
-print('[SUCCESS] Supply Chain info saved!')
 
 transaction_bridge = w32.eth.contract(
     address = tx_receipt_bridge.contractAddress,
@@ -1,38 +1,37 @@
 from web3 import Web3
-import threading
-import json
 import asyncio
 import time
-from bit import PrivateKeyTestnet
+from event_poller import EventPoller
+from worker_pool import BoundedExecutor
+from checkpoint import BlockCheckpoint
+from item_batcher import ItemBatcher
+from deployment_manifest import DeploymentManifest, load_contract
+from exchange_rate import ExchangeRateProvider, bit_usd_feed
+from payout_queue import PayoutQueue, PAYMENT
+from wallet_state import WalletState
+from btc_backend import BitTestnetBackend
 import os
 
 # ---------------------CONNECT TO SUPPLY CHAIN CONTRACT ON GANACHE---------------------
 # web3.py instance - Connectiong to Ganache App
 GANACHE_URL = "HTTP://127.0.0.1:7545"
+GANACHE_WS_URL = "ws://127.0.0.1:7545"
 w3 = Web3(Web3.HTTPProvider(GANACHE_URL))
 
 if w3.isConnected():
     print("\n[SUCCESS] Connected to the Supply Chain Ganache Blockchain Environment!")
     
 GANACHE_URL2 = "HTTP://127.0.0.1:7546"
+GANACHE_WS_URL2 = "ws://127.0.0.1:7546"
 w32 = Web3(Web3.HTTPProvider(GANACHE_URL2))
 
 if w32.isConnected():
     print("\n[SUCCESS] Connected to the Transaction Bridge Ganache Blockchain Environment!")
     
-# Getting SC smart contract information
-with open('Contracts/SupplyChain.info', 'r') as file_object:
-    contract_info = file_object.readlines()
-
-supply_address = contract_info[0][:-1]
-supply_abi = json.loads(contract_info[1])
-
-# Getting TB smart contract information
-with open('Contracts/TransactionBridge.info', 'r') as file_object:
-    contract_info = file_object.readlines()
-
-bridge_address = contract_info[0][:-1]
-bridge_abi = json.loads(contract_info[1])
+# Getting smart contract information from the deployment manifest
+manifest = DeploymentManifest('Contracts')
+supply_address, supply_abi = load_contract('Contracts', 'SupplyChain')
+bridge_address, bridge_abi = load_contract('Contracts', 'TransactionBridge')
 
 # Set first address as deployer for contract
 w3.eth.default_account = w3.eth.accounts[0]
@@ -56,13 +55,23 @@ transactionbridge = w32.eth.contract(
 print("\n[SUCCESS] Connected to Transaction Bridge Smart Contract...")
 
 # -----------------------------BTC TESTNET-----------------------------
+# Bitcoin network used, i.e. btc_backend.RegtestBackend for a local bitcoind node or
+# btc_backend.SimulatedBackend to run without the internet
+btc_backend = BitTestnetBackend()
+
 with open(os.path.join(os.getcwd(), "Wallet/wallet.info"), 'r') as file_obj:
     accs = file_obj.readlines()
 accs[0] = accs[0][:-1]
 
 keys = []
 for acc in accs:
-    keys.append(PrivateKeyTestnet(acc))
+    keys.append(btc_backend.load_key(acc))
+
+# BTC/USD price reused for 60 seconds, so a payment does not wait for a rate lookup
+exchange_rate = ExchangeRateProvider(bit_usd_feed, 60)
+# Unspent outputs read every 60 seconds and fee rate reused for 300 seconds
+wallet = WalletState(keys, btc_backend, 60, 300)
+wallet.start()
 
 # -----------------------------MAIN PROGRAM-----------------------------
 print("\nListnening for new events...\n")
@@ -112,10 +121,13 @@ def payment_initiated(receipt_number, total):
     # Send BTC Transaction
     print("Sending Bitcoin Transaction as payment...")
     try:
-        tx_hash = keys[0].send([(keys[1].address, total/100, 'usd')])
-        print(tx_hash)
+        satoshis = exchange_rate.cents_to_satoshi(total)
     except Exception as err:
         print("[ERROR] oops BTC transaction error!")
+        return
+    # Recorded in the payout queue and sent in the background, a replayed event is ignored
+    if not payout_queue.enqueue(receipt_number, PAYMENT, keys[0], keys[1].address, satoshis):
+        print(f"Payment of receipt {receipt_number} was already queued")
 
 def new_delivery_created(delivery_id, employee_address, supplier, material):
     """
@@ -234,21 +246,30 @@ def item_sold(item_id, receipt_number, date):
             \r\tReceipt Number: {receipt_number}
             \r\tDate: {time.ctime(date)}"""
     )
+    price = supplychain.functions.get_price(item_id).call()
+    # The poller keeps the checkpoint before the item until its batch is on the bridge,
+    # a batch that fails is written again until it is
+    return item_batcher.add(receipt_number, item_id, price)
+
+def write_items(receipt_number, item_ids, prices):
+    """
+    A function writing a batch of items sold on the same receipt to the transaction
+    bridge with a single transaction
+    """
     # Create a new transaction if receipt number is unique else
-    # add item to existing cart (transaction)
+    # add items to existing cart (transaction)
     trans_state = transactionbridge.functions.get_state(receipt_number).call()
     if trans_state != 0 and trans_state != 1:
         print("[ERROR] Invalid Receipt Number...")
         return
     if trans_state == 0:
-        # Create a new transaction
-        print("Creating new transaction...")
-        tx_hash = transactionbridge.functions.create_transaction(receipt_number).transact()
-        tx_receipt = w32.eth.wait_for_transaction_receipt(tx_hash)
-    # Add item to transaction
-    print("Adding item to transaction...")
-    price = supplychain.functions.get_price(item_id).call()
-    tx_hash = transactionbridge.functions.add_items_to_transaction(receipt_number, [item_id], [price]).transact()
+        # Create a new transaction holding the items in a single call
+        print(f"Creating new transaction with {len(item_ids)} items...")
+        tx_hash = transactionbridge.functions.create_transaction_with_items(receipt_number, item_ids, prices).transact()
+    else:
+        # Add items to transaction
+        print(f"Adding {len(item_ids)} items to transaction...")
+        tx_hash = transactionbridge.functions.add_items_to_transaction(receipt_number, item_ids, prices).transact()
     tx_receipt = w32.eth.wait_for_transaction_receipt(tx_hash)
 
 def item_returned(item_id, receipt_number, date, price):
@@ -279,380 +300,79 @@ def buyer_ok(receipt_number, total):
           \rReceipt Number: {receipt_number}
           \rTotal: {total}""")
 
-# ASYNC FUNCTION LOOPS
-# event SellerOk (uint256 indexed receipt_number, uint256 total);
-async def sellerok_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every seller confirming the 
-    transaction.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = seller_ok,
-                args = (
-                    event['args']['receipt_number'],
-                    event['args']['total']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# event BuyerOk (uint256 indexed receipt_number, uint256 total);
-async def buyerok_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every buyer confirming the 
-    transaction.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = buyer_ok,
-                args = (
-                    event['args']['receipt_number'],
-                    event['args']['total']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# TransactionCreated (uint256 indexed receipt_number);
-async def tc_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every payment being
-    processed.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = transaction_created,
-                args = (
-                    event['args']['receipt_number'],
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# TransactionUpdated (uint256 indexed receipt_number, uint256 total);
-async def tu_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every transaction being
-    updated.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = transaction_updated,
-                args = (
-                    event['args']['receipt_number'],
-                    event['args']['total']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# TransactionRefunded (uint256 indexed receipt_number);
-async def tr_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every transaction being
-    refunded.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = transaction_refunded,
-                args = (
-                    event['args']['receipt_number'],
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# PaymentInitiated (uint256 indexed receipt_number, uint256 total);
-async def payment_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every payment being
-    processed.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = payment_initiated,
-                args = (
-                    event['args']['receipt_number'],
-                    event['args']['total']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# NewDeliveryCreated (uint256 indexed delivery_id, address employee_address, string supplier, MaterialType material);
-async def ndc_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every new delivery orders
-    successfully created.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = new_delivery_created,
-                args = (
-                    event['args']['delivery_id'],
-                    event['args']['employee_address'],
-                    event['args']['supplier'],
-                    event['args']['material']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# DeliveryCreationFailed (string supplier, uint8 material, uint256 weight, uint256 cost, string message);
-async def dcf_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every new delivery order
-    unsuccessfully created.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = delivery_creation_failed,
-                args = (
-                    event['args']['supplier'],
-                    event['args']['material'],
-                    event['args']['weight'],
-                    event['args']['cost'],
-                    event['args']['message']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# NewBatchCreated (uint256 indexed batch_id, address employee_address, BatchType fabric, ItemType apparel);
-async def nbc_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every new batch
-    created for completion by a manufacturing plant.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = new_batch_created,
-                args = (
-                    event['args']['batch_id'],
-                    event['args']['employee_address'],
-                    event['args']['fabric'],
-                    event['args']['apparel']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# BatchCreationFailed (uint8 fabric, uint256 machine_id, string message);
-async def bcrf_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every batch
-    creation failed by a manufacturing plant.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = batch_creation_failed,
-                args = (
-                    event['args']['fabric'],
-                    event['args']['machine_id'],
-                    event['args']['message']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# BatchCompletionFailed (uint256 indexed batch_id, string message);
-async def bcof_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every batch
-    completion failed by a manufacturing plant.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = batch_completion_failed,
-                args = (
-                    event['args']['batch_id'],
-                    event['args']['message']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# BatchCompleted (uint256 indexed batch_id, uint256 num_items);
-async def bc_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every batch
-    completed by a manufacturing plant.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = batch_completed,
-                args = (
-                    event['args']['batch_id'],
-                    event['args']['num_items']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# DeliveryReceived (uint256 indexed delivery_id);
-async def dr_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every delivery
-    cancelled by a company.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = delivery_received,
-                args = (
-                    event['args']['delivery_id'],
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# DeliveryCancelled( uint256 indexed delivery_id);
-async def dc_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every delivery
-    cancelled by a company.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = delivery_cancelled,
-                args = (
-                    event['args']['delivery_id'],
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-        
-# ItemReturned (uint256 indexed item_id, uint256 indexed receipt_num, uint256 date, uint256 price);
-async def ir_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every item
-    returned by a customer.
+# Worker pool settings: number of handler threads and handlers allowed to wait for one
+MAX_WORKERS = 8
+MAX_QUEUE = 100
+# Seconds between two reports of the worker pool counters
+STATS_INTERVAL = 60
+# Receive new logs over WebSocket subscriptions (falls back to polling when unavailable)
+USE_WEBSOCKETS = True
+# Seconds to collect items sold on the same receipt and most items written in one transaction
+ITEM_BATCH_WINDOW = 0.5
+ITEM_BATCH_SIZE = 50
+# Seconds to gather payouts and most payouts sent in one bitcoin transaction
+BTC_BATCH_WINDOW = 2
+BTC_BATCH_SIZE = 20
+# File keeping the last block processed on every chain
+CHECKPOINT_FILE = "Contracts/listener.checkpoint"
+# Without a checkpoint the listener starts at the newest block. Set to True to run the
+# handlers for every event since the deployment instead: this creates baskets and queues
+# bitcoin payouts for all past events again, so only use it with a fresh deployment
+REPLAY_FROM_DEPLOYMENT = False
+# SQLite file keeping every bitcoin payout until it is sent
+PAYOUT_DB = "Contracts/payouts.db"
+
+executor = BoundedExecutor(MAX_WORKERS, MAX_QUEUE)
+item_batcher = ItemBatcher(executor, write_items, ITEM_BATCH_WINDOW, ITEM_BATCH_SIZE)
+payout_queue = PayoutQueue(PAYOUT_DB, wallet, BTC_BATCH_WINDOW, BTC_BATCH_SIZE)
+
+async def stats_loop(executor, interval):
+    """
+    Asynchronous function to report the queue depth and rejection counters of the
+    worker pool, the number of bridge writes saved by the item batcher and the state of
+    the bitcoin payout queue.
     """
     
     while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = item_returned,
-                args = (
-                    event['args']['item_id'],
-                    event['args']['receipt_num'],
-                    event['args']['date'],
-                    event['args']['price']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# ItemSold (uint256 indexed item_id, uint256 indexed receipt_num, uint256 date);
-async def is_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for every item
-    sold to a customer.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = item_sold,
-                args = (
-                    event['args']['item_id'],
-                    event['args']['receipt_num'],
-                    event['args']['date']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
-
-# NewItemsCreated (uint256 indexed item_start_id, uint256 indexed item_end_id, BatchType fabric, ItemType item_type);
-async def nic_loop(event_filter, poll_interval):
-    """
-    Asynchronous function to create new threads for new items created
-    by a batch being completed.
-    """
-    
-    while True:
-        for event in event_filter.get_new_entries():
-            thread = threading.Thread(
-                target = new_items_created,
-                args = (
-                    event['args']['item_start_id'],
-                    event['args']['item_end_id'],
-                    event['args']['fabric'],
-                    event['args']['item_type']
-                )
-            )
-            thread.start()
-        await asyncio.sleep(poll_interval)
+        await asyncio.sleep(interval)
+        executor.print_stats()
+        item_batcher.print_stats()
+        payout_queue.print_stats()
+        wallet.print_stats()
 
 # Main Function
 def main():
-    # Creating filters for every event
-    ndc_filter = supplychain.events.NewDeliveryCreated().createFilter(fromBlock = 'latest')
-    dcf_filter = supplychain.events.DeliveryCreationFailed().createFilter(fromBlock = 'latest')
-    nbc_filter = supplychain.events.NewBatchCreated().createFilter(fromBlock = 'latest')
-    bcrf_filter = supplychain.events.BatchCreationFailed().createFilter(fromBlock = 'latest')
-    bcof_filter = supplychain.events.BatchCompletionFailed().createFilter(fromBlock = 'latest')
-    bc_filter = supplychain.events.BatchCompleted().createFilter(fromBlock = 'latest')
-    dr_filter = supplychain.events.DeliveryReceived().createFilter(fromBlock = 'latest')
-    dc_filter = supplychain.events.DeliveryCancelled().createFilter(fromBlock = 'latest')
-    nic_filter = supplychain.events.NewItemsCreated().createFilter(fromBlock = 'latest')
-    is_filter = supplychain.events.ItemSold().createFilter(fromBlock = 'latest')
-    ir_filter = supplychain.events.ItemReturned().createFilter(fromBlock = 'latest')
-    tc_filter = transactionbridge.events.TransactionCreated().createFilter(fromBlock = 'latest')
-    tu_filter = transactionbridge.events.TransactionUpdated().createFilter(fromBlock = 'latest')
-    tr_filter = transactionbridge.events.TransactionRefunded().createFilter(fromBlock = 'latest')
-    payment_filter = transactionbridge.events.PaymentInitiated().createFilter(fromBlock = 'latest')
-    sellerok_filter = transactionbridge.events.SellerOk().createFilter(fromBlock = 'latest')
-    buyerok_filter = transactionbridge.events.BuyerOk().createFilter(fromBlock = 'latest')
+    checkpoint = BlockCheckpoint(CHECKPOINT_FILE)
+    item_batcher.start()
+    payout_queue.start()
+    # One poller per chain, every event is routed by its topic
+    supply_poller = EventPoller(w3, "Supply Chain", executor, checkpoint, manifest.topics('SupplyChain'))
+    supply_poller.register(supplychain.events.NewDeliveryCreated, new_delivery_created, ('delivery_id', 'employee_address', 'supplier', 'material'))
+    supply_poller.register(supplychain.events.DeliveryCreationFailed, delivery_creation_failed, ('supplier', 'material', 'weight', 'cost', 'message'))
+    supply_poller.register(supplychain.events.NewBatchCreated, new_batch_created, ('batch_id', 'employee_address', 'fabric', 'apparel'))
+    supply_poller.register(supplychain.events.BatchCreationFailed, batch_creation_failed, ('fabric', 'machine_id', 'message'))
+    supply_poller.register(supplychain.events.BatchCompletionFailed, batch_completion_failed, ('batch_id', 'message'))
+    supply_poller.register(supplychain.events.BatchCompleted, batch_completed, ('batch_id', 'num_items'))
+    supply_poller.register(supplychain.events.DeliveryReceived, delivery_received, ('delivery_id',))
+    supply_poller.register(supplychain.events.DeliveryCancelled, delivery_cancelled, ('delivery_id',))
+    supply_poller.register(supplychain.events.NewItemsCreated, new_items_created, ('item_start_id', 'item_end_id', 'fabric', 'item_type'))
+    supply_poller.register(supplychain.events.ItemSold, item_sold, ('item_id', 'receipt_num', 'date'))
+    supply_poller.register(supplychain.events.ItemReturned, item_returned, ('item_id', 'receipt_num', 'date', 'price'))
+    bridge_poller = EventPoller(w32, "Transaction Bridge", executor, checkpoint, manifest.topics('TransactionBridge'))
+    bridge_poller.register(transactionbridge.events.TransactionCreated, transaction_created, ('receipt_number',))
+    bridge_poller.register(transactionbridge.events.TransactionUpdated, transaction_updated, ('receipt_number', 'total'))
+    bridge_poller.register(transactionbridge.events.TransactionRefunded, transaction_refunded, ('receipt_number',))
+    bridge_poller.register(transactionbridge.events.PaymentInitiated, payment_initiated, ('receipt_number', 'total'))
+    bridge_poller.register(transactionbridge.events.SellerOk, seller_ok, ('receipt_number', 'total'))
+    bridge_poller.register(transactionbridge.events.BuyerOk, buyer_ok, ('receipt_number', 'total'))
     loop = asyncio.get_event_loop()
     try:
         loop.run_until_complete(
             asyncio.gather(
-                ndc_loop(ndc_filter, 2),
-                dcf_loop(dcf_filter, 2),
-                nbc_loop(nbc_filter, 2),
-                bcrf_loop(bcrf_filter, 2),
-                bcof_loop(bcof_filter, 2),
-                bc_loop(bc_filter, 2),
-                dr_loop(dr_filter, 2),
-                dc_loop(dc_filter, 2),
-                nic_loop(nic_filter, 2),
-                is_loop(is_filter, 2),
-                ir_loop(ir_filter, 2),
-                tc_loop(tc_filter, 2),
-                tu_loop(tu_filter, 2),
-                tr_loop(tr_filter, 2),
-                payment_loop(payment_filter, 2),
-                sellerok_loop(sellerok_filter, 2),
-                buyerok_loop(buyerok_filter, 2)
+                # Without a checkpoint only new blocks are read unless REPLAY_FROM_DEPLOYMENT is set
+                supply_poller.run(2, GANACHE_WS_URL if USE_WEBSOCKETS else None, manifest.deploy_block('SupplyChain') if REPLAY_FROM_DEPLOYMENT else None),
+                bridge_poller.run(2, GANACHE_WS_URL2 if USE_WEBSOCKETS else None, manifest.deploy_block('TransactionBridge') if REPLAY_FROM_DEPLOYMENT else None),
+                stats_loop(executor, STATS_INTERVAL)
             )
         )
     except KeyboardInterrupt as err:
@@ -660,6 +380,13 @@ def main():
         print(err)
     finally:
         loop.close()
+        item_batcher.stop()
+        executor.shutdown()
+        payout_queue.stop()
+        executor.print_stats()
+        item_batcher.print_stats()
+        payout_queue.print_stats()
+        wallet.print_stats()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""
+This file contains the coalescing stage used by the event listener for ItemSold events.
+Items sold on the same receipt are buffered for a short window and written to the
+transaction bridge together, so a checkout costs one bridge transaction instead of one
+per item. Batches are written by the worker pool of the listener, a batch that fails is
+kept and written again later.
+"""
+import time
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+class ItemBatcher:
+    """Buffers sold items per receipt and hands them to 'write' in batches.\n
+    A batch is due 'window' seconds after its first item arrives or as soon as it holds
+    'max_items' items, whichever comes first. A single scheduler thread submits the due
+    batches to 'executor', so writing never starts threads of its own. Batches of the same
+    receipt are written one after the other, so two batches can never both try to create
+    the receipt. A failed batch is written again with exponential backoff and the futures of
+    its items stay pending until it succeeds."""
+    # First and longest wait before a failed batch is written again
+    BACKOFF = 1
+    MAX_BACKOFF = 60
+    # Seconds to wait before offering a batch again to a full worker pool
+    BACKPRESSURE_DELAY = 0.1
+
+    def __init__(self, executor, write: Callable, window: float = 0.5, max_items: int = 50):
+        """executor: BoundedExecutor running the writes\n
+        write: function called with (receipt number, item ids, prices) for every batch"""
+        # Instance Variables
+        self.executor = executor
+        self.write = write
+        self.window = window
+        self.max_items = max_items
+        self.condition = threading.Condition()
+        # receipt number -> [item ids, prices, futures of the items, time the batch is due, failed attempts]
+        self.batches: Dict[int, List] = {}
+        # Receipts with a batch being written
+        self.writing = set()
+        self.stopped = False
+        self.thread = None
+        # Counters
+        self.items = 0
+        self.writes = 0
+        self.retries = 0
+
+    def add(self, receipt_number: int, item_id: int, price: int) -> Future:
+        """Adds a sold item to the open batch of its receipt.\n
+        returns the Future of the item, done once the item has been written"""
+        future = Future()
+        with self.condition:
+            self.items += 1
+            batch = self.batches.get(receipt_number)
+            if batch is None:
+                batch = self.batches[receipt_number] = [[], [], [], time.monotonic() + self.window, 0]
+                self.condition.notify_all()
+            batch[0].append(item_id)
+            batch[1].append(price)
+            batch[2].append(future)
+            if len(batch[0]) == self.max_items:
+                batch[3] = min(batch[3], time.monotonic())
+                self.condition.notify_all()
+        return future
+
+    def start(self) -> None:
+        "Starts the scheduler thread"
+        if self.thread is None:
+            self.thread = threading.Thread(target = self._schedule_loop, name = "item-batcher", daemon = True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        """Writes every open batch once and stops the scheduler thread.\n
+        Batches that still fail are not written, the checkpoint never moved past their
+        items so they are sold again when the listener replays their blocks."""
+        with self.condition:
+            start = time.monotonic()
+            for batch in self.batches.values():
+                batch[3] = min(batch[3], start)
+            self.condition.notify_all()
+            # Failed batches get a new due time, the others leave once written
+            while self.thread is not None and (self.writing or any(batch[3] <= start for batch in self.batches.values())):
+                self.condition.wait()
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _schedule_loop(self) -> None:
+        "Submits every due batch whose receipt is not being written to the worker pool"
+        with self.condition:
+            while not self.stopped:
+                now = time.monotonic()
+                timeout = None
+                for receipt_number, batch in list(self.batches.items()):
+                    if receipt_number in self.writing:
+                        continue
+                    if batch[3] > now:
+                        timeout = batch[3] - now if timeout is None else min(timeout, batch[3] - now)
+                    elif not self._submit(receipt_number, batch):
+                        timeout = self.BACKPRESSURE_DELAY
+                        break
+                self.condition.wait(timeout)
+
+    def _submit(self, receipt_number: int, batch: List) -> bool:
+        """Hands up to 'max_items' items of a batch to the worker pool, called with the condition held.\n
+        returns: False if the pool is full"""
+        item_ids, prices, futures, _, attempts = batch
+        count = min(len(item_ids), self.max_items)
+        if self.executor.try_submit(self._write_batch, receipt_number, item_ids[:count], prices[:count],
+                                    futures[:count], attempts) is None:
+            return False
+        self.writing.add(receipt_number)
+        # The items left over are written right after this batch
+        del item_ids[:count], prices[:count], futures[:count]
+        if not item_ids:
+            del self.batches[receipt_number]
+        return True
+
+    def _write_batch(self, receipt_number: int, item_ids: List[int], prices: List[int], futures: List[Future],
+                     attempts: int) -> None:
+        "Writes a batch on a worker, a failed batch goes back in front of the open batch of its receipt"
+        try:
+            self.write(receipt_number, item_ids, prices)
+        except Exception as err:
+            attempts += 1
+            delay = min(self.BACKOFF * 2 ** (attempts - 1), self.MAX_BACKOFF)
+            print(f"[ERROR] Writing {len(item_ids)} items of receipt {receipt_number} failed, retrying in {delay}s: {err}")
+            with self.condition:
+                batch = self.batches.setdefault(receipt_number, [[], [], [], 0, 0])
+                batch[0][:0] = item_ids
+                batch[1][:0] = prices
+                batch[2][:0] = futures
+                batch[3] = time.monotonic() + delay
+                batch[4] = attempts
+                self.retries += 1
+                self.writing.discard(receipt_number)
+                self.condition.notify_all()
+            return
+        for future in futures:
+            future.set_result(receipt_number)
+        with self.condition:
+            self.writes += 1
+            self.writing.discard(receipt_number)
+            self.condition.notify_all()
+
+    def print_stats(self) -> None:
+        "Prints how many items were written and in how many bridge transactions"
+        with self.condition:
+            print(f"""\nItem Batcher [window of {self.window}s, up to {self.max_items} items]:
+                  \r\tItems Sold: {self.items}\tBridge Writes: {self.writes}\tRetries: {self.retries}""")
@@ -0,0 +1,185 @@
+"""
+This file contains every operation of the one-shot Base/SRC scripts as methods of a single
+connection to both Ganache chains. The connection and contract objects are built once, so
+running an operation only costs its own transaction instead of a full script start.
+"""
+from web3 import Web3
+from random import randint
+from deployment_manifest import load_contract
+from typing import Dict, Tuple
+
+GANACHE_URL = "HTTP://127.0.0.1:7545"
+GANACHE_URL2 = "HTTP://127.0.0.1:7546"
+
+class Operations:
+    """Sends the operations of the supply chain and transaction bridge contracts.\n
+    Every operation takes its arguments by name and returns a json friendly dict, invalid
+    arguments raise ValueError and failed transactions raise the web3 error. The method of an
+    operation validates it and returns its call, which 'run' then sends."""
+    # operation -> names of its arguments, in the order of the contract function
+    OPERATIONS: Dict[str, Tuple[str, ...]] = {
+        'create_delivery_order': ('material', 'supplier', 'weight', 'cost', 'employee'),
+        'order_delivered': ('delivery_id',),
+        'cancel_order': ('delivery_id',),
+        'start_batch': ('fabric', 'apparel', 'machine_id'),
+        'complete_batch': ('batch_id', 'output', 'price', 'cost'),
+        'ship_batch': ('batch_id',),
+        'sell_item': ('item_id', 'receipt_number', 'price'),
+        'return_item': ('item_id',),
+        'pay_transaction': ('receipt_number',),
+        'refund_transaction': ('receipt_number',),
+        'confirm_seller': ('receipt_number',),
+        'confirm_buyer': ('receipt_number',),
+        'get_state': ('receipt_number',)
+    }
+    # Arguments that may be left out and their default value
+    DEFAULTS = {'employee': 0, 'receipt_number': None}
+    # Arguments given as text, every other argument is an integer
+    TEXT_ARGUMENTS = ('supplier',)
+    # Operations that only read the contract state
+    READ_OPERATIONS = ('get_state',)
+
+    def __init__(self, contracts_dir: str = 'Contracts'):
+        # Instance Variables
+        self.w3 = Web3(Web3.HTTPProvider(GANACHE_URL))
+        self.w32 = Web3(Web3.HTTPProvider(GANACHE_URL2))
+        if not self.w3.isConnected() or not self.w32.isConnected():
+            raise ConnectionError("Could not connect to both Ganache Blockchain Environments!")
+        self.supply_accounts = self.w3.eth.accounts
+        self.w3.eth.default_account = self.supply_accounts[0]
+        self.w32.eth.default_account = self.w32.eth.accounts[0]
+        supply_address, supply_abi = load_contract(contracts_dir, 'SupplyChain')
+        bridge_address, bridge_abi = load_contract(contracts_dir, 'TransactionBridge')
+        self.supplychain = self.w3.eth.contract(address = supply_address, abi = supply_abi)
+        self.transactionbridge = self.w32.eth.contract(address = bridge_address, abi = bridge_abi)
+
+    @classmethod
+    def parse_argument(cls, name: str, value: str):
+        "Converts an argument given as text, i.e. on the command line, to the type of its parameter"
+        if name in cls.TEXT_ARGUMENTS:
+            return value
+        try:
+            return int(value)
+        except ValueError:
+            # Left as text, 'prepare' reports the argument
+            return value
+
+    def prepare(self, operation: str, args: dict) -> Tuple[object, object, str, dict]:
+        """Validates 'operation' with the arguments in 'args' by name without sending it.\n
+        returns: (web3 instance of its chain, contract function, sender, extra result fields)"""
+        if operation not in self.OPERATIONS:
+            raise ValueError(f"Unknown operation '{operation}'")
+        names = self.OPERATIONS[operation]
+        unknown = set(args) - set(names)
+        if unknown:
+            raise ValueError(f"Unknown arguments for {operation}: {', '.join(sorted(unknown))}")
+        values = []
+        for name in names:
+            if name in args:
+                if name not in self.TEXT_ARGUMENTS and (type(args[name]) != int):
+                    raise ValueError(f"Argument '{name}' of {operation} must be an integer")
+                values.append(args[name])
+            elif name in self.DEFAULTS:
+                values.append(self.DEFAULTS[name])
+            else:
+                raise ValueError(f"Missing argument '{name}' for {operation}")
+        return getattr(self, operation)(*values)
+
+    def run(self, operation: str, args: dict) -> dict:
+        """Runs 'operation' with the arguments in 'args' by name.\n
+        returns: the result of the operation"""
+        w3, function, sender, extra = self.prepare(operation, args)
+        if operation in self.READ_OPERATIONS:
+            return {'result': function.call()}
+        tx_hash = function.transact({'from': sender})
+        tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        if tx_receipt['status'] != 1:
+            raise ValueError(f"Transaction {tx_hash.hex()} reverted")
+        return dict(receipt_result(tx_receipt), **extra)
+
+    # SUPPLY CHAIN OPERATIONS------------------------------------------------------------
+    def create_delivery_order(self, material: int, supplier: str, weight: int, cost: int, employee: int = 0):
+        """Creates a delivery order of materials, sent by the account of employee [0-9].\n
+        material: 0 -> Cotton, 1 -> Ethylene"""
+        if material not in [0, 1]:
+            raise ValueError('Material must be either Cotton or Ethylene i.e. 0 or 1')
+        if weight <= 0:
+            raise ValueError('Weight of materials delivered must be positive.')
+        if cost <= 0:
+            raise ValueError('Cost of materials delivered must be positive.')
+        if not 0 <= employee < len(self.supply_accounts):
+            raise ValueError(f'Employee id must be between 0 and {len(self.supply_accounts) - 1}')
+        function = self.supplychain.functions.create_delivery_order(material, supplier, weight, cost)
+        return self.w3, function, self.supply_accounts[employee], {}
+
+    def order_delivered(self, delivery_id: int):
+        "Confirms the delivery of an order"
+        return self._supply_call(self.supplychain.functions.order_delivered(delivery_id))
+
+    def cancel_order(self, delivery_id: int):
+        "Cancels an order that was not delivered yet"
+        return self._supply_call(self.supplychain.functions.cancel_order(delivery_id))
+
+    def start_batch(self, fabric: int, apparel: int, machine_id: int):
+        """Starts a processing batch.\n
+        fabric: 0 -> Cotton, 1 -> Polyester | apparel: 0 -> tshirt, 1 -> shirt, 2 -> pants"""
+        return self._supply_call(self.supplychain.functions.start_batch(fabric, apparel, machine_id))
+
+    def complete_batch(self, batch_id: int, output: int, price: int, cost: int):
+        "Completes a processing batch that made 'output' items, price and cost in cents"
+        if output <= 0:
+            raise ValueError('Output of the batch must be positive.')
+        return self._supply_call(self.supplychain.functions.complete_batch(batch_id, output, price, cost))
+
+    def ship_batch(self, batch_id: int):
+        "Ships a completed batch so its items can be sold"
+        return self._supply_call(self.supplychain.functions.ship_batch(batch_id))
+
+    def sell_item(self, item_id: int, receipt_number: int, price: int):
+        """Sells an item for 'price' cents on a receipt.\n
+        A new receipt number is drawn when 'receipt_number' is None or -1, it is returned with the result"""
+        if receipt_number is None or receipt_number == -1:
+            receipt_number = randint(100000, 999999)
+        w3, function, sender, _ = self._supply_call(self.supplychain.functions.sell_item(item_id, receipt_number, price))
+        return w3, function, sender, {'receipt_number': receipt_number}
+
+    def return_item(self, item_id: int):
+        "Returns a sold item"
+        return self._supply_call(self.supplychain.functions.return_item(item_id))
+
+    def _supply_call(self, function):
+        "Supply chain calls are sent by the first account"
+        return self.w3, function, self.w3.eth.default_account, {}
+
+    # TRANSACTION BRIDGE OPERATIONS------------------------------------------------------
+    def pay_transaction(self, receipt_number: int):
+        "Pays for the items of a receipt"
+        return self._bridge_call(self.transactionbridge.functions.pay_transaction(receipt_number))
+
+    def refund_transaction(self, receipt_number: int):
+        "Refunds the items of a receipt"
+        return self._bridge_call(self.transactionbridge.functions.refund_transaction(receipt_number))
+
+    def confirm_seller(self, receipt_number: int):
+        "Confirms a receipt on behalf of the seller"
+        return self._bridge_call(self.transactionbridge.functions.confirm_seller(receipt_number))
+
+    def confirm_buyer(self, receipt_number: int):
+        "Confirms a receipt on behalf of the buyer, once the seller has confirmed it"
+        return self._bridge_call(self.transactionbridge.functions.confirm_buyer(receipt_number))
+
+    def get_state(self, receipt_number: int):
+        "Gets the state of a receipt without sending a transaction"
+        return self._bridge_call(self.transactionbridge.functions.get_state(receipt_number))
+
+    def _bridge_call(self, function):
+        "Transaction bridge calls are sent by the first account"
+        return self.w32, function, self.w32.eth.default_account, {}
+
+def receipt_result(tx_receipt) -> dict:
+    "Gets the json friendly fields of a transaction receipt"
+    return {
+        'tx_hash': tx_receipt['transactionHash'].hex(),
+        'block': tx_receipt['blockNumber'],
+        'gas_used': tx_receipt['gasUsed']
+    }
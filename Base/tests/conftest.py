@@ -0,0 +1,8 @@
+"""
+Shared setup of the Base tests. The scripts of SRC import each other by module name,
+i.e. 'from worker_pool import BoundedExecutor', so SRC is put on the path.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'SRC'))
@@ -0,0 +1,78 @@
+import threading
+import pytest
+from item_batcher import ItemBatcher
+from worker_pool import BoundedExecutor
+
+class RecordingWrite:
+    "Bridge write recording every batch, the first 'failures' writes raise"
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, receipt_number, item_ids, prices):
+        with self.lock:
+            if self.failures > 0:
+                self.failures -= 1
+                raise ConnectionError("bridge unreachable")
+            self.batches.append((receipt_number, list(item_ids), list(prices)))
+
+@pytest.fixture
+def executor():
+    executor = BoundedExecutor(max_workers = 2, max_queue = 10)
+    yield executor
+    executor.shutdown()
+
+def test_items_of_one_receipt_are_written_together(executor):
+    write = RecordingWrite()
+    batcher = ItemBatcher(executor, write, window = 0.05)
+    batcher.start()
+    futures = [batcher.add(42, item_id, 100 * item_id) for item_id in (1, 2, 3)]
+    futures.append(batcher.add(43, 9, 900))
+    assert [future.result(timeout = 5) for future in futures] == [42, 42, 42, 43]
+    batcher.stop()
+    assert sorted(write.batches) == [(42, [1, 2, 3], [100, 200, 300]), (43, [9], [900])]
+    assert (batcher.items, batcher.writes) == (4, 2)
+
+def test_full_batch_is_written_without_waiting_for_the_window(executor):
+    write = RecordingWrite()
+    batcher = ItemBatcher(executor, write, window = 60, max_items = 2)
+    batcher.start()
+    futures = [batcher.add(7, item_id, 50) for item_id in (1, 2)]
+    assert [future.result(timeout = 5) for future in futures] == [7, 7]
+    batcher.stop()
+    assert write.batches == [(7, [1, 2], [50, 50])]
+
+def test_failed_batch_is_written_again(executor):
+    write = RecordingWrite(failures = 2)
+    batcher = ItemBatcher(executor, write, window = 0.01)
+    batcher.BACKOFF = 0.01
+    batcher.start()
+    future = batcher.add(5, 1, 10)
+    assert future.result(timeout = 5) == 5
+    batcher.stop()
+    assert write.batches == [(5, [1], [10])]
+    assert batcher.retries == 2
+
+def test_items_added_while_a_batch_fails_keep_their_order(executor):
+    write = RecordingWrite(failures = 1)
+    batcher = ItemBatcher(executor, write, window = 0.01)
+    batcher.BACKOFF = 0.2
+    batcher.start()
+    first = batcher.add(5, 1, 10)
+    # Added once the first write failed and before its retry is due
+    while batcher.retries == 0:
+        threading.Event().wait(0.01)
+    second = batcher.add(5, 2, 20)
+    assert (first.result(timeout = 5), second.result(timeout = 5)) == (5, 5)
+    batcher.stop()
+    assert write.batches == [(5, [1, 2], [10, 20])]
+
+def test_stop_writes_the_open_batches(executor):
+    write = RecordingWrite()
+    batcher = ItemBatcher(executor, write, window = 60)
+    batcher.start()
+    future = batcher.add(11, 3, 30)
+    batcher.stop()
+    assert future.done() and future.result() == 11
+    assert write.batches == [(11, [3], [30])]